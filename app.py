@@ -1,40 +1,199 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import os
+import re
+import sys
 import tempfile
 import json
 from werkzeug.utils import secure_filename
 import google.generativeai as genai
-from pdf2image import convert_from_path
 from PIL import Image
 import pandas as pd
 import io
 import base64
+import math
+import time
+import threading
 from datetime import datetime
 
+# Shared helpers (PDF text extraction, value parsing) live with the Vercel functions
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+from upload_native_pdf import MODEL_NAME, document_part, extraction_prefix, generate_with_prefix
+from pdf_text import choose_text_backend, extract_text, parse_layout
+from streaming import generate_streaming
+from invoice_splitter import detect_invoices, page_texts, split_pdf
+from rasterizer import choose_rasterizer, page_size
+from cpu_pool import CpuPool, in_worker_process, render_png_bytes
+from output_store import OutputStore
+from ledger import Ledger, document_hash, iter_csv, write_xlsx
+from invoice_index import InvoiceIndex
+from memory_budget import MemoryBudget, MemoryBudgetExceeded
+from page_cache import PageImageCache
+from field_cache import FieldCache, merge_fields
+from near_duplicates import NearDuplicateIndex, reuse_from_env
+from progress import ProgressHub, format_sse
+from exporters import EXPORT_FORMATS, export_entries, iter_jsonl
+from chunked_upload import ChunkedUploads, UploadError
+from compression import StaticAssetCache, choose_encoding, compress, is_compressible, MIN_COMPRESS_BYTES
+from usage_meter import BudgetExceeded, UsageMeter, hourly_budget_from_env, sum_usage
+from model_cascade import cascade_stats, run_cascade
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
+app.config['DATABASE_PATH'] = os.path.join('data', 'invoicepilot.db')
+app.config['OUTPUT_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['OUTPUT_TTL_SECONDS'] = 24 * 3600
+app.config['UPLOAD_TTL_SECONDS'] = 3600
+# Pages are rendered at 300 DPI unless that exceeds MAX_PAGE_PIXELS (about A4 at
+# 300 DPI); all concurrent renders share RASTER_MEMORY_BUDGET bytes of pixel buffers
+app.config['MAX_PAGE_PIXELS'] = 9 * 1000 * 1000
+app.config['RASTER_MEMORY_BUDGET'] = 256 * 1024 * 1024
+app.config['RASTER_BUDGET_TIMEOUT'] = 60
+# In-process pdfium when installed, else poppler's pdftoppm ($INVOICEPILOT_RASTERIZER overrides)
+app.config['RASTERIZER'] = choose_rasterizer()
+# Rendered PNGs are cached per document so re-extractions skip rendering
+app.config['PAGE_CACHE_FOLDER'] = os.path.join('cache', 'pages')
+app.config['PAGE_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+# Set when running behind nginx/Apache so downloads are handed off with X-Sendfile
+app.config['USE_X_SENDFILE'] = False
+# Large files can be sent in chunks (each request stays under MAX_CONTENT_LENGTH);
+# unfinished uploads are deleted after PARTIAL_UPLOAD_TTL_SECONDS without activity
+app.config['CHUNKED_UPLOAD_FOLDER'] = os.path.join('uploads', 'partial')
+app.config['CHUNKED_UPLOAD_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+app.config['PARTIAL_UPLOAD_TTL_SECONDS'] = 24 * 3600
+# Background jobs report progress over server-sent events at /jobs/<id>/events
+app.config['JOB_WORKERS'] = 4
+app.config['JOB_TTL_SECONDS'] = 3600
+# Per-key ceiling on estimated model spend over the last hour (None = no limit);
+# /upload answers 429 once it is reached, background jobs wait for room instead
+app.config['HOURLY_BUDGET_USD'] = hourly_budget_from_env()
+app.config['BUDGET_QUEUE_TIMEOUT'] = 3600
+# Reuse the stored fields of a near-duplicate (re-scan, re-export) instead of calling the model
+app.config['REUSE_NEAR_DUPLICATES'] = reuse_from_env()
+# Rendering, PNG encoding and PDF parsing run on this many worker processes
+# (0 runs them in the request thread)
+app.config['CPU_WORKERS'] = int(os.environ.get('INVOICEPILOT_CPU_WORKERS', os.cpu_count() or 1))
+
+# Not started on import (the debug reloader and tools import this module): the
+# server entry point pre-warms it, otherwise the first request that needs it does
+cpu_pool = None
+cpu_pool_lock = threading.Lock()
 
 # Create necessary directories
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# Generated workbooks are deduplicated and evicted by age and total size;
+# uploads left behind by a crashed worker are swept after UPLOAD_TTL_SECONDS
+# (documents still queued in a job are pinned until they have been processed)
+output_store = OutputStore(
+    app.config['OUTPUT_FOLDER'],
+    max_bytes=app.config['OUTPUT_MAX_BYTES'],
+    ttl_seconds=app.config['OUTPUT_TTL_SECONDS'],
+)
+upload_store = OutputStore(
+    app.config['UPLOAD_FOLDER'],
+    max_bytes=None,
+    ttl_seconds=app.config['UPLOAD_TTL_SECONDS'],
+)
+chunked_uploads = ChunkedUploads(
+    app.config['CHUNKED_UPLOAD_FOLDER'],
+    max_bytes=app.config['CHUNKED_UPLOAD_MAX_BYTES'],
+    chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+)
+partial_store = OutputStore(
+    app.config['CHUNKED_UPLOAD_FOLDER'],
+    max_bytes=None,
+    ttl_seconds=app.config['PARTIAL_UPLOAD_TTL_SECONDS'],
+)
+# Pool workers re-import this module when it is run as a script; only the server sweeps
+if not in_worker_process():
+    output_store.start_sweeper()
+    upload_store.start_sweeper()
+    partial_store.start_sweeper()
+
+# Every extraction is appended here; workbooks are only materialized on download
+ledger = Ledger(app.config['DATABASE_PATH'])
+# Extracted text and fields are indexed so past invoices can be searched
+invoice_index = InvoiceIndex(app.config['DATABASE_PATH'])
+# Per-field results, so editing the column config only re-asks for changed columns
+field_cache = FieldCache(app.config['DATABASE_PATH'])
+# MinHash signatures of processed documents, to spot re-scans and re-exports
+near_duplicates = NearDuplicateIndex(app.config['DATABASE_PATH'])
+# Tokens and estimated cost of every model call, per API key and batch
+usage_meter = UsageMeter(app.config['DATABASE_PATH'], hourly_budget_usd=app.config['HOURLY_BUDGET_USD'])
+
+LEDGER_FILENAME = re.compile(r'^invoice_(\d+)\.xlsx$')
+
+raster_budget = MemoryBudget(app.config['RASTER_MEMORY_BUDGET'])
+page_cache = PageImageCache(app.config['PAGE_CACHE_FOLDER'], max_bytes=app.config['PAGE_CACHE_MAX_BYTES'])
+
+progress_hub = ProgressHub(ttl_seconds=app.config['JOB_TTL_SECONDS'])
+
+# The page is rendered and compressed (gzip/brotli) once, and again only when the template changes
+static_assets = StaticAssetCache()
+INDEX_TEMPLATE = os.path.join(app.root_path, app.template_folder, 'index.html')
+job_pool = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'])
+
+RENDER_DPI = 300
+# Fallback page size (A4, in points) when the PDF cannot be inspected
+DEFAULT_PAGE_SIZE = (595, 842)
+
 ALLOWED_EXTENSIONS = {'pdf'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def pdf_to_image(pdf_path):
-    """Convert PDF to image using pdf2image"""
+def get_cpu_pool():
+    """The process pool, started on first call (None when disabled)"""
+    global cpu_pool
+    if cpu_pool is None and app.config['CPU_WORKERS'] and not in_worker_process():
+        with cpu_pool_lock:
+            if cpu_pool is None:
+                cpu_pool = CpuPool(app.config['CPU_WORKERS'])
+    return cpu_pool
+
+def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-heavy function on the process pool (in this thread when the pool is disabled)"""
+    pool = get_cpu_pool()
+    if pool:
+        return pool.run(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+def page_size_points(pdf_path, page_number=1):
+    """Width and height of a page in PDF points (1/72 inch), honouring /Rotate"""
     try:
-        images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=1)
-        if images:
-            return images[0]
-        return None
+        return run_cpu(page_size, pdf_path, page_number)
+    except Exception as e:
+        print(f"Could not read page size, assuming A4: {e}")
+        return DEFAULT_PAGE_SIZE
+
+def render_dpi(page_size, max_pixels, dpi=RENDER_DPI):
+    """Highest DPI up to `dpi` whose render stays within max_pixels"""
+    width, height = page_size
+    pixels = (width / 72 * dpi) * (height / 72 * dpi)
+    if pixels <= max_pixels:
+        return dpi
+    return max(36, int(dpi * math.sqrt(max_pixels / pixels)))
+
+def pdf_to_png(pdf_path, dpi=RENDER_DPI):
+    """
+    First page rendered with the configured rasterizer and PNG encoded, on the
+    process pool (the PNG comes back through shared memory)
+    Returns (PNG bytes or None, pixel buffer bytes)
+    """
+    try:
+        pool = get_cpu_pool()
+        if pool:
+            return pool.render_png(pdf_path, 1, dpi=dpi, backend=app.config['RASTERIZER'])
+        return render_png_bytes(pdf_path, 1, dpi=dpi, backend=app.config['RASTERIZER'])
     except Exception as e:
         print(f"Error converting PDF to image: {e}")
-        return None
+        return None, 0
 
 def encode_image_to_base64(image):
     """Convert PIL Image to base64 string"""
@@ -43,56 +202,83 @@ def encode_image_to_base64(image):
     img_str = base64.b64encode(buffered.getvalue()).decode()
     return img_str
 
-def extract_invoice_data_with_gemini(api_key, pdf_path, image, column_config):
-    """Extract invoice data using Gemini 2.5 Pro"""
+def render_page_png(pdf_path, doc_hash=None):
+    """
+    Render page 1 as a base64 PNG within the pixel cap and memory budget
+    Returns (img_base64 or None, memory stats for the response)
+    """
+    # The render is fully determined by the document, the backend and the render settings
+    cache_key = None
+    if doc_hash:
+        options = f"max_pixels={app.config['MAX_PAGE_PIXELS']};rasterizer={app.config['RASTERIZER']}"
+        cache_key = PageImageCache.key(doc_hash, 1, RENDER_DPI, 'PNG', options)
+        cached = page_cache.get(cache_key)
+        if cached:
+            img_base64 = base64.b64encode(cached).decode()
+            return img_base64, {"cache_hit": True, "rasterizer": app.config['RASTERIZER'],
+                                "peak_bytes": len(cached) + len(img_base64)}
+    
+    page_size = page_size_points(pdf_path)
+    dpi = render_dpi(page_size, app.config['MAX_PAGE_PIXELS'])
+    pixels = int((page_size[0] / 72 * dpi) * (page_size[1] / 72 * dpi))
+    # The backend's raw output (pdfium bitmap, poppler PPM) and the decoded RGB image are both alive while rendering
+    estimate = pixels * 3 * 2
+    
+    wait_started = time.monotonic()
+    with raster_budget.reserve(estimate, timeout=app.config['RASTER_BUDGET_TIMEOUT']) as reserved:
+        budget_wait = time.monotonic() - wait_started
+        # The pixel buffer is freed before the (slow) Gemini call
+        png, image_bytes = pdf_to_png(pdf_path, dpi=dpi)
+        if png is None:
+            return None, None
+        img_base64 = base64.b64encode(png).decode()
+    
+    png_bytes = len(png)
+    if cache_key:
+        page_cache.put(cache_key, bytes(png))
+    
+    memory = {
+        "cache_hit": False,
+        "rasterizer": app.config['RASTERIZER'],
+        "dpi": dpi,
+        "pixels": pixels,
+        "reserved_bytes": reserved,
+        "budget_wait_ms": round(budget_wait * 1000, 1),
+        # Pixel buffer and encoded PNG in the renderer, the PNG copied out of shared memory, its base64 form
+        "peak_bytes": image_bytes + 2 * png_bytes + len(img_base64),
+    }
+    return img_base64, memory
+
+def extract_invoice_data_with_gemini(api_key, pdf_path, image, column_config, on_field=None, metrics=None,
+                                     model_name=MODEL_NAME):
+    """
+    Extract invoice data using Gemini
+    The response is streamed: on_field(name, value) fires as each field completes
+    and metrics (a dict) receives time_to_first_field and the other timings
+    """
     try:
         # Configure Gemini
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        model = genai.GenerativeModel(model_name)
         
-        # Prepare column descriptions for the prompt
-        column_descriptions = []
-        for col in column_config:
-            column_descriptions.append(f"- {col['name']}: {col['description']}")
+        # Instructions and column schema, shared with the Vercel functions and
+        # registered as cached context when long enough for the model
+        prefix = extraction_prefix(column_config)
         
-        column_descriptions_text = "\n".join(column_descriptions)
-        
-        # Create the prompt
-        prompt = f"""
-        You are an expert at extracting data from invoices. Please analyze the provided invoice (both PDF and image versions) and extract the following information:
-
-        {column_descriptions_text}
-
-        Please return the data in JSON format with the exact column names provided above. If any information is not found, use null for that field.
-
-        Example format:
-        {{
-            "column_name_1": "extracted_value_1",
-            "column_name_2": "extracted_value_2",
-            ...
-        }}
-
-        Extract the data now:
-        """
-        
-        # Prepare the content for Gemini
-        content = [prompt]
-        
-        # Add image if available
+        # Add image if available (a PIL image, or a PNG already base64 encoded)
         if image:
-            img_base64 = encode_image_to_base64(image)
-            content.append({
-                "mime_type": "image/png",
-                "data": img_base64
-            })
-        
-        # Generate response
-        response = model.generate_content(content)
+            img_base64 = image if isinstance(image, str) else encode_image_to_base64(image)
+            # Large page images are uploaded once and sent by reference
+            part, ref_hash = document_part(api_key, img_base64, mime_type="image/png")
+            inline = {"mime_type": "image/png", "data": img_base64}
+            response_text = generate_with_prefix(model, api_key, model_name, prefix, part, ref_hash, inline,
+                                                 on_field, metrics)
+        else:
+            response_text = generate_streaming(model, [prefix], on_field, metrics)
         
         # Parse the JSON response
         try:
             # Extract JSON from the response text
-            response_text = response.text
             # Find JSON in the response
             start_idx = response_text.find('{')
             end_idx = response_text.rfind('}') + 1
@@ -110,22 +296,291 @@ def extract_invoice_data_with_gemini(api_key, pdf_path, image, column_config):
     except Exception as e:
         return {"error": f"Gemini API error: {e}"}
 
+def materialize_entry_workbook(entry):
+    """Build (or reuse) the single-invoice workbook for a ledger entry"""
+    extracted_data = entry['extracted_data']
+    # Typed cells (dates, amounts, currency) from the entry's column configuration
+    columns = ledger.column_definitions_for(config_id=entry['config_id']) or list(extracted_data.keys())
+    content_key = json.dumps([extracted_data, columns], default=str)
+    
+    def write_excel(path):
+        write_xlsx(path, [entry], columns, include_metadata=False)
+    
+    return output_store.put(content_key, write_excel)
+
+def materialize_batch_workbook(entries):
+    """Build (or reuse) one workbook with a row per ledger entry, for the invoices of one upload"""
+    columns = (ledger.column_definitions_for(config_id=entries[0]['config_id'])
+               or list(entries[0]['extracted_data'].keys()))
+    content_key = json.dumps([[entry['extracted_data'] for entry in entries], columns], default=str)
+    
+    def write_excel(path):
+        write_xlsx(path, entries, columns, include_metadata=False)
+    
+    return output_store.put(content_key, write_excel)
+
+def read_pdf_text(file_path, text_options=None):
+    """Text of the PDF for the search index ("" when it cannot be extracted)"""
+    try:
+        return run_cpu(extract_text, file_path, **(text_options or {}))
+    except Exception as e:
+        print(f"Text extraction for search index failed: {e}")
+        return ""
+
+def index_invoice(pdf_text, doc_hash, extracted_data, column_config, entry_id, source_name):
+    """Add a processed invoice to the search index (never fails the request)"""
+    try:
+        invoice_index.add(doc_hash, pdf_text, extracted_data, column_config,
+                          entry_id=entry_id, source_name=source_name)
+    except Exception as e:
+        print(f"Error indexing invoice: {e}")
+
+def find_near_duplicate(pdf_text, doc_hash):
+    """Closest previously processed document with nearly the same text, or None (never fails the request)"""
+    try:
+        return near_duplicates.find(pdf_text, exclude_hash=doc_hash)
+    except Exception as e:
+        print(f"Near-duplicate lookup failed: {e}")
+        return None
+
+def remember_signature(pdf_text, doc_hash, entry_id):
+    try:
+        near_duplicates.add(doc_hash, pdf_text, entry_id=entry_id)
+    except Exception as e:
+        print(f"Error adding near-duplicate signature: {e}")
+
+def parse_ledger_range(args):
+    """Read and validate start/end/config_id query parameters"""
+    start = args.get('start') or None
+    end = args.get('end') or None
+    for value in (start, end):
+        if value:
+            datetime.fromisoformat(value)
+    return start, end, args.get('config_id') or None
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    asset = static_assets.get(INDEX_TEMPLATE, render=lambda: render_template('index.html').encode('utf-8'),
+                              content_type='text/html; charset=utf-8')
+    if asset.not_modified(request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+        return Response(status=304, headers=asset.headers())
+    
+    body, encoding = asset.body(request.headers.get('Accept-Encoding'))
+    response = Response(body, content_type=asset.content_type, headers=asset.headers())
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
+@app.after_request
+def compress_response(response):
+    """gzip/brotli compress JSON and text responses when the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or not is_compressible(response.content_type)):
+        return response
+    
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def process_upload(file_path, filename, api_key, column_config, progress=None, batch_id=None,
+                   queue_over_budget=False, text_options=None, refresh=False):
+    """
+    Run an uploaded PDF through the pipeline and delete it afterwards
+    progress(stage, **data) is called as each stage completes
+    text_options (backend, layout) choose how the PDF's text is extracted
+    Model usage is recorded under batch_id; over the key's hourly budget the
+    upload is refused (429) or, with queue_over_budget, waits for room
+    refresh re-extracts every column instead of reusing cached fields
+    Returns (response dict, HTTP status)
+    """
+    def report(stage, **data):
+        if progress:
+            progress(stage, **data)
+    
     try:
-        # Get form data
-        api_key = request.form.get('api_key')
-        column_config = json.loads(request.form.get('column_config', '[]'))
+        doc_hash = document_hash(file_path)
+        report("received", document_hash=doc_hash)
+        
+        pdf_text = read_pdf_text(file_path, text_options)
+        report("text_extracted", chars=len(pdf_text))
         
-        if not api_key:
-            return jsonify({"error": "API key is required"}), 400
+        # Only columns that are new or changed since the last run go to Gemini
+        cached_fields, missing_columns = {}, column_config
+        if not refresh:
+            cached_fields, missing_columns = field_cache.lookup(doc_hash, column_config)
         
-        if not column_config:
-            return jsonify({"error": "Column configuration is required"}), 400
+        # A re-scan or re-export of an invoice we already processed is flagged, and
+        # optionally answered from that invoice's stored fields - only when both carry
+        # the same numbers and identifiers, so the next invoice of a series is extracted
+        near_duplicate = find_near_duplicate(pdf_text, doc_hash) if missing_columns else None
+        if near_duplicate:
+            report("near_duplicate", **near_duplicate)
+            if app.config['REUSE_NEAR_DUPLICATES'] and near_duplicate['same_identifiers'] and not refresh:
+                # Reused fields answer this upload only; they are not cached under this document
+                reused, missing_columns = field_cache.lookup(near_duplicate['document_hash'], missing_columns)
+                cached_fields.update(reused)
+                near_duplicate['fields_reused'] = len(reused)
+        memory = None
+        timing = {}
+        usage = None
+        cascade = None
+        fresh_fields = {}
+        
+        if missing_columns:
+            try:
+                if queue_over_budget:
+                    usage_meter.wait_for_budget(
+                        api_key, timeout=app.config['BUDGET_QUEUE_TIMEOUT'],
+                        on_wait=lambda e: report("budget_wait", retry_after=e.retry_after, spent_usd=e.spent)
+                    )
+                else:
+                    usage_meter.check_budget(api_key)
+            except BudgetExceeded as e:
+                return {"error": str(e), "retry_after": e.retry_after}, 429
+            
+            # Convert PDF to image (bounded by the shared memory budget)
+            try:
+                image, memory = render_page_png(file_path, doc_hash)
+            except MemoryBudgetExceeded:
+                return {"error": "Server busy rendering other invoices, please retry"}, 503
+            if not image:
+                return {"error": "Failed to convert PDF to image"}, 500
+            report("rendered", memory=memory)
+            
+            # Extract data with the cheap model first, escalating fields that fail
+            # validation; each field is reported as soon as it streams in
+            def extract(model_name, columns, metrics):
+                report("model_call_started", model=model_name, columns=[col['name'] for col in columns])
+                result = extract_invoice_data_with_gemini(
+                    api_key, file_path, image, columns,
+                    on_field=lambda name, value: report("field", name=name, value=value),
+                    metrics=metrics, model_name=model_name
+                )
+                # First-token/field timings are the first call's; model time adds up
+                for key in ('time_to_first_token', 'time_to_first_field'):
+                    if key in metrics:
+                        timing.setdefault(key, metrics[key])
+                timing['total_seconds'] = round(timing.get('total_seconds', 0) + metrics.get('total_seconds', 0), 3)
+                return result
+            
+            fresh_fields, cascade = run_cascade(extract, missing_columns)
+            for call_usage in cascade['usage']:
+                usage_meter.record(api_key, call_usage, batch_id=batch_id)
+            usage = sum_usage(cascade['usage'])
+            cascade = {key: cascade[key] for key in ("models", "escalated_fields", "failures")}
+            
+            if "error" in fresh_fields:
+                return fresh_fields, 500
+            
+            field_cache.store(doc_hash, missing_columns, fresh_fields, failed=cascade['failures'])
+        
+        extracted_data = merge_fields(column_config, cached_fields, fresh_fields)
+        report("fields_parsed", extracted_data=extracted_data, fields_reused=len(cached_fields))
+        
+        # Record the result; the workbook is built on first download
+        entry_id = ledger.append(extracted_data, doc_hash, column_config, source_name=filename)
+        excel_filename = f"invoice_{entry_id}.xlsx"
+        report("workbook_ready", excel_file=excel_filename)
+        index_invoice(pdf_text, doc_hash, extracted_data, column_config, entry_id, filename)
+        remember_signature(pdf_text, doc_hash, entry_id)
+    finally:
+        # Clean up uploaded file, even when processing failed
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    
+    return {
+        "success": True,
+        "message": "Invoice data extracted successfully",
+        "extracted_data": extracted_data,
+        "entry_id": entry_id,
+        "excel_file": excel_filename,
+        "fields_extracted": len(missing_columns),
+        "fields_reused": len(cached_fields),
+        "memory": memory,
+        "timing": timing,
+        "usage": usage,
+        "cascade": cascade,
+        "near_duplicate": near_duplicate
+    }, 200
+
+def split_invoices(file_path, filename, text_options=None):
+    """
+    Split a PDF holding several invoices into one temporary file per invoice
+    Returns [(file_path, filename)]; single-invoice PDFs are returned as they are
+    """
+    try:
+        segments = detect_invoices(texts=run_cpu(page_texts, file_path, **(text_options or {})))
+    except Exception as e:
+        print(f"⚠️ Invoice boundary detection failed: {e}")
+        return [(file_path, filename)]
+    if len(segments) < 2:
+        return [(file_path, filename)]
+    
+    stem = os.path.splitext(filename)[0]
+    parts = []
+    for number, (segment, pdf_bytes) in enumerate(zip(segments, split_pdf(file_path, segments)), start=1):
+        part_name = f"{stem}_invoice{number}.pdf"
+        part_path = upload_store.new_temp_path(part_name)
+        with open(part_path, 'wb') as f:
+            f.write(pdf_bytes)
+        parts.append((part_path, part_name))
+    os.remove(file_path)
+    print(f"✂️ {filename}: {len(parts)} invoices")
+    return parts
+
+def read_text_options(values=None):
+    """
+    Optional text_backend / text_layout form fields
+    Raises ValueError for an unknown backend
+    """
+    values = request.form if values is None else values
+    backend = values.get('text_backend') or None
+    if backend:
+        choose_text_backend(backend)
+    return {"backend": backend, "layout": parse_layout(values.get('text_layout'))}
+
+def read_flag(name, values=None):
+    """A yes/no form or JSON field ('1', 'true', 'yes', 'on' or true); absent is no"""
+    values = request.form if values is None else values
+    value = values.get(name)
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def read_upload_form(values=None):
+    """Validate api_key and column_config form fields; returns (api_key, column_config, error)"""
+    values = request.form if values is None else values
+    api_key = values.get('api_key')
+    column_config = values.get('column_config', '[]')
+    if isinstance(column_config, str):
+        column_config = json.loads(column_config)
+    
+    if not api_key:
+        return None, None, "API key is required"
+    
+    if not column_config:
+        return None, None, "Column configuration is required"
+    
+    return api_key, column_config, None
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    try:
+        api_key, column_config, error = read_upload_form()
+        if error:
+            return jsonify({"error": error}), 400
+        try:
+            text_options = read_text_options()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Check if file is uploaded
         if 'file' not in request.files:
@@ -137,51 +592,383 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            # Unique name so concurrent uploads of the same file never collide
+            file_path = upload_store.new_temp_path(filename)
             file.save(file_path)
             
-            # Convert PDF to image
-            image = pdf_to_image(file_path)
-            if not image:
-                return jsonify({"error": "Failed to convert PDF to image"}), 500
+            refresh = read_flag('refresh')
+            parts = split_invoices(file_path, filename, text_options)
+            if len(parts) == 1:
+                body, status = process_upload(file_path, filename, api_key, column_config,
+                                              text_options=text_options, refresh=refresh)
+                return jsonify(body), status, retry_after_header(body)
             
-            # Extract data using Gemini
-            extracted_data = extract_invoice_data_with_gemini(api_key, file_path, image, column_config)
-            
-            if "error" in extracted_data:
-                return jsonify(extracted_data), 500
-            
-            # Create Excel file
-            df = pd.DataFrame([extracted_data])
-            excel_filename = f"invoice_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            excel_path = os.path.join(app.config['OUTPUT_FOLDER'], excel_filename)
-            df.to_excel(excel_path, index=False)
-            
-            # Clean up uploaded file
-            os.remove(file_path)
-            
-            return jsonify({
-                "success": True,
-                "message": "Invoice data extracted successfully",
-                "extracted_data": extracted_data,
-                "excel_file": excel_filename
-            })
+            # One ledger entry (and row) per invoice, extracted in parallel
+            batch_id = uuid.uuid4().hex
+            results = list(job_pool.map(
+                lambda part: process_upload(part[0], part[1], api_key, column_config, batch_id=batch_id,
+                                            text_options=text_options, refresh=refresh),
+                parts
+            ))
+            invoices = [dict(body, filename=part[1], status=status) for part, (body, status) in zip(parts, results)]
+            succeeded = [invoice for invoice in invoices if invoice['status'] == 200]
+            if not succeeded:
+                return jsonify(invoices[0]), invoices[0]['status'], retry_after_header(invoices[0])
+            # One workbook with a row per extracted invoice; each invoice keeps its own as well
+            entries = [ledger.get(invoice['entry_id']) for invoice in succeeded]
+            return jsonify(dict(
+                succeeded[0],
+                excel_file=materialize_batch_workbook(entries),
+                message=f"Extracted {len(succeeded)} of {len(invoices)} invoices",
+                invoices=invoices,
+                usage=usage_meter.totals(batch_id=batch_id)
+            ))
         
         return jsonify({"error": "Invalid file type"}), 400
         
     except Exception as e:
         return jsonify({"error": f"Server error: {e}"}), 500
 
+def retry_after_header(body):
+    """Retry-After for budget refusals"""
+    return {"Retry-After": str(body['retry_after'])} if 'retry_after' in body else {}
+
+def run_job_document(job_id, index, file_path, filename, api_key, column_config, text_options=None, refresh=False):
+    """Process one document of a job, pushing its progress and result as events"""
+    def progress(stage, **data):
+        progress_hub.emit(job_id, stage, document=index, filename=filename, **data)
+    
+    try:
+        # The job is the batch; over budget its documents wait rather than fail
+        body, status = process_upload(file_path, filename, api_key, column_config, progress,
+                                      batch_id=job_id, queue_over_budget=True, text_options=text_options,
+                                      refresh=refresh)
+    except Exception as e:
+        body, status = {"error": f"Server error: {e}"}, 500
+    finally:
+        upload_store.unpin(file_path)
+    
+    ok = status == 200
+    progress_hub.emit(job_id, "result" if ok else "error", document=index, filename=filename,
+                      status=status, **body)
+    progress_hub.document_done(job_id, ok)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Start extracting one or more uploaded PDFs in the background
+    Progress and per-document results stream from /jobs/<id>/events
+    """
+    try:
+        api_key, column_config, error = read_upload_form()
+        if error:
+            return jsonify({"error": error}), 400
+        try:
+            text_options = read_text_options()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        files = [f for f in request.files.getlist('file') if f.filename]
+        if not files:
+            return jsonify({"error": "No file uploaded"}), 400
+        if not all(allowed_file(f.filename) for f in files):
+            return jsonify({"error": "Invalid file type"}), 400
+        
+        saved = []
+        for file in files:
+            filename = secure_filename(file.filename)
+            file_path = upload_store.new_temp_path(filename)
+            file.save(file_path)
+            saved.extend(split_invoices(file_path, filename, text_options))
+        
+        job_id = start_job(saved, api_key, column_config, text_options, refresh=read_flag('refresh'))
+        
+        return jsonify({
+            "job_id": job_id,
+            "documents": len(saved),
+            "events_url": f"/jobs/{job_id}/events",
+        }), 202
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+def start_job(documents, api_key, column_config, text_options=None, refresh=False):
+    """Queue saved (file_path, filename) documents as a background job; returns the job id"""
+    job_id = progress_hub.create(total=len(documents))
+    for index, (file_path, filename) in enumerate(documents):
+        # A document can wait longer than UPLOAD_TTL_SECONDS for a worker or for budget
+        upload_store.pin(file_path)
+        progress_hub.emit(job_id, "queued", document=index, filename=filename)
+        job_pool.submit(run_job_document, job_id, index, file_path, filename, api_key, column_config, text_options,
+                        refresh)
+    return job_id
+
+@app.route('/uploads', methods=['POST'])
+def initiate_upload():
+    """Start a chunked upload: JSON {filename, size, sha256}"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "Invalid file type"}), 400
+    try:
+        upload = chunked_uploads.initiate(filename, data.get('size'), data.get('sha256'))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify(upload), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Chunks received so far, so an interrupted client knows what to resend"""
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    try:
+        chunked_uploads.abort(upload_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify({"success": True})
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Store one chunk (raw request body), streamed to its offset on disk"""
+    try:
+        status = chunked_uploads.write_chunk(upload_id, index, request.stream,
+                                             content_length=request.content_length,
+                                             chunk_sha256=request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify(status)
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """
+    Verify the assembled file against its SHA-256 and start extracting it
+    Body (JSON or form): api_key, column_config and optionally sha256, text_backend,
+    text_layout and refresh
+    """
+    try:
+        values = request.get_json(silent=True) or request.form
+        api_key, column_config, error = read_upload_form(values)
+        if error:
+            return jsonify({"error": error}), 400
+        try:
+            text_options = read_text_options(values)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        status = chunked_uploads.status(upload_id)
+        file_path = upload_store.new_temp_path(status['filename'])
+        filename, doc_hash = chunked_uploads.finalize(upload_id, file_path, values.get('sha256'))
+        
+        job_id = start_job(split_invoices(file_path, filename, text_options), api_key, column_config, text_options,
+                           refresh=read_flag('refresh', values))
+        return jsonify({
+            "job_id": job_id,
+            "document_hash": doc_hash,
+            "events_url": f"/jobs/{job_id}/events",
+        }), 202
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Counts and the full event log of a job"""
+    snapshot = progress_hub.snapshot(job_id)
+    if snapshot is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(dict(snapshot, usage=usage_meter.totals(batch_id=job_id)))
+
+@app.route('/jobs/<job_id>/workbook')
+def job_workbook(job_id):
+    """One workbook with a row per invoice the job has extracted so far"""
+    snapshot = progress_hub.snapshot(job_id)
+    if snapshot is None:
+        return jsonify({"error": "Job not found"}), 404
+    results = sorted((event['data'] for event in snapshot['events']
+                      if event['event'] == 'result' and event['data'].get('entry_id')),
+                     key=lambda result: result['document'])
+    entries = [entry for entry in (ledger.get(result['entry_id']) for result in results) if entry]
+    if not entries:
+        return jsonify({"error": "No invoices extracted yet"}), 404
+    try:
+        excel_filename = materialize_batch_workbook(entries)
+        return send_file(os.path.abspath(output_store.path_for(excel_filename)), as_attachment=True,
+                         download_name=f'invoices_{job_id[:8]}.xlsx', conditional=True)
+    except Exception as e:
+        return jsonify({"error": f"Download error: {e}"}), 500
+
+@app.route('/usage')
+def usage_report():
+    """
+    Model tokens and estimated cost: overall and per API key (fingerprint) for
+    the last hour, or for one batch/job with ?batch_id=
+    """
+    batch_id = request.args.get('batch_id')
+    if batch_id:
+        return jsonify({"batch_id": batch_id, **usage_meter.totals(batch_id=batch_id)})
+    return jsonify({
+        "hourly_budget_usd": usage_meter.hourly_budget_usd,
+        "total": usage_meter.totals(),
+        "last_hour": usage_meter.totals_by_key(since=time.time() - 3600),
+        "cascade": cascade_stats.snapshot(),
+    })
+
+@app.route('/metrics')
+def metrics():
+    """CPU pool utilisation and queue waits, and the raster memory budget"""
+    return jsonify({
+        "cpu_pool": cpu_pool.stats() if cpu_pool else None,
+        "raster_budget": raster_budget.stats(),
+    })
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent event stream of a job's progress; resumes from Last-Event-ID"""
+    if progress_hub.snapshot(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        after = 0
+    
+    def stream():
+        yield "retry: 2000\n\n"
+        for event in progress_hub.events(job_id, after):
+            # Comment lines keep idle connections open through proxies
+            yield format_sse(event) if event else ": keepalive\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
-        file_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True)
+        file_path = output_store.path_for(filename)
+        
+        # Per-invoice workbooks are materialized from the ledger on demand
+        match = LEDGER_FILENAME.match(filename)
+        if not file_path and match:
+            entry = ledger.get(int(match.group(1)))
+            if entry:
+                file_path = output_store.path_for(materialize_entry_workbook(entry))
+        
+        if file_path:
+            # conditional=True answers Range and If-None-Match requests; the
+            # file itself is streamed via wsgi.file_wrapper (sendfile where the
+            # server supports it) or X-Sendfile when USE_X_SENDFILE is set
+            return send_file(os.path.abspath(file_path), as_attachment=True,
+                             download_name=filename, conditional=True)
         else:
             return jsonify({"error": "File not found"}), 404
     except Exception as e:
         return jsonify({"error": f"Download error: {e}"}), 500
 
+@app.route('/ledger/profiles')
+def ledger_profiles():
+    """List the column configurations recorded in the ledger"""
+    return jsonify({"profiles": ledger.profiles()})
+
+@app.route('/ledger/export')
+def ledger_export():
+    """Consolidated workbook, CSV, JSON Lines, Parquet or Arrow file for a date range and/or column profile"""
+    try:
+        start, end, config_id = parse_ledger_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date: {e}"}), 400
+    
+    export_format = request.args.get('format', 'xlsx').lower()
+    
+    try:
+        if export_format == 'csv':
+            columns = ledger.columns_for(start, end, config_id)
+            rows = ledger.iter_entries(start, end, config_id)
+            return Response(
+                stream_with_context(iter_csv(rows, columns)),
+                mimetype='text/csv',
+                headers={"Content-Disposition": "attachment; filename=invoice_ledger.csv"}
+            )
+        
+        # Typed exports normalize values (dates, amounts with their currency) per column definition
+        definitions = ledger.column_definitions_for(start, end, config_id)
+        
+        if export_format == 'jsonl':
+            rows = ledger.iter_entries(start, end, config_id)
+            return Response(
+                stream_with_context(iter_jsonl(rows, definitions)),
+                mimetype=EXPORT_FORMATS['jsonl']['mimetype'],
+                headers={"Content-Disposition": "attachment; filename=invoice_ledger.jsonl"}
+            )
+        
+        if export_format == 'xlsx':
+            # The same range with no new entries maps to the same stored file
+            summary = ledger.summary(start, end, config_id)
+            content_key = json.dumps([start, end, config_id, summary, definitions])
+            
+            def write_excel(path):
+                write_xlsx(path, ledger.iter_entries(start, end, config_id), definitions)
+            
+            excel_filename = output_store.put(content_key, write_excel, prefix='invoice_ledger')
+            return send_file(os.path.abspath(output_store.path_for(excel_filename)), as_attachment=True,
+                             download_name='invoice_ledger.xlsx', conditional=True)
+        
+        if export_format in ('parquet', 'arrow'):
+            summary = ledger.summary(start, end, config_id)
+            content_key = json.dumps([start, end, config_id, summary, definitions, export_format])
+            extension = EXPORT_FORMATS[export_format]['extension']
+            
+            def write_export(path):
+                export_entries(export_format, path, ledger.iter_entries(start, end, config_id), definitions)
+            
+            export_filename = output_store.put(content_key, write_export, prefix='invoice_ledger', extension=extension)
+            return send_file(os.path.abspath(output_store.path_for(export_filename)), as_attachment=True,
+                             download_name=f'invoice_ledger{extension}',
+                             mimetype=EXPORT_FORMATS[export_format]['mimetype'], conditional=True)
+        
+        return jsonify({"error": f"Unsupported export format: {export_format}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Export error: {e}"}), 500
+
+@app.route('/search')
+def search_invoices():
+    """Search processed invoices by text, vendor, amount range, date range or field"""
+    args = request.args
+    try:
+        number = lambda name: float(args[name]) if args.get(name) else None
+        results = invoice_index.search(
+            q=args.get('q') or None,
+            vendor=args.get('vendor') or None,
+            min_amount=number('min_amount'),
+            max_amount=number('max_amount'),
+            date_from=args.get('date_from') or None,
+            date_to=args.get('date_to') or None,
+            field=args.get('field') or None,
+            value=args.get('value') or None,
+            field_min=number('field_min'),
+            field_max=number('field_max'),
+            limit=min(int(args.get('limit', 50)), 500),
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid search parameter: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Search error: {e}"}), 500
+    
+    return jsonify({"results": results, "count": len(results)})
+
+# Build the compressed page variants before the first request
+with app.test_request_context():
+    index()
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    use_reloader = True
+    # Warm the worker processes before the first request, in the process that
+    # serves requests: with the reloader, only the child it starts
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not use_reloader:
+        get_cpu_pool()
+    app.run(debug=True, use_reloader=use_reloader, host='0.0.0.0', port=5001)
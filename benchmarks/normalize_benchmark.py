@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized normalization vs value-by-value parsing
+
+    python benchmarks/normalize_benchmark.py --rows 100000
+
+Generates a batch of free-form extracted values (amounts in several locales,
+dates in several formats, percentages, currencies) and times normalize_frame
+against calling value_parsing's parsers on every value.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'vercel-app', 'api'))
+
+import pandas as pd
+
+from normalize import normalize_frame
+from value_parsing import column_type, parse_amount, parse_date, parse_percentage
+
+COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number"},
+    {"name": "Invoice Date", "description": "Invoice date"},
+    {"name": "Due Date", "description": "Payment due date"},
+    {"name": "Subtotal", "description": "Net amount"},
+    {"name": "VAT Rate", "description": "Tax rate"},
+    {"name": "Total Amount", "description": "Total invoice amount"},
+]
+AMOUNT_STYLES = [
+    lambda v: f"${v:,.2f}",
+    lambda v: f"{v:,.2f} €".replace(",", "_").replace(".", ",").replace("_", "."),
+    lambda v: f"USD {v:.2f}",
+    lambda v: f"£ {v:,.2f}",
+    lambda v: f"({v:.2f})",
+    lambda v: f"CHF {v:,.2f}".replace(",", "'"),
+    lambda v: v,
+]
+DATE_STYLES = ['%Y-%m-%d', '%m/%d/%Y', '%d.%m.%Y', '%B %d, %Y', '%b %d %Y', '%d %b %Y']
+RATES = ["7.5%", "7,5 %", "20%", "19 %", 19, None]
+
+
+def make_batch(rows, seed=7):
+    """Messy values as a model returns them: every amount distinct, dates over three years"""
+    rng = random.Random(seed)
+    start = pd.Timestamp('2023-01-01')
+
+    def amount():
+        return rng.choice(AMOUNT_STYLES)(round(rng.uniform(1, 250000), 2)) if rng.random() > 0.05 else None
+
+    def day():
+        if rng.random() < 0.05:
+            return rng.choice([None, "upon receipt"])
+        return (start + pd.Timedelta(days=rng.randrange(3 * 365))).strftime(rng.choice(DATE_STYLES))
+
+    return pd.DataFrame({
+        "Invoice Number": [f"INV-{i}" for i in range(rows)],
+        "Invoice Date": [day() for _ in range(rows)],
+        "Due Date": [day() for _ in range(rows)],
+        "Subtotal": [amount() for _ in range(rows)],
+        "VAT Rate": [rng.choice(RATES) for _ in range(rows)],
+        "Total Amount": [amount() for _ in range(rows)],
+    }, dtype=object)
+
+
+def per_value(frame):
+    parsers = {'date': parse_date, 'number': lambda v: parse_amount(v)[0], 'percent': parse_percentage}
+    result = {}
+    for col in COLUMNS:
+        parser = parsers.get(column_type(col))
+        values = frame[col['name']].tolist()
+        result[col['name']] = [parser(v) for v in values] if parser else values
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--skip-baseline', action='store_true', help="Only time the vectorized path")
+    args = parser.parse_args()
+
+    frame = make_batch(args.rows)
+    print(f"📊 Normalizing {args.rows:,} rows × {len(COLUMNS)} columns")
+
+    started = time.perf_counter()
+    typed = normalize_frame(frame, COLUMNS)
+    vectorized = time.perf_counter() - started
+    print(f"   Vectorized:      {vectorized:.2f}s ({args.rows / vectorized:,.0f} rows/s)")
+    print(f"   Parsed values:   {int(typed['Total Amount'].notna().sum()):,} amounts, "
+          f"{int(typed['Invoice Date'].notna().sum()):,} dates")
+
+    if not args.skip_baseline:
+        started = time.perf_counter()
+        per_value(frame)
+        baseline = time.perf_counter() - started
+        print(f"   Value by value:  {baseline:.2f}s ({args.rows / baseline:,.0f} rows/s)")
+        print(f"   Speed-up:        {baseline / vectorized:.1f}×")
+
+
+if __name__ == "__main__":
+    main()
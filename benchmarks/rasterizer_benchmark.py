@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: page render latency and memory per rasterizer backend
+
+    python benchmarks/rasterizer_benchmark.py --dpi 300 --pages 3
+    python benchmarks/rasterizer_benchmark.py --pdf-dir ./invoices
+
+Renders every page of the corpus (synthetic invoices unless --pdf-dir is
+given) with each available backend. Each backend runs in its own fresh
+process, so its peak RSS, and the peak of any subprocess it starts
+(pdftoppm), is measured on its own.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'vercel-app', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import PyPDF2
+
+from rasterizer import RASTERIZERS, available_rasterizers, render_page
+from sample_pdfs import corpus
+
+
+def peak_rss(who):
+    """Peak resident set size in bytes (ru_maxrss is KB on Linux, bytes on macOS)"""
+    import resource
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_backend(backend, documents, dpi):
+    """Render every page with one backend; runs in a fresh process"""
+    import io
+    import resource
+
+    # Load the backend with a tiny render, so the growth is what full-size pages add
+    render_page(documents[0][1], 1, dpi=36, backend=backend).close()
+    baseline = peak_rss(resource.RUSAGE_SELF)
+
+    latencies = []
+    pixels = 0
+    for _, pdf_bytes in documents:
+        for page_number in range(1, len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages) + 1):
+            started = time.perf_counter()
+            image = render_page(pdf_bytes, page_number, dpi=dpi, backend=backend)
+            latencies.append(time.perf_counter() - started)
+            pixels = max(pixels, image.width * image.height)
+            image.close()
+    return {
+        "latencies": latencies,
+        "pixels": pixels,
+        "rss_growth": peak_rss(resource.RUSAGE_SELF) - baseline,
+        "subprocess_peak": peak_rss(resource.RUSAGE_CHILDREN),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pdf-dir', help="Benchmark these PDFs instead of synthetic invoices")
+    parser.add_argument('--documents', type=int, default=5, help="Synthetic invoices to generate")
+    parser.add_argument('--pages', type=int, default=3, help="Pages per synthetic invoice")
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--backend', action='append', choices=list(RASTERIZERS),
+                        help="Only these backends (default: every available one)")
+    args = parser.parse_args()
+
+    documents = corpus(args.pdf_dir, count=args.documents, pages=args.pages)
+    if not documents:
+        print(f"❌ No PDFs found in {args.pdf_dir}")
+        return 1
+    backends = args.backend or list(RASTERIZERS)
+    available = available_rasterizers()
+
+    print(f"📊 Rendering {len(documents)} document(s) at {args.dpi} DPI")
+    for backend in backends:
+        if backend not in available:
+            print(f"   {backend:<8} not installed, skipped")
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            result = pool.submit(run_backend, backend, documents, args.dpi).result()
+        latencies = sorted(result['latencies'])
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"   {backend:<8} {len(latencies)} pages: "
+              f"median {statistics.median(latencies) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, "
+              f"{len(latencies) / sum(latencies):.1f} pages/s")
+        print(f"   {'':<8} largest page {result['pixels'] / 1e6:.1f} MP, "
+              f"peak RSS growth {result['rss_growth'] / 1e6:.0f} MB"
+              + (f", pdftoppm peak {result['subprocess_peak'] / 1e6:.0f} MB" if result['subprocess_peak'] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Synthetic invoice PDFs for the benchmarks
+Text-layer invoices (Helvetica, a line-item table with ruled lines, totals),
+written directly as PDF objects so the benchmarks need no PDF authoring library
+"""
+import os
+import random
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_content(rng, number, pages, invoice_number):
+    ops = ["BT /F2 18 Tf 50 790 Td (ACME Office Supplies Ltd) Tj ET"]
+    header = [
+        "12 Market Street, Leeds LS1 4AB - VAT GB123456789",
+        f"Invoice No: {invoice_number}    Invoice Date: 2025-03-{rng.randint(1, 28):02d}",
+        "Bill To: Northwind Traders, 88 Harbour Road, Bristol BS1 5TT",
+        f"Page {number} of {pages}",
+    ]
+    for i, line in enumerate(header):
+        ops.append(f"BT /F1 10 Tf 50 {765 - i * 14} Td ({_escape(line)}) Tj ET")
+
+    # Line-item table: column headers, ruled rows, right-aligned amounts
+    columns = [(50, "Description"), (300, "Qty"), (360, "Unit price"), (470, "Amount")]
+    top = 690
+    for x, title in columns:
+        ops.append(f"BT /F2 10 Tf {x} {top} Td ({title}) Tj ET")
+    ops.append(f"0.5 w 50 {top - 4} m 545 {top - 4} l S")
+    subtotal = 0.0
+    for row in range(30):
+        y = top - 20 - row * 18
+        qty = rng.randint(1, 12)
+        price = round(rng.uniform(2, 400), 2)
+        subtotal += qty * price
+        cells = [(50, f"Item {row + 1} - {rng.choice(['Paper', 'Toner', 'Support', 'Licence', 'Cabling'])}"),
+                 (300, str(qty)), (360, f"{price:,.2f}"), (470, f"{qty * price:,.2f}")]
+        for x, value in cells:
+            ops.append(f"BT /F1 9 Tf {x} {y} Td ({_escape(value)}) Tj ET")
+        ops.append(f"0.2 w 50 {y - 5} m 545 {y - 5} l S")
+
+    if number == pages:
+        vat = subtotal * 0.2
+        for i, (label, value) in enumerate([("Subtotal", subtotal), ("VAT 20%", vat), ("Total due", subtotal + vat)]):
+            ops.append(f"BT /F2 10 Tf 360 {110 - i * 16} Td ({label}) Tj ET")
+            ops.append(f"BT /F1 10 Tf 470 {110 - i * 16} Td (GBP {value:,.2f}) Tj ET")
+    return "\n".join(ops).encode('latin-1')
+
+
+def invoice_pdf(pages=1, seed=0):
+    """Bytes of a text-layer invoice PDF with the given number of pages"""
+    rng = random.Random(seed)
+    invoice_number = f"INV-{2025000 + seed}"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>",
+    ]
+    kids = []
+    for number in range(1, pages + 1):
+        content = _page_content(rng, number, pages, invoice_number)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def corpus(folder=None, count=5, pages=3):
+    """
+    [(name, pdf bytes)]: the PDFs in folder when one is given (searched
+    recursively), otherwise `count` synthetic invoices of `pages` pages
+    """
+    if folder:
+        documents = []
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                if name.lower().endswith('.pdf'):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        documents.append((os.path.relpath(os.path.join(root, name), folder), f.read()))
+        return documents
+    return [(f"synthetic-{seed}.pdf", invoice_pdf(pages, seed)) for seed in range(count)]
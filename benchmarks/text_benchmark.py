@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PDF text extraction throughput and memory per backend
+
+    python benchmarks/text_benchmark.py --documents 20 --pages 10
+    python benchmarks/text_benchmark.py --pdf-dir ./invoices --layout
+
+Extracts every page of the corpus (synthetic invoices unless --pdf-dir is
+given) with each available backend, in plain and, with --layout, layout
+mode. Each run happens in its own fresh process so peak RSS is its own.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'vercel-app', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_text import TEXT_BACKENDS, available_text_backends, extract_pages
+from rasterizer_benchmark import peak_rss
+from sample_pdfs import corpus
+
+
+def run_backend(backend, documents, layout):
+    """Extract every document with one backend; runs in a fresh process"""
+    import resource
+
+    # Modules are already imported; the backend's working memory counts towards the growth
+    baseline = peak_rss(resource.RUSAGE_SELF)
+
+    pages = chars = 0
+    started = time.perf_counter()
+    for _, pdf_bytes in documents:
+        texts = extract_pages(pdf_bytes, backend=backend, layout=layout)
+        pages += len(texts)
+        chars += sum(len(text) for text in texts)
+    return {
+        "seconds": time.perf_counter() - started,
+        "pages": pages,
+        "chars": chars,
+        "rss_growth": peak_rss(resource.RUSAGE_SELF) - baseline,
+        "subprocess_peak": peak_rss(resource.RUSAGE_CHILDREN),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pdf-dir', help="Benchmark these PDFs instead of synthetic invoices")
+    parser.add_argument('--documents', type=int, default=20, help="Synthetic invoices to generate")
+    parser.add_argument('--pages', type=int, default=5, help="Pages per synthetic invoice")
+    parser.add_argument('--layout', action='store_true', help="Also time layout-preserving extraction")
+    parser.add_argument('--backend', action='append', choices=list(TEXT_BACKENDS),
+                        help="Only these backends (default: every available one)")
+    args = parser.parse_args()
+
+    documents = corpus(args.pdf_dir, count=args.documents, pages=args.pages)
+    if not documents:
+        print(f"❌ No PDFs found in {args.pdf_dir}")
+        return 1
+    available = available_text_backends()
+
+    print(f"📊 Extracting text from {len(documents)} document(s)")
+    for backend in args.backend or list(TEXT_BACKENDS):
+        if backend not in available:
+            print(f"   {backend:<10} not installed, skipped")
+            continue
+        # PyPDF2 3.0 has no layout mode
+        for layout in ((False, True) if args.layout and backend != 'pypdf2' else (False,)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                result = pool.submit(run_backend, backend, documents, layout).result()
+            label = backend + (" layout" if layout else "")
+            print(f"   {label:<17} {result['pages'] / result['seconds']:>8.1f} pages/s, "
+                  f"{result['chars'] / result['pages']:,.0f} chars/page, "
+                  f"peak RSS growth {result['rss_growth'] / 1e6:.0f} MB"
+                  + (f", pdftotext peak {result['subprocess_peak'] / 1e6:.0f} MB" if result['subprocess_peak'] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Chunked, resumable uploads
+A client initiates an upload with the file's size and SHA-256, PUTs numbered
+chunks in any order (retrying or resuming only the missing ones), then
+finalizes. Chunks are written straight to their offset in a preallocated
+file on disk, so the whole document is never buffered in memory.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+SHA256 = re.compile(r'^[0-9a-f]{64}$')
+COPY_BLOCK = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Invalid upload request; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkedUploads:
+    """Upload sessions stored as <id>.json metadata plus an <id>.part data file"""
+
+    def __init__(self, folder, max_bytes=512 * 1024 * 1024, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _lock(self, upload_id):
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _paths(self, upload_id):
+        if not UPLOAD_ID.match(upload_id or ''):
+            raise UploadError("Upload not found", 404)
+        base = os.path.join(self.folder, upload_id)
+        return base + '.json', base + '.part'
+
+    def _load(self, upload_id):
+        meta_path, data_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise UploadError("Upload not found or expired", 404)
+        if not os.path.exists(data_path):
+            raise UploadError("Upload not found or expired", 404)
+        return meta
+
+    def _save(self, meta):
+        meta_path, _ = self._paths(meta['upload_id'])
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def initiate(self, filename, size, sha256=None):
+        """Start an upload session; returns its id, chunk size and chunk count"""
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive number of bytes")
+        if size > self.max_bytes:
+            raise UploadError(f"File too large (limit {self.max_bytes} bytes)", 413)
+        if sha256 is not None and not SHA256.match(str(sha256).lower()):
+            raise UploadError("sha256 must be 64 hex characters")
+
+        upload_id = uuid.uuid4().hex
+        _, data_path = self._paths(upload_id)
+        # Sparse preallocation; chunks are written at their offsets
+        with open(data_path, 'wb') as f:
+            f.truncate(size)
+        meta = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "chunk_size": self.chunk_size,
+            "total_chunks": -(-size // self.chunk_size),
+            "received": [],
+        }
+        self._save(meta)
+        return self._status(meta)
+
+    def write_chunk(self, upload_id, index, stream, content_length=None, chunk_sha256=None):
+        """
+        Copy one chunk from a file-like stream to its offset. Re-sending a
+        chunk overwrites it, so clients can simply retry on failure.
+        """
+        meta = self._load(upload_id)
+        if not 0 <= index < meta['total_chunks']:
+            raise UploadError(f"Chunk index must be between 0 and {meta['total_chunks'] - 1}")
+        offset = index * meta['chunk_size']
+        expected = min(meta['chunk_size'], meta['size'] - offset)
+        if content_length is not None and content_length != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes, got {content_length}")
+
+        _, data_path = self._paths(upload_id)
+        digest = hashlib.sha256()
+        written = 0
+        with open(data_path, 'r+b') as f:
+            f.seek(offset)
+            while written < expected:
+                block = stream.read(min(COPY_BLOCK, expected - written))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                written += len(block)
+        if written != expected or stream.read(1):
+            raise UploadError(f"Chunk {index} must be {expected} bytes")
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+            raise UploadError(f"Chunk {index} checksum mismatch", 422)
+
+        with self._lock(upload_id):
+            meta = self._load(upload_id)
+            if index not in meta['received']:
+                meta['received'].append(index)
+                meta['received'].sort()
+            self._save(meta)
+            return self._status(meta)
+
+    def status(self, upload_id):
+        return self._status(self._load(upload_id))
+
+    def _status(self, meta):
+        received = set(meta['received'])
+        return {
+            "upload_id": meta['upload_id'],
+            "filename": meta['filename'],
+            "size": meta['size'],
+            "chunk_size": meta['chunk_size'],
+            "total_chunks": meta['total_chunks'],
+            "received_chunks": len(received),
+            "missing_chunks": [i for i in range(meta['total_chunks']) if i not in received],
+        }
+
+    def finalize(self, upload_id, destination, sha256=None):
+        """
+        Verify that every chunk arrived and the file hash matches, then move
+        the assembled file to destination. Returns (filename, sha256).
+        """
+        with self._lock(upload_id):
+            meta = self._load(upload_id)
+            missing = self._status(meta)['missing_chunks']
+            if missing:
+                raise UploadError(f"{len(missing)} chunk(s) missing, first is {missing[0]}", 409)
+
+            expected = (sha256 or meta['sha256'] or '').lower()
+            if not SHA256.match(expected):
+                raise UploadError("A sha256 of the whole file is required to finalize")
+
+            meta_path, data_path = self._paths(upload_id)
+            digest = hashlib.sha256()
+            with open(data_path, 'rb') as f:
+                for block in iter(lambda: f.read(COPY_BLOCK), b''):
+                    digest.update(block)
+            if digest.hexdigest() != expected:
+                raise UploadError("File checksum mismatch - re-send the chunks or start again", 422)
+
+            os.replace(data_path, destination)
+            os.remove(meta_path)
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+        return meta['filename'], expected
+
+    def abort(self, upload_id):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,192 @@
+"""
+Process pool for the CPU-heavy stages of a request (rasterizing, PNG
+encoding, PDF parsing), so a threaded server can use more than one core
+Workers are started and warmed up (libraries imported) when the pool is
+created, from a forkserver (or spawn) context so the server's threads are
+never forked. Encoded page images come back through shared memory: the worker
+writes the PNG into a block and only its name crosses the process boundary.
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import (current_process, get_all_start_methods, get_context, parent_process,
+                             resource_tracker, shared_memory)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+
+# Queue waits kept for the percentiles
+WAIT_SAMPLES = 1000
+
+
+def in_worker_process():
+    """
+    True inside a pool worker. Spawned workers re-import the server's main module
+    before parent_process() is set, but after they have been given their name
+    """
+    return parent_process() is not None or current_process().name != 'MainProcess'
+
+
+def pool_context():
+    """Forkserver where the platform has it, else spawn; never fork a threaded server"""
+    return get_context('forkserver' if 'forkserver' in get_all_start_methods() else 'spawn')
+
+
+def _warm_up():
+    """Worker initializer: import the rendering and parsing libraries once"""
+    import io  # noqa: F401
+    import PyPDF2  # noqa: F401
+    from PIL import Image  # noqa: F401
+    import pdf_text  # noqa: F401
+    import rasterizer  # noqa: F401
+
+
+def _run(submitted_at, fn, args, kwargs):
+    """Runs in a worker: the task plus when it started and how long it ran"""
+    started_at = time.time()
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, started_at - submitted_at, time.perf_counter() - started
+
+
+def to_shared_memory(data):
+    """Copy bytes into a new shared memory block owned by the receiving process"""
+    block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    block.buf[:len(data)] = data
+    # The parent unlinks the block once it has read it
+    resource_tracker.unregister(block._name, 'shared_memory')
+    block.close()
+    return block.name, len(data)
+
+
+def render_png_bytes(source, page_number=1, dpi=200, backend=None):
+    """Render a page and encode it as PNG; returns (PNG buffer, pixel buffer bytes) or (None, 0)"""
+    import io
+    from rasterizer import render_page
+
+    image = render_page(source, page_number, dpi=dpi, backend=backend)
+    if image is None:
+        return None, 0
+    try:
+        image_bytes = image.width * image.height * len(image.getbands())
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+    finally:
+        image.close()
+    return buffer.getbuffer(), image_bytes
+
+
+def render_png(source, page_number=1, dpi=200, backend=None):
+    """
+    Worker task: render_png_bytes into shared memory
+    Returns (block name, PNG size, pixel buffer bytes) or None
+    """
+    png, image_bytes = render_png_bytes(source, page_number, dpi=dpi, backend=backend)
+    if png is None:
+        return None
+    name, size = to_shared_memory(png)
+    return name, size, image_bytes
+
+
+def read_shared_memory(name, size):
+    """Bytes of a block written by a worker; the block is freed afterwards"""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        block.unlink()
+
+
+class CpuPool:
+    """Pre-warmed process pool with utilisation and queue-wait metrics"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Workers share the parent's tracker for the shared memory blocks they hand over
+        resource_tracker.ensure_running()
+        self._lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+        self._executor = self._start()
+
+    def _start(self):
+        """Start and warm up every worker now rather than on the first request"""
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(), initializer=_warm_up)
+        for future in [executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a worker and wait for its result"""
+        with self._lock:
+            self.submitted += 1
+        executor = self._executor
+        try:
+            result, waited, ran = executor.submit(_run, time.time(), fn, args, kwargs).result()
+        except BrokenProcessPool:
+            # A worker died (killed for memory, crashed in a native library): replace the pool
+            with self._lock:
+                self.failed += 1
+            self._restart(executor)
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+            self.busy_seconds += ran
+            self._waits.append(max(waited, 0.0))
+        return result
+
+    def _restart(self, broken):
+        """Replace a broken executor once, however many requests saw it break"""
+        with self._restart_lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._start()
+        with self._lock:
+            self.restarts += 1
+        broken.shutdown(wait=False)
+
+    def render_png(self, source, page_number=1, dpi=200, backend=None):
+        """PNG bytes of a rendered page and its pixel buffer size, or (None, 0)"""
+        handoff = self.run(render_png, source, page_number, dpi=dpi, backend=backend)
+        if handoff is None:
+            return None, 0
+        name, size, image_bytes = handoff
+        return read_shared_memory(name, size), image_bytes
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            elapsed = time.monotonic() - self.started
+            in_flight = self.submitted - self.completed - self.failed
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "queued": max(in_flight - self.workers, 0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "utilisation": round(self.busy_seconds / (self.workers * elapsed), 4) if elapsed > 0 else 0.0,
+            "queue_wait_ms_p50": percentile(0.5),
+            "queue_wait_ms_p95": percentile(0.95),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
@@ -0,0 +1,145 @@
+"""
+Columnar and line-oriented exports of ledger entries (Parquet, Arrow IPC, JSON Lines)
+Column types are inferred from the column configuration and rows are written in
+fixed-size chunks, so memory stays flat however many entries are exported. Each
+chunk is normalized like the Excel workbook (normalize.normalize_frame), so
+amounts come with the same Currency column
+"""
+import datetime
+import json
+import os
+import sys
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+
+from value_parsing import column_type
+from ledger import METADATA_COLUMNS, typed_rows
+from normalize import output_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {
+    'parquet': {'extension': '.parquet', 'mimetype': 'application/vnd.apache.parquet'},
+    'arrow': {'extension': '.arrow', 'mimetype': 'application/vnd.apache.arrow.file'},
+    'jsonl': {'extension': '.jsonl', 'mimetype': 'application/x-ndjson'},
+}
+
+CHUNK_ROWS = 10000
+
+def output_kinds(columns):
+    """(name, kind) of every exported column, including the Currency column normalize_frame adds"""
+    kinds = {col['name']: column_type(col) for col in columns}
+    return [(name, kinds.get(name, 'text')) for name in output_columns(columns)]
+
+
+def typed_chunks(entries, columns, include_metadata=True, chunk_rows=CHUNK_ROWS):
+    """Normalized rows (ledger.typed_rows) a chunk of at most chunk_rows entries at a time"""
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, chunk_rows))
+        if not chunk:
+            return
+        yield typed_rows(chunk, columns, include_metadata)
+
+
+def convert_value(value, kind):
+    """Value for an Arrow column of a kind; values the normalizer could not type become None"""
+    if value is None:
+        return None
+    if kind in ('number', 'percent'):
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    if kind == 'date':
+        return value if isinstance(value, datetime.date) else None
+    return value if isinstance(value, str) else str(value)
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet and Arrow exports need the pyarrow package: pip install pyarrow")
+
+
+def arrow_schema(columns, include_metadata=True):
+    require_pyarrow()
+    arrow_types = {'text': pa.string(), 'number': pa.float64(), 'percent': pa.float64(), 'date': pa.date32()}
+    fields = []
+    if include_metadata:
+        fields += [
+            pa.field(METADATA_COLUMNS[0], pa.int64()),
+            pa.field(METADATA_COLUMNS[1], pa.timestamp('s', tz='UTC')),
+            pa.field(METADATA_COLUMNS[2], pa.string()),
+            pa.field(METADATA_COLUMNS[3], pa.string()),
+        ]
+    fields += [pa.field(name, arrow_types[kind]) for name, kind in output_kinds(columns)]
+    return pa.schema(fields)
+
+
+def iter_record_batches(entries, columns, include_metadata=True, chunk_rows=CHUNK_ROWS):
+    """Group entries into Arrow record batches of at most chunk_rows rows"""
+    schema = arrow_schema(columns, include_metadata)
+    kinds = [kind for _, kind in output_kinds(columns)]
+    for rows in typed_chunks(entries, columns, include_metadata, chunk_rows):
+        arrays = [list(values) for values in zip(*rows)]
+        if include_metadata:
+            arrays[1] = [datetime.datetime.fromisoformat(value) for value in arrays[1]]
+            arrays[4:] = [[convert_value(value, kind) for value in values] for values, kind in zip(arrays[4:], kinds)]
+        else:
+            arrays = [[convert_value(value, kind) for value in values] for values, kind in zip(arrays, kinds)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(path, entries, columns, include_metadata=True, chunk_rows=CHUNK_ROWS):
+    """Write entries to a Parquet file, one row group per chunk"""
+    schema = arrow_schema(columns, include_metadata)
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in iter_record_batches(entries, columns, include_metadata, chunk_rows):
+            writer.write_batch(batch)
+
+
+def write_arrow(path, entries, columns, include_metadata=True, chunk_rows=CHUNK_ROWS):
+    """Write entries to an Arrow IPC (Feather v2) file"""
+    schema = arrow_schema(columns, include_metadata)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in iter_record_batches(entries, columns, include_metadata, chunk_rows):
+            writer.write_batch(batch)
+
+
+def iter_jsonl(entries, columns, include_metadata=True, chunk_bytes=64 * 1024):
+    """Stream JSON Lines text chunks with typed values (dates as ISO strings)"""
+    names = (METADATA_COLUMNS if include_metadata else []) + output_columns(columns)
+    lines = []
+    size = 0
+    for rows in typed_chunks(entries, columns, include_metadata):
+        for row in rows:
+            record = {name: value.isoformat() if isinstance(value, datetime.date) else value
+                      for name, value in zip(names, row)}
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            lines.append(line)
+            size += len(line)
+            if size > chunk_bytes:
+                yield "".join(lines)
+                lines, size = [], 0
+    yield "".join(lines)
+
+
+def write_jsonl(path, entries, columns, include_metadata=True):
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in iter_jsonl(entries, columns, include_metadata):
+            f.write(chunk)
+
+
+WRITERS = {'parquet': write_parquet, 'arrow': write_arrow, 'jsonl': write_jsonl}
+
+
+def export_entries(export_format, path, entries, columns, include_metadata=True):
+    """Write entries to path in one of EXPORT_FORMATS"""
+    if export_format not in WRITERS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    if export_format != 'jsonl':
+        require_pyarrow()
+    WRITERS[export_format](path, entries, columns, include_metadata)
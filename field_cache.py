@@ -0,0 +1,92 @@
+"""
+Per-field cache of extracted values
+Values are keyed by document hash and a hash of each column's name and
+description, so re-extracting a document after editing the column
+configuration only asks Gemini for the new or changed columns
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+
+from db import connect, create_database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS field_values (
+    document_hash TEXT NOT NULL,
+    field_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (document_hash, field_key)
+);
+"""
+
+
+def field_key(column):
+    """Hash of a column's name and description"""
+    raw = f"{column['name']}\0{column.get('description', '')}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def is_empty(value):
+    """No answer: null, or a blank string"""
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def merge_fields(column_config, cached, fresh):
+    """Combine cached and freshly extracted values in column order"""
+    return {col['name']: fresh[col['name']] if col['name'] in fresh else cached.get(col['name'])
+            for col in column_config}
+
+
+class FieldCache:
+    """SQLite-backed store of extracted values per document and column"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        create_database(db_path, SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def lookup(self, doc_hash, column_config):
+        """
+        Split a column configuration into cached values and columns to extract
+        Returns ({name: value} for cached columns, [columns still missing])
+        """
+        keys = {field_key(col): col for col in column_config}
+        placeholders = ",".join("?" for _ in keys)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT field_key, value FROM field_values WHERE document_hash = ? AND field_key IN ({placeholders})",
+                [doc_hash] + list(keys)
+            ).fetchall()
+
+        found = {key: json.loads(value) for key, value in rows}
+        cached = {keys[key]['name']: value for key, value in found.items()}
+        missing = [col for key, col in keys.items() if key not in found]
+        return cached, missing
+
+    def store(self, doc_hash, column_config, extracted_data, failed=()):
+        """
+        Remember the values extracted for the given columns
+        Null or blank values and the names in failed (values that did not
+        validate) are left out, so the next extraction asks for them again
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        rows = [(doc_hash, field_key(col), col['name'], json.dumps(extracted_data[col['name']], default=str), now)
+                for col in column_config
+                if col['name'] not in failed and not is_empty(extracted_data.get(col['name']))]
+        if not rows:
+            return
+        with self._write_lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO field_values (document_hash, field_key, name, value, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
@@ -0,0 +1,249 @@
+"""
+Watch-folder inbox for continuous ingestion
+Uses OS file-change notifications (inotify / FSEvents / ReadDirectoryChangesW
+via watchdog), waits for each PDF to stop changing, then runs it through the
+ingest pipeline with bounded concurrency and moves it to done/ or failed/
+"""
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from ingest import process_document
+from ledger import Ledger
+from invoice_index import InvoiceIndex
+from field_cache import FieldCache
+from near_duplicates import NearDuplicateIndex, reuse_from_env
+from usage_meter import UsageMeter, hourly_budget_from_env
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class InboxEventHandler(FileSystemEventHandler):
+    """Forward create/modify/move/close events for PDFs to the inbox"""
+
+    def __init__(self, inbox):
+        super().__init__()
+        self.inbox = inbox
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        # Moves into the inbox (e.g. atomic rename by a scanner) report dest_path
+        path = getattr(event, 'dest_path', None) or event.src_path
+        if path and os.path.dirname(os.path.abspath(path)) == self.inbox.folder:
+            self.inbox.touch(path)
+
+
+class Inbox:
+    """Long-running folder watcher feeding PDFs into the extraction pipeline"""
+
+    def __init__(self, folder, api_key, column_config, concurrency=2, settle_seconds=2.0,
+                 db_path=os.path.join('data', 'invoicepilot.db'), sink_path=None,
+                 done_folder=None, failed_folder=None, report_interval=30):
+        self.folder = os.path.abspath(folder)
+        self.api_key = api_key
+        self.column_config = column_config
+        self.concurrency = concurrency
+        self.settle_seconds = settle_seconds
+        self.sink_path = sink_path
+        self.done_folder = done_folder or os.path.join(self.folder, 'done')
+        self.failed_folder = failed_folder or os.path.join(self.folder, 'failed')
+        self.report_interval = report_interval
+
+        self.ledger = Ledger(db_path)
+        self.invoice_index = InvoiceIndex(db_path)
+        self.field_cache = FieldCache(db_path)
+        self.near_duplicates = NearDuplicateIndex(db_path)
+        self.usage_meter = UsageMeter(db_path, hourly_budget_usd=hourly_budget_from_env())
+
+        self._pending = {}  # path -> (last event time, last seen size)
+        self._queued = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=500)
+
+        os.makedirs(self.done_folder, exist_ok=True)
+        os.makedirs(self.failed_folder, exist_ok=True)
+
+    def touch(self, path):
+        """Record activity on a file; it is queued once it has settled"""
+        if not path.lower().endswith('.pdf'):
+            return
+        with self._lock:
+            if path in self._queued:
+                return
+            previous = self._pending.get(path)
+            self._pending[path] = (time.monotonic(), previous[1] if previous else None)
+
+    def _settle_loop(self):
+        """Queue files that have had no events for settle_seconds and a stable size"""
+        while not self._stop.wait(0.5):
+            now = time.monotonic()
+            ready = []
+            with self._lock:
+                for path, (last_event, last_size) in list(self._pending.items()):
+                    if now - last_event < self.settle_seconds:
+                        continue
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        # Deleted or moved away before it settled
+                        del self._pending[path]
+                        continue
+                    if size == 0 or size != last_size:
+                        # Still being written - check again after another quiet period
+                        self._pending[path] = (now, size)
+                        continue
+                    del self._pending[path]
+                    self._queued.add(path)
+                    ready.append(path)
+            for path in ready:
+                self._queue.put((path, time.monotonic()))
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                path, queued_at = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self.in_flight += 1
+            try:
+                self._process(path, queued_at)
+            except Exception as e:
+                print(f"❌ Inbox error for {path}: {e}")
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self._queued.discard(path)
+                self._queue.task_done()
+
+    def _process(self, path, queued_at):
+        started = time.monotonic()
+        name = os.path.basename(path)
+        result = process_document(path, self.api_key, self.column_config, self.ledger,
+                                  self.invoice_index, source_name=name, field_cache=self.field_cache,
+                                  usage_meter=self.usage_meter, near_duplicates=self.near_duplicates,
+                                  reuse_duplicates=reuse_from_env())
+        finished = time.monotonic()
+        latency = {"wait": round(started - queued_at, 3), "processing": round(finished - started, 3)}
+
+        with self._lock:
+            self.latencies.append(finished - queued_at)
+            if result['ok']:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+        self._write_sink(dict(result, file=name, latency=latency))
+        destination = self.done_folder if result['ok'] else self.failed_folder
+        moved_to = self._move(path, destination)
+
+        if result['ok']:
+            print(f"✅ {name} → {moved_to} (waited {latency['wait']}s, processed in {latency['processing']}s)")
+        else:
+            print(f"❌ {name} → {moved_to}: {result['error']}")
+
+    def _move(self, path, destination):
+        """Move a processed file, never overwriting an earlier file of the same name"""
+        target = os.path.join(destination, os.path.basename(path))
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(os.path.basename(path))
+            target = os.path.join(destination, f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{ext}")
+        shutil.move(path, target)
+        return target
+
+    def _write_sink(self, record):
+        if not self.sink_path:
+            return
+        record = {key: value for key, value in record.items() if key != 'path'}
+        record['ts'] = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            with open(self.sink_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def status(self):
+        """Queue depth, in-flight count, totals and recent latency percentiles"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            pending = len(self._pending)
+            in_flight = self.in_flight
+            processed, failed = self.processed, self.failed
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "settling": pending,
+            "queue_depth": self._queue.qsize(),
+            "in_flight": in_flight,
+            "processed": processed,
+            "failed": failed,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+        }
+
+    def _report_loop(self):
+        while not self._stop.wait(self.report_interval):
+            s = self.status()
+            print(f"📥 queue {s['queue_depth']} (+{s['settling']} settling) | in flight {s['in_flight']} | "
+                  f"done {s['processed']} | failed {s['failed']} | "
+                  f"latency p50 {s['latency_p50']}s p95 {s['latency_p95']}s")
+
+    def start(self):
+        if Observer is None:
+            raise RuntimeError("Inbox mode needs the watchdog package: pip install watchdog")
+
+        # Files dropped while the inbox was not running
+        for name in sorted(os.listdir(self.folder)):
+            self.touch(os.path.join(self.folder, name))
+
+        self._observer = Observer()
+        self._observer.schedule(InboxEventHandler(self), self.folder, recursive=False)
+        self._observer.start()
+
+        targets = [self._settle_loop, self._report_loop] + [self._worker_loop] * self.concurrency
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def run_forever(self):
+        """Start watching and block until interrupted"""
+        self.start()
+        print(f"👀 Watching {self.folder} (concurrency {self.concurrency}, settle {self.settle_seconds}s)")
+        print("⏹️  Press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping inbox...")
+        finally:
+            self.stop()
@@ -0,0 +1,429 @@
+"""
+Bulk ingest of a folder of PDF invoices
+CPU stages (text extraction, base64 encoding) run on a process pool,
+Gemini calls run at a configurable concurrency, and every outcome is appended
+to a journal so an interrupted run resumes without repeating model calls
+"""
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+
+from upload_native_pdf import extract_invoice_data_with_gemini_native_pdf
+from invoice_splitter import page_texts
+from page_scorer import prune_pdf
+from usage_meter import BudgetExceeded, UsageMeter, hourly_budget_from_env, sum_usage
+from model_cascade import CascadeStats, run_cascade
+from ledger import Ledger, document_hash, column_config_id
+from invoice_index import InvoiceIndex
+from field_cache import FieldCache, merge_fields
+from near_duplicates import NearDuplicateIndex
+from cpu_pool import pool_context, read_shared_memory, to_shared_memory
+
+# Same defaults as the web interface
+DEFAULT_COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number or ID"},
+    {"name": "Date", "description": "Invoice date"},
+    {"name": "Vendor", "description": "Vendor or supplier name"},
+    {"name": "Total Amount", "description": "Total invoice amount"},
+]
+
+JOURNAL_NAME = '.invoicepilot-journal.jsonl'
+
+
+def find_pdfs(folder):
+    """All PDFs under folder, in a stable order"""
+    pdfs = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.lower().endswith('.pdf'):
+                pdfs.append(os.path.join(root, name))
+    return pdfs
+
+
+def prepare_document(pdf_path, shared=False):
+    """
+    CPU stage (runs in a worker process): extract text and keep the most
+    relevant pages for the model
+    Only a trimmed PDF is returned (the original is read again from its path),
+    and with shared=True it is handed over as a shared memory block instead
+    of being pickled; load_pdf gets the bytes back
+    """
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+
+    pruning = None
+    pdf_text = fallback_text = ""
+    try:
+        texts = page_texts(pdf_bytes)
+        pdf_text = "".join(text + "\n" for text in texts)
+        pdf_bytes, fallback_text, pruning = prune_pdf(pdf_bytes, texts=texts)
+    except Exception as e:
+        # Gemini reads the PDF natively; text is only the fallback. Text already
+        # extracted is kept for the search index and near-duplicate detection
+        print(f"⚠️ Text extraction failed for {pdf_path}: {e}")
+        fallback_text = ""
+
+    pdf_bytes = pdf_bytes if pruning and pruning['pages_dropped'] else None
+    return {
+        "path": pdf_path,
+        "pdf_bytes": None if shared else pdf_bytes,
+        "pdf_shared": to_shared_memory(pdf_bytes) if shared and pdf_bytes else None,
+        # Full text for the search index, kept pages only for the model
+        "pdf_text": pdf_text,
+        "fallback_text": fallback_text,
+        "pruning": pruning,
+    }
+
+
+def load_pdf(prepared):
+    """Bytes to send for a prepared document: the trimmed PDF, else the original file"""
+    if prepared.get('pdf_shared'):
+        prepared['pdf_bytes'] = read_shared_memory(*prepared.pop('pdf_shared'))
+    if prepared.get('pdf_bytes') is not None:
+        return prepared['pdf_bytes']
+    with open(prepared['path'], 'rb') as f:
+        return f.read()
+
+
+class Journal:
+    """Append-only JSON Lines record of completed and failed documents"""
+
+    def __init__(self, path):
+        self.path = path
+        self.run_id = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Return {(doc_hash, config_id): record} for documents already done"""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+                if record.get('event') == 'done':
+                    done[(record['doc_hash'], record['config_id'])] = record
+                elif record.get('event') == 'run':
+                    self.run_id = record['run_id']
+        return done
+
+    def begin(self):
+        """
+        Id of the run this journal records, written on first use; runs resumed
+        from the journal keep it, so a document already appended to the ledger
+        (killed before its journal record) is not appended twice
+        """
+        if self.run_id is None:
+            self.run_id = uuid.uuid4().hex
+            self.append({"event": "run", "run_id": self.run_id})
+        return self.run_id
+
+    def append(self, record):
+        record = dict(record, ts=time.time())
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class IngestStats:
+    """Thread-safe counters for the end-of-run summary"""
+
+    def __init__(self, total):
+        self.total = total
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.latencies = []
+        self.pages_kept = 0
+        self.pages_dropped = 0
+        self.near_duplicates = 0
+        self.errors = Counter()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record(self, ok, latency=None, error=None, pruning=None, near_duplicate=None):
+        with self._lock:
+            if near_duplicate:
+                self.near_duplicates += 1
+            if pruning:
+                self.pages_kept += len(pruning['pages_kept'])
+                self.pages_dropped += len(pruning['pages_dropped'])
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+                self.errors[error] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+            return self.succeeded + self.failed + self.skipped
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        processed = self.succeeded + self.failed
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 2),
+            "docs_per_second": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_p50": round(percentile(0.5), 2),
+            "latency_p95": round(percentile(0.95), 2),
+            "pages_kept": self.pages_kept,
+            "pages_dropped": self.pages_dropped,
+            "near_duplicates": self.near_duplicates,
+            "top_errors": self.errors.most_common(5),
+        }
+
+
+def extract_document(prepared, api_key, column_config):
+    """
+    Model stage: run the native PDF extraction for a prepared document
+    through the model cascade; its report (models, escalations, token
+    usage) is left in prepared['cascade']
+    """
+    pruning = prepared.get('pruning')
+    # A trimmed PDF is not the document doc_hash identifies, so its uploaded
+    # reference is keyed by the hash of the bytes actually sent
+    doc_hash = None if pruning and pruning['pages_dropped'] else prepared.get('doc_hash')
+
+    # Encoded here, in the model stage, rather than copied back from the CPU workers
+    pdf_base64 = base64.b64encode(load_pdf(prepared)).decode('utf-8')
+
+    def extract(model_name, columns, metrics):
+        return extract_invoice_data_with_gemini_native_pdf(
+            api_key, pdf_base64, prepared.get('fallback_text', prepared['pdf_text']), columns,
+            doc_hash=doc_hash, metrics=metrics, model_name=model_name
+        )
+
+    extracted_data, prepared['cascade'] = run_cascade(extract, column_config)
+    return extracted_data
+
+
+def process_document(pdf_path, api_key, column_config, ledger, invoice_index,
+                     source_name=None, cpu_pool=None, doc_hash=None, field_cache=None,
+                     usage_meter=None, batch_id=None, cascade_stats=None, near_duplicates=None,
+                     reuse_duplicates=False, run_id=None, refresh=False):
+    """
+    Run one PDF through the pipeline and record it in the ledger and index
+    Returns a result dict with ok, doc_hash, usage, near_duplicate, and either
+    entry_id/extracted_data or stage/error
+    With a usage_meter, model calls wait while the key is over its hourly budget;
+    with near_duplicates, copies of processed documents are flagged and, with
+    reuse_duplicates, take their fields from the copy's field cache entries
+    when both carry the same numbers and identifiers;
+    with a run_id, the ledger holds at most one entry per document for the run;
+    refresh re-extracts every column instead of reusing cached fields
+    """
+    result = {"path": pdf_path, "doc_hash": doc_hash, "ok": False}
+    try:
+        if result['doc_hash'] is None:
+            result['doc_hash'] = document_hash(pdf_path)
+        if cpu_pool:
+            prepared = cpu_pool.submit(prepare_document, pdf_path, shared=True).result()
+            if prepared['pdf_shared']:
+                # Take the trimmed PDF out of shared memory now, so the block is freed whatever happens next
+                load_pdf(prepared)
+        else:
+            prepared = prepare_document(pdf_path)
+    except Exception as e:
+        result.update(stage="prepare", error=f"PDF processing error: {e}")
+        return result
+    prepared['doc_hash'] = result['doc_hash']
+    result['pruning'] = prepared.get('pruning')
+
+    # Columns already extracted for this document are reused from the field cache
+    cached_fields, missing_columns = {}, column_config
+    if field_cache and not refresh:
+        cached_fields, missing_columns = field_cache.lookup(result['doc_hash'], column_config)
+
+    if near_duplicates and missing_columns:
+        match = near_duplicates.find(prepared['pdf_text'], exclude_hash=result['doc_hash'])
+        result['near_duplicate'] = match
+        # Recurring invoices look alike too; a copy has the same invoice number, dates and amounts
+        if match and match['same_identifiers'] and reuse_duplicates and field_cache and not refresh:
+            # Reused fields answer this run only; they are not cached under this document
+            reused, missing_columns = field_cache.lookup(match['document_hash'], missing_columns)
+            cached_fields = dict(cached_fields, **reused)
+            match['fields_reused'] = len(reused)
+
+    fresh_fields = {}
+    if missing_columns:
+        if usage_meter:
+            try:
+                usage_meter.wait_for_budget(
+                    api_key, on_wait=lambda e: print(f"⏸️ {e} - waiting {e.retry_after}s")
+                )
+            except BudgetExceeded as e:
+                result.update(stage="budget", error=str(e))
+                return result
+        fresh_fields = extract_document(prepared, api_key, missing_columns)
+        cascade = prepared.get('cascade')
+        if cascade:
+            result['usage'] = sum_usage(cascade['usage'])
+            result['escalated_fields'] = cascade['escalated_fields']
+            if usage_meter:
+                for usage in cascade['usage']:
+                    usage_meter.record(api_key, usage, batch_id=batch_id)
+            if cascade_stats:
+                cascade_stats.record(cascade, len(missing_columns))
+        if "error" in fresh_fields:
+            result.update(stage="model", error=fresh_fields['error'])
+            return result
+        if field_cache:
+            field_cache.store(result['doc_hash'], missing_columns, fresh_fields,
+                              failed=cascade['failures'] if cascade else ())
+    extracted_data = merge_fields(column_config, cached_fields, fresh_fields)
+
+    entry_id = ledger.append(extracted_data, result['doc_hash'], column_config, source_name=source_name,
+                             run_id=run_id)
+    try:
+        invoice_index.add(result['doc_hash'], prepared['pdf_text'], extracted_data, column_config,
+                          entry_id=entry_id, source_name=source_name)
+    except Exception as e:
+        print(f"Error indexing {pdf_path}: {e}")
+    if near_duplicates:
+        try:
+            near_duplicates.add(result['doc_hash'], prepared['pdf_text'], entry_id=entry_id)
+        except Exception as e:
+            print(f"Error adding near-duplicate signature for {pdf_path}: {e}")
+
+    result.update(ok=True, entry_id=entry_id, extracted_data=extracted_data)
+    return result
+
+
+def run_ingest(folder, api_key, column_config, workers=None, concurrency=4,
+               db_path=os.path.join('data', 'invoicepilot.db'), journal_path=None, reuse_duplicates=False,
+               refresh=False):
+    """
+    Ingest every PDF in folder and return the run summary
+    With reuse_duplicates, near-duplicates of processed documents reuse their fields;
+    with refresh, every field is extracted again rather than taken from the field cache
+    """
+    pdfs = find_pdfs(folder)
+    journal = Journal(journal_path or os.path.join(folder, JOURNAL_NAME))
+    done = journal.load()
+    run_id = journal.begin()
+    config_id = column_config_id(column_config)
+    ledger = Ledger(db_path)
+    invoice_index = InvoiceIndex(db_path)
+    field_cache = FieldCache(db_path)
+    near_duplicates = NearDuplicateIndex(db_path)
+    usage_meter = UsageMeter(db_path, hourly_budget_usd=hourly_budget_from_env())
+    cascade_stats = CascadeStats()
+    # Every model call of this run is totalled under one batch id
+    batch_id = uuid.uuid4().hex
+    stats = IngestStats(len(pdfs))
+
+    print(f"📂 Found {len(pdfs)} PDF(s) in {folder}")
+    if done:
+        print(f"🔁 Journal has {len(done)} completed document(s) - they will be skipped")
+
+    # The first task is submitted from a model thread; forking a threaded process is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as cpu_pool:
+
+        def process(pdf_path):
+            started = time.time()
+            doc_hash = None
+            try:
+                # Hash first so completed documents skip the CPU stage entirely
+                doc_hash = document_hash(pdf_path)
+            except Exception:
+                pass
+            if doc_hash and (doc_hash, config_id) in done:
+                stats.skip()
+                return pdf_path, None, None, None, None, None
+
+            result = process_document(pdf_path, api_key, column_config, ledger, invoice_index,
+                                      source_name=os.path.relpath(pdf_path, folder),
+                                      cpu_pool=cpu_pool, doc_hash=doc_hash, field_cache=field_cache,
+                                      usage_meter=usage_meter, batch_id=batch_id, cascade_stats=cascade_stats,
+                                      near_duplicates=near_duplicates, reuse_duplicates=reuse_duplicates,
+                                      run_id=run_id, refresh=refresh)
+            elapsed = time.time() - started
+            record = {"path": pdf_path, "doc_hash": result['doc_hash'], "config_id": config_id,
+                      "elapsed": round(elapsed, 3)}
+            pruning = result.get('pruning')
+            if pruning:
+                record.update(pages_kept=pruning['pages_kept'], pages_dropped=pruning['pages_dropped'])
+            if result.get('usage'):
+                record['usage'] = result['usage']
+            if result.get('escalated_fields'):
+                record['escalated_fields'] = result['escalated_fields']
+            if result.get('near_duplicate'):
+                record['near_duplicate'] = result['near_duplicate']
+            if result['ok']:
+                journal.append(dict(record, event="done", entry_id=result['entry_id'],
+                                    extracted_data=result['extracted_data']))
+            else:
+                journal.append(dict(record, event="failed", stage=result['stage'], error=result['error']))
+            return pdf_path, result['ok'], elapsed, result.get('error'), pruning, result.get('near_duplicate')
+
+        with ThreadPoolExecutor(max_workers=concurrency) as model_pool:
+            futures = [model_pool.submit(process, pdf_path) for pdf_path in pdfs]
+            for future in as_completed(futures):
+                pdf_path, ok, elapsed, error, pruning, near_duplicate = future.result()
+                if ok is None:
+                    continue
+                count = stats.record(ok, elapsed, error, pruning, near_duplicate)
+                status = "✅" if ok else f"❌ {error}"
+                if near_duplicate:
+                    status += f" (near-duplicate, {near_duplicate['similarity']:.0%} similar)"
+                print(f"[{count}/{len(pdfs)}] {os.path.relpath(pdf_path, folder)} ({elapsed:.1f}s) {status}")
+
+    summary = stats.summary()
+    usage = usage_meter.totals(batch_id=batch_id)
+    summary.update(batch_id=batch_id, input_tokens=usage['input_tokens'], output_tokens=usage['output_tokens'],
+                   cost_usd=usage['cost_usd'], cascade=cascade_stats.snapshot())
+    return summary
+
+
+def print_summary(summary):
+    print("\n" + "=" * 50)
+    print("📊 Ingest summary")
+    print("=" * 50)
+    print(f"   Documents:   {summary['total']} found, {summary['skipped']} skipped (already done)")
+    print(f"   Succeeded:   {summary['succeeded']}")
+    print(f"   Failed:      {summary['failed']}")
+    print(f"   Elapsed:     {summary['elapsed_seconds']}s")
+    print(f"   Throughput:  {summary['docs_per_second']} docs/s")
+    print(f"   Latency:     p50 {summary['latency_p50']}s, p95 {summary['latency_p95']}s")
+    print(f"   Pages sent:  {summary['pages_kept']} kept, {summary['pages_dropped']} dropped")
+    print(f"   Near-dups:   {summary['near_duplicates']}")
+    print(f"   Tokens:      {summary['input_tokens']} in, {summary['output_tokens']} out "
+          f"(est. ${summary['cost_usd']:.4f})")
+    cascade = summary['cascade']
+    print(f"   Escalated:   {cascade['escalated_documents']} of {cascade['documents']} documents "
+          f"({cascade['document_escalation_rate']:.1%}), {cascade['escalated_fields']} of {cascade['fields']} fields "
+          f"({cascade['field_escalation_rate']:.1%})")
+    if summary['top_errors']:
+        print("   Top errors:")
+        for error, count in summary['top_errors']:
+            print(f"     {count} × {error}")
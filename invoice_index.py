@@ -0,0 +1,238 @@
+"""
+Search index over processed invoices
+Extracted text goes into an SQLite FTS5 index and every configured field is
+stored as typed (text / number / date) indexed values, so past invoices can be
+searched without re-reading PDFs or calling Gemini
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from db import connect, create_database
+from ledger import column_config_id
+from value_parsing import column_type, parse_amount, parse_date, parse_percentage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_hash TEXT NOT NULL,
+    config_id TEXT,
+    entry_id INTEGER,
+    source_name TEXT,
+    indexed_at TEXT NOT NULL,
+    vendor TEXT COLLATE NOCASE,
+    amount REAL,
+    currency TEXT,
+    invoice_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_hash ON indexed_documents(document_hash, config_id);
+CREATE INDEX IF NOT EXISTS idx_documents_vendor ON indexed_documents(vendor);
+CREATE INDEX IF NOT EXISTS idx_documents_amount ON indexed_documents(amount);
+CREATE INDEX IF NOT EXISTS idx_documents_date ON indexed_documents(invoice_date);
+
+CREATE TABLE IF NOT EXISTS indexed_fields (
+    document_id INTEGER NOT NULL REFERENCES indexed_documents(id),
+    name TEXT NOT NULL,
+    text_value TEXT,
+    number_value REAL,
+    date_value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_fields_text ON indexed_fields(name, text_value COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_fields_number ON indexed_fields(name, number_value);
+CREATE INDEX IF NOT EXISTS idx_fields_date ON indexed_fields(name, date_value);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5(text, fields);
+"""
+
+# Keywords used to find the vendor / total / invoice date among configured columns
+ROLE_KEYWORDS = {
+    'vendor': ['vendor', 'supplier', 'seller', 'issuer', 'company'],
+    'amount': ['total', 'amount due', 'grand total', 'amount', 'balance'],
+    'date': ['invoice date', 'issue date', 'date'],
+}
+ROLE_EXCLUDE = {
+    'vendor': ['customer', 'buyer', 'bill to'],
+    'amount': ['tax', 'vat', 'discount', 'subtotal', 'shipping'],
+    'date': ['due', 'delivery', 'ship'],
+}
+
+
+def find_role_column(column_config, role):
+    """Pick the configured column that most likely holds the vendor/amount/date"""
+    for keyword in ROLE_KEYWORDS[role]:
+        for col in column_config:
+            name = col['name'].lower()
+            text = f"{name} {col.get('description', '').lower()}"
+            if any(word in name for word in ROLE_EXCLUDE[role]):
+                continue
+            if keyword in name or keyword in text:
+                return col['name']
+    return None
+
+
+def typed_values(value, kind='text'):
+    """
+    Return (text, number, date) representations of an extracted value; only
+    number/percent columns get a number and only date columns a date, so an
+    "INV-001" invoice number is not indexed as -1
+    """
+    if value is None:
+        return None, None, None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value), None, None
+    text = str(value)
+    number = parsed_date = None
+    if kind == 'number':
+        number = parse_amount(value)[0]
+    elif kind == 'percent':
+        number = parse_percentage(value)
+    elif kind == 'date':
+        parsed_date = parse_date(value)
+    return text, number, parsed_date.isoformat() if parsed_date else None
+
+
+def iso_date(value):
+    """Parse a query date or raise ValueError"""
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Unrecognised date: {value}")
+    return parsed.isoformat()
+
+
+def fts_query(text):
+    """Quote each term so user input cannot break FTS5 query syntax"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+class InvoiceIndex:
+    """Full-text and field index backed by SQLite"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        create_database(db_path, SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def add(self, doc_hash, text, extracted_data, column_config, entry_id=None, source_name=None):
+        """
+        Index one processed invoice and return its index id
+        Re-extracting a document with the same columns replaces its earlier entry
+        """
+        config_id = column_config_id(column_config)
+        kinds = {col['name']: column_type(col) for col in column_config}
+        vendor_column = find_role_column(column_config, 'vendor')
+        amount_column = find_role_column(column_config, 'amount')
+        date_column = find_role_column(column_config, 'date')
+
+        vendor = extracted_data.get(vendor_column) if vendor_column else None
+        amount, currency = parse_amount(extracted_data.get(amount_column)) if amount_column else (None, None)
+        invoice_date = parse_date(extracted_data.get(date_column)) if date_column else None
+
+        with self._write_lock, self._connect() as conn:
+            # Entries indexed before config_id was recorded cannot be told apart, so they are replaced too
+            stale = [row['id'] for row in conn.execute(
+                "SELECT id FROM indexed_documents WHERE document_hash = ? AND (config_id = ? OR config_id IS NULL)",
+                (doc_hash, config_id)
+            )]
+            for table, column in (('indexed_fields', 'document_id'), ('document_text', 'rowid'),
+                                  ('indexed_documents', 'id')):
+                conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(document_id,) for document_id in stale])
+
+            cursor = conn.execute(
+                """INSERT INTO indexed_documents
+                   (document_hash, config_id, entry_id, source_name, indexed_at, vendor, amount, currency,
+                    invoice_date, data)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (doc_hash, config_id, entry_id, source_name, datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                 str(vendor) if vendor is not None else None, amount, currency,
+                 invoice_date.isoformat() if invoice_date else None,
+                 json.dumps(extracted_data, default=str))
+            )
+            document_id = cursor.lastrowid
+
+            conn.executemany(
+                "INSERT INTO indexed_fields (document_id, name, text_value, number_value, date_value) VALUES (?, ?, ?, ?, ?)",
+                [(document_id, name) + typed_values(value, kinds.get(name, 'text'))
+                 for name, value in extracted_data.items()]
+            )
+            field_text = " ".join(str(value) for value in extracted_data.values() if value is not None)
+            conn.execute(
+                "INSERT INTO document_text (rowid, text, fields) VALUES (?, ?, ?)",
+                (document_id, text or "", field_text)
+            )
+        return document_id
+
+    def search(self, q=None, vendor=None, min_amount=None, max_amount=None, date_from=None, date_to=None,
+               field=None, value=None, field_min=None, field_max=None, limit=50):
+        """
+        Search indexed invoices. All filters are optional and combined with AND.
+        q            - free text matched against the invoice text and field values
+        vendor       - case-insensitive vendor prefix
+        min/max_amount, date_from/date_to - ranges on the total and invoice date
+        field        - any configured column, matched by value or field_min/field_max
+        """
+        clauses, params = [], []
+        joins = ""
+        order = "d.id DESC"
+
+        if q:
+            joins += " JOIN document_text t ON t.rowid = d.id"
+            clauses.append("document_text MATCH ?")
+            params.append(fts_query(q))
+            order = "bm25(document_text), d.id DESC"
+        if vendor:
+            clauses.append("d.vendor LIKE ?")
+            params.append(f"{vendor}%")
+        if min_amount is not None:
+            clauses.append("d.amount >= ?")
+            params.append(float(min_amount))
+        if max_amount is not None:
+            clauses.append("d.amount <= ?")
+            params.append(float(max_amount))
+        if date_from:
+            clauses.append("d.invoice_date >= ?")
+            params.append(iso_date(date_from))
+        if date_to:
+            clauses.append("d.invoice_date <= ?")
+            params.append(iso_date(date_to))
+        if field:
+            field_clauses = ["f.name = ?"]
+            field_params = [field]
+            if value is not None:
+                field_clauses.append("f.text_value = ? COLLATE NOCASE")
+                field_params.append(str(value))
+            if field_min is not None:
+                field_clauses.append("f.number_value >= ?")
+                field_params.append(float(field_min))
+            if field_max is not None:
+                field_clauses.append("f.number_value <= ?")
+                field_params.append(float(field_max))
+            clauses.append(
+                "d.id IN (SELECT f.document_id FROM indexed_fields f WHERE " + " AND ".join(field_clauses) + ")"
+            )
+            params.extend(field_params)
+
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        query = f"""SELECT d.* FROM indexed_documents d{joins}{where} ORDER BY {order} LIMIT ?"""
+        params.append(int(limit))
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        return [{
+            "id": row['id'],
+            "document_hash": row['document_hash'],
+            "entry_id": row['entry_id'],
+            "source_name": row['source_name'],
+            "indexed_at": row['indexed_at'],
+            "vendor": row['vendor'],
+            "amount": row['amount'],
+            "currency": row['currency'],
+            "invoice_date": row['invoice_date'],
+            "extracted_data": json.loads(row['data']),
+        } for row in rows]
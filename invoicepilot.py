@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+InvoicePilot command-line interface
+
+    python invoicepilot.py ingest <dir> [--columns columns.json] [--workers N] [--concurrency N] [--reuse-duplicates]
+    python invoicepilot.py inbox <dir> [--columns columns.json] [--concurrency N] [--sink results.jsonl]
+    python invoicepilot.py export <file.parquet|.arrow|.jsonl> [--start DATE] [--end DATE] [--config-id ID]
+    python invoicepilot.py enqueue <dir|file.pdf>... [--columns columns.json] [--queue data/work_queue.db]
+    python invoicepilot.py worker [--queue data/work_queue.db] [--concurrency N] [--visibility SECONDS]
+    python invoicepilot.py queue [--queue data/work_queue.db] [--retry-dead]
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def load_columns(path):
+    """Read a column configuration file: [{"name": ..., "description": ...}, ...]"""
+    from ingest import DEFAULT_COLUMNS
+
+    if not path:
+        return DEFAULT_COLUMNS
+    with open(path, 'r', encoding='utf-8') as f:
+        columns = json.load(f)
+    if not isinstance(columns, list) or not all('name' in col for col in columns):
+        raise ValueError("Column file must be a JSON list of {\"name\", \"description\"} objects")
+    return columns
+
+
+def get_api_key(args):
+    api_key = args.api_key or os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        print("❌ A Gemini API key is required (--api-key or GEMINI_API_KEY)")
+        sys.exit(2)
+    return api_key
+
+
+def cmd_ingest(args):
+    from ingest import run_ingest, print_summary
+    from near_duplicates import reuse_from_env
+
+    if not os.path.isdir(args.directory):
+        print(f"❌ Not a directory: {args.directory}")
+        return 2
+
+    summary = run_ingest(
+        args.directory,
+        get_api_key(args),
+        load_columns(args.columns),
+        workers=args.workers,
+        concurrency=args.concurrency,
+        db_path=args.db,
+        journal_path=args.journal,
+        reuse_duplicates=args.reuse_duplicates or reuse_from_env(),
+        refresh=args.refresh,
+    )
+    print_summary(summary)
+    return 1 if summary['failed'] else 0
+
+
+def cmd_inbox(args):
+    from inbox import Inbox
+
+    if not os.path.isdir(args.directory):
+        print(f"❌ Not a directory: {args.directory}")
+        return 2
+
+    inbox = Inbox(
+        args.directory,
+        get_api_key(args),
+        load_columns(args.columns),
+        concurrency=args.concurrency,
+        settle_seconds=args.settle,
+        db_path=args.db,
+        sink_path=args.sink,
+        done_folder=args.done,
+        failed_folder=args.failed,
+        report_interval=args.report_interval,
+    )
+    try:
+        inbox.run_forever()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 2
+    return 0
+
+
+def cmd_export(args):
+    from datetime import datetime
+    from ledger import Ledger
+    from exporters import EXPORT_FORMATS, export_entries
+
+    export_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if export_format not in EXPORT_FORMATS:
+        print(f"❌ Unsupported export format: {export_format or '(none)'} - use {', '.join(EXPORT_FORMATS)}")
+        return 2
+    try:
+        for value in (args.start, args.end):
+            if value:
+                datetime.fromisoformat(value)
+    except ValueError as e:
+        print(f"❌ Invalid date: {e}")
+        return 2
+
+    ledger = Ledger(args.db)
+    columns = ledger.column_definitions_for(args.start, args.end, args.config_id)
+    summary = ledger.summary(args.start, args.end, args.config_id)
+    try:
+        export_entries(export_format, args.output, ledger.iter_entries(args.start, args.end, args.config_id),
+                       columns, include_metadata=not args.no_metadata)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 2
+    print(f"✅ Exported {summary['entries']} entries ({len(columns)} columns) to {args.output}")
+    return 0
+
+
+def cmd_enqueue(args):
+    from ingest import find_pdfs
+    from work_queue import WorkQueue
+
+    queue = WorkQueue(args.queue, max_attempts=args.max_attempts)
+    column_config = load_columns(args.columns)
+    queued = skipped = 0
+    for target in args.paths:
+        if os.path.isdir(target):
+            pdfs = [(path, os.path.relpath(path, target)) for path in find_pdfs(target)]
+        elif os.path.isfile(target):
+            pdfs = [(target, os.path.basename(target))]
+        else:
+            print(f"❌ Not a file or directory: {target}")
+            return 2
+        for path, source_name in pdfs:
+            if queue.enqueue(path, column_config, source_name=source_name) is None:
+                skipped += 1
+            else:
+                queued += 1
+    print(f"✅ Queued {queued} document(s) in {args.queue}"
+          + (f", {skipped} already queued" if skipped else ""))
+    return 0
+
+
+def cmd_worker(args):
+    from work_queue import QueueWorker, WorkQueue
+
+    queue = WorkQueue(args.queue, visibility=args.visibility)
+    worker = QueueWorker(queue, get_api_key(args), db_path=args.db, concurrency=args.concurrency,
+                         worker_id=args.worker_id)
+    worker.run_forever()
+    return 0
+
+
+def cmd_queue(args):
+    from work_queue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    if args.retry_dead:
+        print(f"🔁 Re-queued {queue.retry_dead()} dead-lettered item(s)")
+    stats = queue.stats()
+    print(f"📋 {args.queue}: {stats['queued']} queued ({stats['ready']} ready), {stats['leased']} leased "
+          f"({stats['expired_leases']} expired), {stats['done']} done, {stats['dead']} dead")
+    for owner, count in sorted(stats['workers'].items()):
+        print(f"   👷 {owner}: {count} lease(s)")
+    for item in queue.dead_letters(limit=10):
+        print(f"   💀 #{item['id']} {item['path']} after {item['attempts']} attempt(s): {item['last_error']}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='invoicepilot', description='InvoicePilot command-line tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Extract data from every PDF in a folder')
+    ingest.add_argument('directory', help='Folder containing PDF invoices (searched recursively)')
+    ingest.add_argument('--columns', help='JSON file with the column configuration (defaults to the web UI columns)')
+    ingest.add_argument('--api-key', help='Gemini API key (defaults to $GEMINI_API_KEY)')
+    ingest.add_argument('--workers', type=int, default=None, help='Processes for PDF parsing (default: CPU count)')
+    ingest.add_argument('--concurrency', type=int, default=4, help='Concurrent Gemini calls (default: 4)')
+    ingest.add_argument('--db', default=os.path.join('data', 'invoicepilot.db'), help='Ledger database path')
+    ingest.add_argument('--journal', help='Journal file (default: <directory>/.invoicepilot-journal.jsonl)')
+    ingest.add_argument('--reuse-duplicates', action='store_true',
+                        help='Reuse the fields of near-duplicate documents instead of calling Gemini '
+                             '(default: $INVOICEPILOT_REUSE_NEAR_DUPLICATES)')
+    ingest.add_argument('--refresh', action='store_true',
+                        help='Extract every field again instead of reusing cached values '
+                             '(documents already in the journal are still skipped)')
+    ingest.set_defaults(func=cmd_ingest)
+
+    inbox = subparsers.add_parser('inbox', help='Watch a folder and process PDFs as they arrive')
+    inbox.add_argument('directory', help='Folder to watch')
+    inbox.add_argument('--columns', help='JSON file with the column configuration (defaults to the web UI columns)')
+    inbox.add_argument('--api-key', help='Gemini API key (defaults to $GEMINI_API_KEY)')
+    inbox.add_argument('--concurrency', type=int, default=2, help='Documents processed at once (default: 2)')
+    inbox.add_argument('--settle', type=float, default=2.0,
+                       help='Seconds a file must stay unchanged before it is processed (default: 2)')
+    inbox.add_argument('--db', default=os.path.join('data', 'invoicepilot.db'), help='Ledger database path')
+    inbox.add_argument('--sink', help='Also append each result to this JSON Lines file')
+    inbox.add_argument('--done', help='Folder for processed files (default: <directory>/done)')
+    inbox.add_argument('--failed', help='Folder for failed files (default: <directory>/failed)')
+    inbox.add_argument('--report-interval', type=float, default=30, help='Seconds between status lines (default: 30)')
+    inbox.set_defaults(func=cmd_inbox)
+
+    export = subparsers.add_parser('export', help='Export ledger entries as Parquet, Arrow IPC or JSON Lines')
+    export.add_argument('output', help='Output file; the format follows the extension unless --format is given')
+    export.add_argument('--format', choices=['parquet', 'arrow', 'jsonl'], help='Output format')
+    export.add_argument('--start', help='Only entries extracted on or after this ISO date/time')
+    export.add_argument('--end', help='Only entries extracted up to this ISO date (whole day) or before this date/time')
+    export.add_argument('--config-id', help='Only entries for this column profile (see /ledger/profiles)')
+    export.add_argument('--no-metadata', action='store_true', help='Leave out entry id, timestamp, file and hash columns')
+    export.add_argument('--db', default=os.path.join('data', 'invoicepilot.db'), help='Ledger database path')
+    export.set_defaults(func=cmd_export)
+
+    queue_path = os.path.join('data', 'work_queue.db')
+
+    enqueue = subparsers.add_parser('enqueue', help='Add PDFs to the shared work queue')
+    enqueue.add_argument('paths', nargs='+', help='PDF files or folders (searched recursively)')
+    enqueue.add_argument('--columns', help='JSON file with the column configuration (defaults to the web UI columns)')
+    enqueue.add_argument('--queue', default=queue_path, help=f'Queue database shared by the workers (default: {queue_path})')
+    enqueue.add_argument('--max-attempts', type=int, default=5,
+                         help='Attempts before an item is dead-lettered (default: 5)')
+    enqueue.set_defaults(func=cmd_enqueue)
+
+    worker = subparsers.add_parser('worker', help='Process documents from the shared work queue')
+    worker.add_argument('--queue', default=queue_path, help=f'Queue database shared by the workers (default: {queue_path})')
+    worker.add_argument('--api-key', help='Gemini API key (defaults to $GEMINI_API_KEY)')
+    worker.add_argument('--concurrency', type=int, default=2, help='Documents processed at once (default: 2)')
+    worker.add_argument('--visibility', type=float, default=300,
+                        help='Lease length in seconds; renewed while a document is processed (default: 300)')
+    worker.add_argument('--worker-id', help='Name shown on leases (default: <hostname>:<pid>)')
+    worker.add_argument('--db', default=os.path.join('data', 'invoicepilot.db'), help='Ledger database path')
+    worker.set_defaults(func=cmd_worker)
+
+    queue = subparsers.add_parser('queue', help='Show work queue counts and dead-lettered items')
+    queue.add_argument('--queue', default=queue_path, help=f'Queue database (default: {queue_path})')
+    queue.add_argument('--retry-dead', action='store_true', help='Queue dead-lettered items again')
+    queue.set_defaults(func=cmd_queue)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Persistent extraction ledger backed by SQLite
+Every extraction result is appended as a row; consolidated workbooks and CSVs
+are generated on demand by streaming rows back out of the ledger
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+
+from db import connect, create_database
+
+METADATA_COLUMNS = ['Entry ID', 'Extracted At', 'Source File', 'Document Hash']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS column_configs (
+    config_id TEXT PRIMARY KEY,
+    column_config TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extractions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_hash TEXT NOT NULL,
+    config_id TEXT NOT NULL REFERENCES column_configs(config_id),
+    source_name TEXT,
+    extracted_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    run_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_extractions_extracted_at ON extractions(extracted_at);
+CREATE INDEX IF NOT EXISTS idx_extractions_config ON extractions(config_id, extracted_at);
+CREATE INDEX IF NOT EXISTS idx_extractions_document ON extractions(document_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_extractions_run ON extractions(document_hash, config_id, run_id);
+"""
+
+
+def document_hash(pdf_path=None, pdf_bytes=None):
+    """SHA-256 of a document, read from disk in blocks or from bytes"""
+    digest = hashlib.sha256()
+    if pdf_bytes is not None:
+        digest.update(pdf_bytes)
+    else:
+        with open(pdf_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def column_config_id(column_config):
+    """Stable id for a column configuration (names, descriptions and order)"""
+    normalized = [{"name": col['name'], "description": col.get('description', '')} for col in column_config]
+    return hashlib.sha256(json.dumps(normalized).encode('utf-8')).hexdigest()[:16]
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def to_utc(value):
+    """
+    A range bound as entries store it: timestamps converted to UTC (naive ones
+    are taken as UTC), plain dates kept as they are
+    """
+    if len(value) <= 10:
+        return value
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+class Ledger:
+    """Append-only store of extraction results"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        create_database(db_path, SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def append(self, extracted_data, doc_hash, column_config, source_name=None, run_id=None):
+        """
+        Append one extraction result and return its entry id
+        Within a run_id a document is only recorded once: appending it again
+        (a resumed run repeating a document) returns the existing entry's id
+        """
+        config_id = column_config_id(column_config)
+        with self._write_lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO column_configs (config_id, column_config, created_at) VALUES (?, ?, ?)",
+                (config_id, json.dumps(column_config), utc_now())
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO extractions (document_hash, config_id, source_name, extracted_at, data, run_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_hash, config_id, source_name, utc_now(), json.dumps(extracted_data, default=str), run_id)
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid
+            return conn.execute(
+                "SELECT id FROM extractions WHERE document_hash = ? AND config_id = ? AND run_id = ?",
+                (doc_hash, config_id, run_id)
+            ).fetchone()['id']
+
+    def get(self, entry_id):
+        """Return a single entry as a dict, or None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM extractions WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def latest_for_document(self, doc_hash, config_id=None):
+        """Most recent entry for a document (optionally for one column config)"""
+        query = "SELECT * FROM extractions WHERE document_hash = ?"
+        params = [doc_hash]
+        if config_id:
+            query += " AND config_id = ?"
+            params.append(config_id)
+        query += " ORDER BY id DESC LIMIT 1"
+        with self._connect() as conn:
+            row = conn.execute(query, params).fetchone()
+        return self._entry(row) if row else None
+
+    def profiles(self):
+        """List column configurations with their entry counts"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT c.config_id, c.column_config, c.created_at, COUNT(e.id) AS entries
+                   FROM column_configs c LEFT JOIN extractions e ON e.config_id = c.config_id
+                   GROUP BY c.config_id ORDER BY c.created_at, c.rowid"""
+            ).fetchall()
+        return [{
+            "config_id": row['config_id'],
+            "columns": [col['name'] for col in json.loads(row['column_config'])],
+            "created_at": row['created_at'],
+            "entries": row['entries'],
+        } for row in rows]
+
+    def _where(self, start=None, end=None, config_id=None):
+        clauses, params = [], []
+        # Entries are stored in UTC; compare against UTC bounds, not the caller's offset
+        if start:
+            clauses.append("extracted_at >= ?")
+            params.append(to_utc(start))
+        if end:
+            # Dates without a time cover the whole day
+            end = to_utc(end)
+            clauses.append("extracted_at < ?" if 'T' in end else "substr(extracted_at, 1, 10) <= ?")
+            params.append(end)
+        if config_id:
+            clauses.append("config_id = ?")
+            params.append(config_id)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+
+    def summary(self, start=None, end=None, config_id=None):
+        """Entry count and last entry id for a range - identifies an export's contents"""
+        where, params = self._where(start, end, config_id)
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT COUNT(*) AS entries, MAX(id) AS last_id FROM extractions{where}", params).fetchone()
+        return {"entries": row['entries'], "last_id": row['last_id']}
+
+    def columns_for(self, start=None, end=None, config_id=None):
+        """Union of configured column names for the entries in a range, in first-seen order"""
+        return [col['name'] for col in self.column_definitions_for(start, end, config_id)]
+
+    def column_definitions_for(self, start=None, end=None, config_id=None):
+        """Like columns_for, but the full column dicts (first definition of each name wins)"""
+        where, params = self._where(start, end, config_id)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""SELECT c.column_config FROM column_configs c
+                    WHERE c.config_id IN (SELECT DISTINCT config_id FROM extractions{where})
+                    ORDER BY c.created_at, c.rowid""",
+                params
+            ).fetchall()
+        columns = {}
+        for row in rows:
+            for col in json.loads(row['column_config']):
+                columns.setdefault(col['name'], col)
+        return list(columns.values())
+
+    def iter_entries(self, start=None, end=None, config_id=None, batch_size=500):
+        """Yield entries in id order without loading the whole range into memory"""
+        where, params = self._where(start, end, config_id)
+        with self._connect() as conn:
+            cursor = conn.execute(f"SELECT * FROM extractions{where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._entry(row)
+
+    def _entry(self, row):
+        return {
+            "id": row['id'],
+            "document_hash": row['document_hash'],
+            "config_id": row['config_id'],
+            "source_name": row['source_name'],
+            "extracted_at": row['extracted_at'],
+            "extracted_data": json.loads(row['data']),
+        }
+
+
+def entry_row(entry, columns, include_metadata=True):
+    """Flatten a ledger entry into a list of cell values"""
+    data = entry['extracted_data']
+    values = [data.get(name) for name in columns]
+    if include_metadata:
+        values = [entry['id'], entry['extracted_at'], entry['source_name'], entry['document_hash']] + values
+    return [cell_value(value) for value in values]
+
+
+def cell_value(value):
+    """Nested values (lists/dicts) are written as JSON text"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def iter_csv(entries, columns, include_metadata=True):
+    """Stream CSV text chunks for a sequence of ledger entries"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow((METADATA_COLUMNS if include_metadata else []) + columns)
+    for entry in entries:
+        writer.writerow(entry_row(entry, columns, include_metadata))
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def typed_rows(entries, columns, include_metadata=True):
+    """
+    Rows of typed cell values for a chunk of entries: the chunk's values are
+    normalized column by column (dates, amounts, currencies, percentages)
+    """
+    import pandas as pd
+    from normalize import frame_rows, normalize_frame
+
+    names = [col['name'] for col in columns]
+    frame = pd.DataFrame([entry['extracted_data'] for entry in entries], columns=names, dtype=object)
+    values = frame_rows(normalize_frame(frame, columns))
+    rows = []
+    for entry, row in zip(entries, values):
+        row = [cell_value(value) for value in row]
+        if include_metadata:
+            row = [entry['id'], entry['extracted_at'], entry['source_name'], entry['document_hash']] + row
+        rows.append(row)
+    return rows
+
+
+def write_xlsx(path, entries, columns, include_metadata=True):
+    """
+    Write entries to an Excel file using openpyxl's streaming write-only mode
+    When columns are column definitions (dicts) rather than names, values are
+    written as typed cells, normalized a chunk of rows at a time
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Invoices')
+    typed = bool(columns) and isinstance(columns[0], dict)
+    if not typed:
+        sheet.append((METADATA_COLUMNS if include_metadata else []) + columns)
+        for entry in entries:
+            sheet.append(entry_row(entry, columns, include_metadata))
+        workbook.save(path)
+        return
+
+    from normalize import CHUNK_ROWS, output_columns
+    sheet.append((METADATA_COLUMNS if include_metadata else []) + output_columns(columns))
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, CHUNK_ROWS))
+        if not chunk:
+            break
+        for row in typed_rows(chunk, columns, include_metadata):
+            sheet.append(row)
+    workbook.save(path)
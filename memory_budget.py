@@ -0,0 +1,70 @@
+"""
+Process-wide memory budget for large temporary buffers (rendered pages)
+Concurrent requests reserve bytes before allocating and release them when
+done, so a burst of uploads waits instead of exhausting memory
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when a reservation cannot be satisfied within the timeout"""
+
+
+class MemoryBudget:
+    """Counting semaphore measured in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes, timeout=None):
+        """
+        Reserve nbytes, blocking until available. A single reservation larger
+        than the whole budget is clamped so it can still run on its own.
+        Returns the number of bytes actually reserved.
+        """
+        nbytes = min(nbytes, self.max_bytes)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_use + nbytes > self.max_bytes:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise MemoryBudgetExceeded(
+                            f"Timed out waiting for {nbytes} bytes ({self.in_use}/{self.max_bytes} in use)"
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        return nbytes
+
+    def release(self, nbytes):
+        with self._condition:
+            self.in_use = max(0, self.in_use - nbytes)
+            self._condition.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes, timeout=None):
+        """Context manager around acquire/release; yields the reserved byte count"""
+        reserved = self.acquire(nbytes, timeout)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "max_bytes": self.max_bytes,
+                "in_use": self.in_use,
+                "peak": self.peak,
+                "waiting": self.waiting,
+            }
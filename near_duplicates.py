@@ -0,0 +1,190 @@
+"""
+Near-duplicate detection over invoice text
+Re-scanned or re-exported copies of an invoice have different bytes, so the
+document hash never matches them. Each processed document's normalized text
+is reduced to a MinHash signature of its word shingles; signatures are split
+into LSH bands held in memory, so a lookup only compares the handful of
+documents that share a band instead of scanning the whole history.
+Recurring invoices from one supplier are near-identical too, so a match also
+reports whether both documents carry the same numbers and identifiers
+(invoice number, dates, amounts); only then is it the same invoice.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+
+from db import connect, create_database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document_signatures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_hash TEXT NOT NULL UNIQUE,
+    entry_id INTEGER,
+    signature BLOB NOT NULL,
+    key_tokens TEXT,
+    created_at TEXT NOT NULL
+);
+"""
+
+NUM_PERM = 128
+# 16 bands of 8 rows: documents above ~0.7 estimated similarity share a band
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+# Fewer shingles than this (blank scans, one-line pages) is too little to compare
+MIN_SHINGLES = 10
+DEFAULT_THRESHOLD = float(os.environ.get('INVOICEPILOT_NEAR_DUPLICATE_THRESHOLD', '0.85'))
+# Documents added by other processes (bulk ingest, inbox) are picked up this often
+REFRESH_SECONDS = 1.0
+
+MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+PERM_A = _rng.randint(1, MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.randint(0, MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def shingles(text):
+    """Word 3-gram shingles of lower-cased text with punctuation and spacing removed"""
+    words = WORD.findall((text or '').lower())
+    if len(words) < SHINGLE_WORDS:
+        return set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32 values), or None for too little text"""
+    items = shingles(text)
+    if len(items) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter((zlib.crc32(item.encode('utf-8')) for item in items),
+                         dtype=np.uint64, count=len(items)) % MERSENNE_PRIME
+    # (a·h + b) mod p for every permutation and shingle; products stay below 2^62
+    permuted = (np.outer(PERM_A, hashes) + PERM_B[:, None]) % MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def key_tokens(text):
+    """
+    Digest of the document's numeric tokens (invoice numbers, dates, amounts),
+    order ignored; words with a digit or two misread by OCR ("0ffice") do not count
+    """
+    tokens = sorted({word for word in WORD.findall((text or '').lower())
+                     if sum(c.isdigit() for c in word) * 2 > len(word)})
+    return hashlib.sha256(" ".join(tokens).encode('utf-8')).hexdigest()
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def reuse_from_env():
+    """Whether a near-duplicate's stored fields replace a new model call (INVOICEPILOT_REUSE_NEAR_DUPLICATES=1)"""
+    return os.environ.get('INVOICEPILOT_REUSE_NEAR_DUPLICATES', '').lower() in ('1', 'true', 'yes')
+
+
+def band_keys(sig):
+    return [(band, sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()) for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of processed documents, persisted in SQLite and served from memory"""
+
+    def __init__(self, db_path, threshold=DEFAULT_THRESHOLD):
+        self.db_path = db_path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._signatures = {}
+        self._entries = {}
+        self._keys = {}
+        self._last_id = 0
+        self._refreshed = 0.0
+        create_database(db_path, SCHEMA)
+        self.refresh()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _insert(self, doc_hash, entry_id, sig, keys):
+        self._signatures[doc_hash] = sig
+        self._entries[doc_hash] = entry_id
+        self._keys[doc_hash] = keys
+        for key in band_keys(sig):
+            self._buckets.setdefault(key, set()).add(doc_hash)
+
+    def refresh(self):
+        """Load signatures added since the last refresh (including by other processes)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, document_hash, entry_id, signature, key_tokens FROM document_signatures "
+                "WHERE id > ? ORDER BY id",
+                (self._last_id,)
+            ).fetchall()
+        with self._lock:
+            for row_id, doc_hash, entry_id, blob, keys in rows:
+                if doc_hash not in self._signatures:
+                    self._insert(doc_hash, entry_id, np.frombuffer(blob, dtype=np.uint32), keys)
+                self._last_id = max(self._last_id, row_id)
+            self._refreshed = time.monotonic()
+
+    def add(self, doc_hash, text, entry_id=None):
+        """Index a processed document; returns False when its text is too short to fingerprint"""
+        sig = signature(text)
+        if sig is None:
+            return False
+        keys = key_tokens(text)
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO document_signatures (document_hash, entry_id, signature, key_tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(document_hash) DO UPDATE SET entry_id = excluded.entry_id",
+                (doc_hash, entry_id, sig.tobytes(), keys, now)
+            )
+        with self._lock:
+            self._insert(doc_hash, entry_id, sig, keys)
+        return True
+
+    def find(self, text, exclude_hash=None):
+        """
+        Most similar previously processed document above the threshold, as
+        {"document_hash", "entry_id", "similarity", "same_identifiers"}, or None
+        same_identifiers is True when both documents have exactly the same
+        tokens with digits - without it the match may be another invoice of a
+        recurring series and must not stand in for this one
+        """
+        if time.monotonic() - self._refreshed > REFRESH_SECONDS:
+            self.refresh()
+        sig = signature(text)
+        if sig is None:
+            return None
+
+        keys = key_tokens(text)
+        best = None
+        with self._lock:
+            candidates = set()
+            for key in band_keys(sig):
+                candidates |= self._buckets.get(key, set())
+            candidates.discard(exclude_hash)
+            for doc_hash in candidates:
+                score = similarity(sig, self._signatures[doc_hash])
+                if score >= self.threshold and (best is None or score > best['similarity']):
+                    best = {"document_hash": doc_hash, "entry_id": self._entries[doc_hash],
+                            "similarity": round(score, 3), "same_identifiers": self._keys[doc_hash] == keys}
+        return best
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._signatures), "buckets": len(self._buckets)}
@@ -0,0 +1,156 @@
+"""
+Bounded storage for generated files (Excel workbooks, temporary uploads)
+Files are content-addressed so identical results share one file on disk,
+and a background sweeper enforces the TTL and total size limits
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+
+SAFE_FILENAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+class OutputStore:
+    """Content-addressed file store with TTL and size based eviction"""
+
+    def __init__(self, folder, max_bytes=512 * 1024 * 1024, ttl_seconds=24 * 3600, sweep_interval=60):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._total_bytes = 0
+        self._pinned = set()
+        os.makedirs(folder, exist_ok=True)
+        self.sweep()
+
+    def filename_for(self, content_key, prefix='invoice_data', extension='.xlsx'):
+        """Return the stable filename for a piece of content"""
+        if isinstance(content_key, str):
+            content_key = content_key.encode('utf-8')
+        digest = hashlib.sha256(content_key).hexdigest()[:32]
+        return f"{prefix}_{digest}{extension}"
+
+    def put(self, content_key, write_file, prefix='invoice_data', extension='.xlsx'):
+        """
+        Store the file for content_key, calling write_file(path) only when it
+        is not already on disk. Returns the stored filename.
+        """
+        filename = self.filename_for(content_key, prefix, extension)
+        path = os.path.join(self.folder, filename)
+
+        with self._lock:
+            if os.path.exists(path):
+                # Identical result - refresh its TTL instead of writing again
+                os.utime(path)
+                return filename
+
+        # Write to a unique temp name and rename, so concurrent writers never
+        # expose a partially written file under the final name
+        tmp_path = os.path.join(self.folder, f".{uuid.uuid4().hex}.tmp{extension}")
+        try:
+            write_file(tmp_path)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                existed = os.path.exists(path)
+                os.replace(tmp_path, path)
+                if not existed:
+                    self._total_bytes += size
+                over_budget = self.max_bytes is not None and self._total_bytes > self.max_bytes
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if over_budget:
+            self.sweep()
+        return filename
+
+    def path_for(self, filename):
+        """Resolve a stored filename to its path, or None if invalid or missing"""
+        if not filename or not SAFE_FILENAME.match(filename) or filename.startswith('.'):
+            return None
+        path = os.path.join(self.folder, filename)
+        if not os.path.isfile(path):
+            return None
+        return path
+
+    def new_temp_path(self, filename):
+        """Return a unique path in the store folder for a temporary file"""
+        return os.path.join(self.folder, f"{uuid.uuid4().hex}_{filename}")
+
+    def pin(self, path):
+        """Keep a file out of sweeps (e.g. an upload waiting for a worker) until unpin()"""
+        with self._lock:
+            self._pinned.add(os.path.basename(path))
+
+    def unpin(self, path):
+        with self._lock:
+            self._pinned.discard(os.path.basename(path))
+
+    def sweep(self):
+        """Delete expired files, then the oldest files until under max_bytes"""
+        now = time.time()
+        entries = []
+        removed = 0
+
+        with self._lock:
+            for name in os.listdir(self.folder):
+                path = os.path.join(self.folder, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if not os.path.isfile(path) or name in self._pinned:
+                    continue
+                if self.ttl_seconds and now - stat.st_mtime > self.ttl_seconds:
+                    removed += self._remove(path)
+                    continue
+                if name.startswith('.'):
+                    # Write in progress - only ever expired, never evicted for size
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            while self.max_bytes is not None and entries and total > self.max_bytes:
+                _, size, path = entries.pop(0)
+                removed += self._remove(path)
+                total -= size
+
+            self._total_bytes = total
+
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def start_sweeper(self):
+        """Run sweep() periodically on a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sweep_loop, name='output-store-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"🧹 Removed {removed} expired file(s) from {self.folder}")
+            except Exception as e:
+                print(f"Error sweeping {self.folder}: {e}")
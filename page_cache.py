@@ -0,0 +1,100 @@
+"""
+On-disk cache of rendered and encoded page images
+Keyed by document hash, page number, DPI and encoding settings, with
+least-recently-used eviction once the cache exceeds its byte limit
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class PageImageCache:
+    """LRU cache of encoded page images stored as files"""
+
+    def __init__(self, folder, max_bytes=256 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Rebuild the LRU order from file mtimes, which get() refreshes on every hit"""
+        files = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def key(doc_hash, page, dpi, image_format='PNG', options=''):
+        """Cache key for one rendered page and its encoding settings"""
+        raw = f"{doc_hash}:{page}:{dpi}:{image_format}:{options}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key)
+
+    def get(self, key):
+        """Return the cached bytes or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            # mtime doubles as the recency marker across restarts
+            os.utime(self._path(key))
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(key, 0)
+                self._total_bytes -= size
+            return None
+
+    def put(self, key, data):
+        """Store bytes under key, evicting least recently used entries as needed"""
+        if len(data) > self.max_bytes:
+            return
+        tmp_path = os.path.join(self.folder, f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._entries and self._total_bytes > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
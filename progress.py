@@ -0,0 +1,111 @@
+"""
+Progress events for long-running extraction jobs
+Each job keeps an ordered event log; server-sent event streams replay it from
+the client's Last-Event-ID and then wait for new events until the job is done
+"""
+import json
+import threading
+import time
+import uuid
+
+
+def format_sse(event):
+    """Serialize an event in text/event-stream format"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+class ProgressHub:
+    """In-memory registry of jobs and their progress events"""
+
+    def __init__(self, ttl_seconds=3600, max_events=1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_events = max_events
+        self._jobs = {}
+        self._condition = threading.Condition()
+
+    def create(self, total=1, **meta):
+        """Register a job expecting total documents and return its id"""
+        job_id = uuid.uuid4().hex
+        with self._condition:
+            self._expire()
+            self._jobs[job_id] = {
+                "id": job_id,
+                "created": time.time(),
+                "finished": None,
+                "total": total,
+                "completed": 0,
+                "failed": 0,
+                "meta": meta,
+                "events": [],
+                "next_event_id": 1,
+            }
+        return job_id
+
+    def emit(self, job_id, event, **data):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['events'].append({"id": job['next_event_id'], "event": event,
+                                  "data": dict(data, ts=round(time.time(), 3))})
+            job['next_event_id'] += 1
+            # Keep the log bounded; late subscribers still get the newest events
+            del job['events'][:-self.max_events]
+            self._condition.notify_all()
+
+    def document_done(self, job_id, ok):
+        """Count a finished document; the job ends with a done event after the last one"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['completed' if ok else 'failed'] += 1
+            all_done = job['completed'] + job['failed'] >= job['total']
+        if all_done:
+            self.emit(job_id, "done", completed=job['completed'], failed=job['failed'])
+            with self._condition:
+                job['finished'] = time.time()
+                self._condition.notify_all()
+
+    def snapshot(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "job_id": job_id,
+                "total": job['total'],
+                "completed": job['completed'],
+                "failed": job['failed'],
+                "finished": job['finished'] is not None,
+                "events": list(job['events']),
+            }
+
+    def events(self, job_id, after=0, heartbeat=15):
+        """
+        Yield events with id > after as they arrive, and None every heartbeat
+        seconds of silence (to keep proxies from closing the stream). Stops
+        once the job has finished and every event has been sent.
+        """
+        while True:
+            with self._condition:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                pending = [event for event in job['events'] if event['id'] > after]
+                if not pending:
+                    if job['finished'] is not None:
+                        return
+                    self._condition.wait(heartbeat)
+                    pending = [event for event in job['events'] if event['id'] > after]
+            if not pending:
+                yield None
+            for event in pending:
+                after = event['id']
+                yield event
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job['finished'] is not None and job['finished'] < cutoff:
+                del self._jobs[job_id]
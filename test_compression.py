@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test response compression and static asset validators
+"""
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+import compression
+from compression import StaticAssetCache, choose_encoding
+
+
+def test_encoding_negotiation():
+    """The best accepted encoding wins and q=0 refuses one"""
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, *") == ("br" if compression.brotli else None)
+    if compression.brotli:
+        assert choose_encoding("gzip, deflate, br") == "br"
+        assert choose_encoding("br;q=0.5, gzip") == "gzip"
+    print("✅ Accept-Encoding negotiation honours q-values")
+
+
+def test_static_assets_precompressed_and_validated():
+    """Assets carry precompressed variants, ETag/Last-Modified, and rebuild on change"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'index.html')
+        with open(path, 'w') as f:
+            f.write("<html>" + "invoice " * 2000 + "</html>")
+
+        cache = StaticAssetCache()
+        asset = cache.get(path)
+        assert asset.content_type == 'text/html; charset=utf-8'
+        body, encoding = asset.body("gzip")
+        assert encoding == "gzip" and len(body) < 1000
+        assert gzip.decompress(body) == asset.variants[None]
+        assert cache.get(path) is asset
+
+        assert asset.not_modified(if_none_match=asset.etag)
+        assert asset.not_modified(if_none_match=f'"other", {asset.etag}')
+        assert not asset.not_modified(if_none_match='"other"')
+        assert asset.not_modified(if_modified_since=asset.last_modified)
+        assert not asset.not_modified(if_modified_since="Mon, 01 Jan 2001 00:00:00 GMT")
+
+        with open(path, 'w') as f:
+            f.write("<html>changed</html>")
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        changed = cache.get(path)
+        assert changed.etag != asset.etag
+        assert changed.body("gzip") == (b"<html>changed</html>", None)
+        print("✅ Static assets are precompressed and revalidated")
+
+
+if __name__ == "__main__":
+    test_encoding_negotiation()
+    test_static_assets_precompressed_and_validated()
+    print("\n🎉 All compression tests passed!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test the CPU process pool: shared memory handoff, metrics and recovery
+"""
+import os
+import subprocess
+import sys
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from cpu_pool import CpuPool, render_png_bytes
+from pdf_text import extract_text
+from test_pdf_text import table_pdf
+
+
+def test_render_through_shared_memory():
+    """A page rendered in a worker comes back as the same PNG an inline render produces"""
+    pdf_bytes = table_pdf(1)
+    pool = CpuPool(2)
+    try:
+        png, image_bytes = pool.render_png(pdf_bytes, 1, dpi=72, backend='pdfium')
+        inline, inline_bytes = render_png_bytes(pdf_bytes, 1, dpi=72, backend='pdfium')
+        assert png.startswith(b"\x89PNG") and png == bytes(inline)
+        assert image_bytes == inline_bytes == 595 * 842 * 3
+
+        assert "Consulting services" in pool.run(extract_text, pdf_bytes, backend='pdfium')
+
+        stats = pool.stats()
+        assert stats["workers"] == 2 and stats["completed"] == 2 and stats["failed"] == 0
+        assert stats["in_flight"] == 0 and stats["queue_wait_ms_p95"] >= stats["queue_wait_ms_p50"] >= 0
+        assert 0 < stats["utilisation"] <= 1
+    finally:
+        pool.shutdown()
+    print("✅ Pages render in workers and come back through shared memory")
+
+
+def test_block_freed_after_read():
+    """The shared memory block is unlinked once the parent has read it"""
+    from cpu_pool import read_shared_memory, render_png
+
+    name, size, _ = render_png(table_pdf(1), 1, dpi=36, backend='pdfium')
+    assert len(read_shared_memory(name, size)) == size
+    try:
+        shared_memory.SharedMemory(name=name)
+        assert False, "block should be gone"
+    except FileNotFoundError:
+        pass
+    print("✅ Shared memory blocks are freed after reading")
+
+
+def test_restart_after_worker_dies():
+    """A crashed worker breaks the pool once; the next task runs on a fresh pool"""
+    pool = CpuPool(1)
+    try:
+        try:
+            pool.run(os._exit, 1)
+            assert False, "expected BrokenProcessPool"
+        except BrokenProcessPool:
+            pass
+        assert pool.run(sum, [1, 2, 3]) == 6
+        stats = pool.stats()
+        assert stats["restarts"] == 1 and stats["failed"] == 1 and stats["completed"] == 1
+    finally:
+        pool.shutdown()
+    print("✅ The pool restarts after a worker dies")
+
+
+def test_app_starts_pool_on_first_use():
+    """Importing the app starts no workers; the first caller starts the pool once"""
+    script = (
+        "import multiprocessing, app\n"
+        "assert app.cpu_pool is None and not multiprocessing.active_children()\n"
+        "pool = app.get_cpu_pool()\n"
+        "assert pool is app.get_cpu_pool() and pool.workers == 2 and pool.run(sum, [1, 2]) == 3\n"
+        "pool.shutdown()\n"
+    )
+    env = dict(os.environ, INVOICEPILOT_CPU_WORKERS='2')
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    print("✅ The app starts its pool on first use")
+
+
+if __name__ == "__main__":
+    test_render_through_shared_memory()
+    test_block_freed_after_read()
+    test_restart_after_worker_dies()
+    test_app_starts_pool_on_first_use()
+    print("\n🎉 All CPU pool tests passed!")
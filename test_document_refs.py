@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test upload-once document references
+"""
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+import document_refs as refs_module
+import upload_native_pdf
+from document_refs import DocumentRefs, LocalFileBackend
+
+PDF_BYTES = b"%PDF-1.4 " + b"x" * 4096
+COLUMNS = [{"name": "Invoice Number", "description": "The invoice number"}]
+
+
+def test_document_uploaded_once_per_key():
+    """Repeated calls reuse the handle; another key or an expired handle uploads again"""
+    backend = LocalFileBackend()
+    refs = DocumentRefs(backend, min_bytes=0)
+
+    first = refs.get("key-a", PDF_BYTES, "hash1")
+    assert refs.get("key-a", PDF_BYTES, "hash1") is first
+    assert backend.uploads == 1
+
+    assert refs.get("key-b", PDF_BYTES, "hash1") is not first
+    assert backend.uploads == 2
+
+    backend.ttl_seconds = refs_module.EXPIRY_MARGIN_SECONDS - 1
+    short_lived = refs.get("key-a", PDF_BYTES, "hash2")
+    assert refs.get("key-a", PDF_BYTES, "hash2") is not short_lived
+    assert backend.uploads == 4
+
+    assert DocumentRefs(backend, min_bytes=len(PDF_BYTES) + 1).get("key-a", PDF_BYTES) is None
+    print("✅ Documents are uploaded once per key until the handle expires")
+
+
+def test_extraction_reuses_reference():
+    """Two extractions of the same PDF send the same handle instead of inline data"""
+    sent = []
+
+    class FakeResponse:
+        text = '{"Invoice Number": "INV-001"}'
+
+    class FakeModel:
+        def __init__(self, name):
+            pass
+
+        def generate_content(self, content, stream=False):
+            sent.append(content[-1])
+            return [FakeResponse()]
+
+    backend = LocalFileBackend()
+    original_refs, original_model = upload_native_pdf.document_refs, upload_native_pdf.genai.GenerativeModel
+    upload_native_pdf.document_refs = DocumentRefs(backend, min_bytes=0)
+    upload_native_pdf.genai.GenerativeModel = FakeModel
+    try:
+        pdf_base64 = base64.b64encode(PDF_BYTES).decode('utf-8')
+        for _ in range(2):
+            result = upload_native_pdf.extract_invoice_data_with_gemini_native_pdf("key", pdf_base64, "", COLUMNS)
+            assert result == {"Invoice Number": "INV-001"}
+    finally:
+        upload_native_pdf.document_refs = original_refs
+        upload_native_pdf.genai.GenerativeModel = original_model
+
+    assert backend.uploads == 1
+    assert sent[0] is sent[1] and sent[0].uri.startswith("local://")
+    print("✅ Extraction reuses the uploaded document reference")
+
+
+if __name__ == "__main__":
+    test_document_uploaded_once_per_key()
+    test_extraction_reuses_reference()
+    print("\n🎉 All document reference tests passed!")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test Parquet, Arrow and JSON Lines exports of the ledger
+"""
+import datetime
+import json
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ledger import Ledger
+from exporters import column_type, export_entries, iter_record_batches
+
+COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number"},
+    {"name": "Invoice Date", "description": "Invoice date"},
+    {"name": "Total Amount", "description": "Total amount"},
+    {"name": "VAT Rate", "description": "VAT percentage"},
+    {"name": "PO", "description": "Purchase order", "type": "number"},
+]
+
+
+def make_ledger(folder, count):
+    ledger = Ledger(os.path.join(folder, 'ledger.db'))
+    for i in range(count):
+        ledger.append({"Invoice Number": f"INV-{i}", "Invoice Date": "Mar 3rd 2025",
+                       "Total Amount": "1.234,50 €", "VAT Rate": "19%", "PO": "n/a"}, f"hash{i}", COLUMNS)
+    return ledger
+
+
+def test_types_inferred_from_column_config():
+    """Dates, amounts and percentages get typed columns; explicit types win"""
+    assert [column_type(col) for col in COLUMNS] == ['text', 'date', 'number', 'percent', 'number']
+
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = make_ledger(folder, 5)
+        columns = ledger.column_definitions_for()
+
+        path = os.path.join(folder, 'out.parquet')
+        export_entries('parquet', path, ledger.iter_entries(), columns)
+        table = pq.read_table(path)
+        assert table.num_rows == 5
+        assert table.schema.field("Invoice Date").type == pa.date32()
+        assert table.schema.field("Total Amount").type == pa.float64()
+        row = table.slice(0, 1).to_pylist()[0]
+        assert row["Invoice Date"] == datetime.date(2025, 3, 3)
+        assert row["Total Amount"] == 1234.5 and row["VAT Rate"] == 19.0 and row["PO"] is None
+        assert row["Currency"] == "EUR"
+        assert row["Entry ID"] == 1
+
+        path = os.path.join(folder, 'out.arrow')
+        export_entries('arrow', path, ledger.iter_entries(), columns, include_metadata=False)
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        assert table.column_names == [col['name'] for col in COLUMNS] + ["Currency"]
+
+        path = os.path.join(folder, 'out.jsonl')
+        export_entries('jsonl', path, ledger.iter_entries(), columns)
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 5
+        assert records[0]["Invoice Date"] == "2025-03-03" and records[0]["Total Amount"] == 1234.5
+        assert records[0]["Currency"] == "EUR"
+        print("✅ Exports carry typed columns inferred from the column config")
+
+
+def test_exports_are_chunked():
+    """Record batches never exceed the chunk size"""
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = make_ledger(folder, 25)
+        batches = list(iter_record_batches(ledger.iter_entries(), COLUMNS, chunk_rows=10))
+        assert [batch.num_rows for batch in batches] == [10, 10, 5]
+        print("✅ Exports are written in fixed-size chunks")
+
+
+def test_exports_match_workbook():
+    """Parquet and JSON Lines carry the same normalized values as the Excel workbook"""
+    from openpyxl import load_workbook
+    from ledger import write_xlsx
+
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = Ledger(os.path.join(folder, 'ledger.db'))
+        for total in ("USD 99.00", "(1,234.50) £", "1.234,50 €"):
+            ledger.append({"Invoice Number": "INV-1", "Invoice Date": "2025-03-03", "Total Amount": total,
+                           "VAT Rate": "7,5 %", "PO": "12"}, total, COLUMNS)
+        columns = ledger.column_definitions_for()
+
+        path = os.path.join(folder, 'out.xlsx')
+        write_xlsx(path, ledger.iter_entries(), columns, include_metadata=False)
+        sheet = load_workbook(path).active
+        workbook_rows = [list(row) for row in sheet.iter_rows(min_row=2, values_only=True)]
+
+        path = os.path.join(folder, 'out.parquet')
+        export_entries('parquet', path, ledger.iter_entries(), columns, include_metadata=False)
+        parquet_rows = [list(row.values()) for row in pq.read_table(path).to_pylist()]
+
+        for workbook_row, parquet_row in zip(workbook_rows, parquet_rows):
+            assert workbook_row[2:] == parquet_row[2:]
+        assert [row[-1] for row in parquet_rows] == ["USD", "GBP", "EUR"]
+        assert [row[2] for row in parquet_rows] == [99.0, -1234.5, 1234.5]
+        print("✅ Exports match the workbook's normalized values and currency")
+
+
+if __name__ == "__main__":
+    test_types_inferred_from_column_config()
+    test_exports_are_chunked()
+    test_exports_match_workbook()
+    print("\n🎉 All export tests passed!")
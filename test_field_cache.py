@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test field-level caching for incremental re-extraction
+"""
+import os
+import tempfile
+
+from field_cache import FieldCache, merge_fields
+
+COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number"},
+    {"name": "Total Amount", "description": "Total amount"},
+]
+
+
+def test_only_new_or_changed_columns_are_missing():
+    """Adding a column or editing a description re-extracts just that column"""
+    with tempfile.TemporaryDirectory() as folder:
+        cache = FieldCache(os.path.join(folder, 'fields.db'))
+        cache.store("hash1", COLUMNS, {"Invoice Number": "INV-001", "Total Amount": "$10"})
+
+        cached, missing = cache.lookup("hash1", COLUMNS)
+        assert cached == {"Invoice Number": "INV-001", "Total Amount": "$10"}
+        assert missing == []
+
+        edited = [COLUMNS[0], {"name": "Total Amount", "description": "Total incl. tax"},
+                  {"name": "Vendor", "description": "Vendor name"}]
+        cached, missing = cache.lookup("hash1", edited)
+        assert list(cached) == ["Invoice Number"]
+        assert [col['name'] for col in missing] == ["Total Amount", "Vendor"]
+
+        merged = merge_fields(edited, cached, {"Total Amount": "$10", "Vendor": "ACME"})
+        assert list(merged) == ["Invoice Number", "Total Amount", "Vendor"]
+
+        _, missing = cache.lookup("hash2", COLUMNS)
+        assert len(missing) == 2
+        print("✅ Only new or changed columns need extraction")
+
+
+def test_empty_and_failed_values_are_not_cached():
+    """Null, blank and unvalidated answers are asked for again"""
+    with tempfile.TemporaryDirectory() as folder:
+        cache = FieldCache(os.path.join(folder, 'fields.db'))
+        columns = COLUMNS + [{"name": "Vendor", "description": "Vendor name"}]
+        cache.store("hash1", columns, {"Invoice Number": "INV-001", "Total Amount": "  ", "Vendor": "ACME"},
+                    failed={"Vendor": "not a number"})
+        cached, missing = cache.lookup("hash1", columns)
+        assert cached == {"Invoice Number": "INV-001"}
+        assert [col['name'] for col in missing] == ["Total Amount", "Vendor"]
+        cache.store("hash2", COLUMNS, {"Invoice Number": None, "Total Amount": None})
+        assert cache.lookup("hash2", COLUMNS)[0] == {}
+        print("✅ Empty and failed values are not cached")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Field Cache Tests\n")
+    test_only_new_or_changed_columns_are_missing()
+    test_empty_and_failed_values_are_not_cached()
+    print("\n🎉 All field cache tests passed!")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the watch-folder inbox using a stand-in for the Gemini call
+"""
+import io
+import json
+import os
+import tempfile
+import time
+
+import PyPDF2
+
+import ingest
+from inbox import Inbox
+
+
+def write_pdf(path, width=100):
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=width, height=100)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_inbox_settles_processes_and_moves_files():
+    """Files are processed once they stop changing, then moved to done/ or failed/ and written to the sink"""
+    calls = []
+
+    def fake_extract(prepared, api_key, column_config):
+        calls.append(os.path.basename(prepared['path']))
+        if prepared['path'].endswith('bad.pdf'):
+            return {"error": "Gemini API error: quota"}
+        return {"Invoice Number": "INV-001", "Total Amount": "$10.00"}
+
+    original = ingest.extract_document
+    ingest.extract_document = fake_extract
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            watched = os.path.join(folder, 'inbox')
+            os.makedirs(watched)
+            # Dropped while the inbox was not running
+            write_pdf(os.path.join(watched, 'early.pdf'))
+            sink = os.path.join(folder, 'results.jsonl')
+            inbox = Inbox(watched, 'key', ingest.DEFAULT_COLUMNS, settle_seconds=0.3,
+                          db_path=os.path.join(folder, 'data', 'ledger.db'), sink_path=sink, report_interval=60)
+            inbox.start()
+            try:
+                # A file still being written is not picked up until it stops changing
+                buffer = io.BytesIO()
+                writer = PyPDF2.PdfWriter()
+                writer.add_blank_page(width=120, height=100)
+                writer.write(buffer)
+                data = buffer.getvalue()
+                with open(os.path.join(watched, 'slow.pdf'), 'wb') as f:
+                    for start in range(0, len(data), len(data) // 4 + 1):
+                        f.write(data[start:start + len(data) // 4 + 1])
+                        f.flush()
+                        time.sleep(0.2)
+                        assert 'slow.pdf' not in calls
+                write_pdf(os.path.join(watched, 'bad.pdf'), width=140)
+                with open(os.path.join(watched, 'notes.txt'), 'w') as f:
+                    f.write("not a pdf")
+
+                assert wait_for(lambda: inbox.status()['processed'] + inbox.status()['failed'] == 3)
+            finally:
+                inbox.stop()
+
+            assert sorted(calls) == ['bad.pdf', 'early.pdf', 'slow.pdf']
+            assert sorted(os.listdir(os.path.join(watched, 'done'))) == ['early.pdf', 'slow.pdf']
+            assert os.listdir(os.path.join(watched, 'failed')) == ['bad.pdf']
+            assert sorted(os.listdir(watched)) == ['done', 'failed', 'notes.txt']
+
+            with open(sink, encoding='utf-8') as f:
+                records = {record['file']: record for record in map(json.loads, f)}
+            assert records['slow.pdf']['ok'] and records['slow.pdf']['extracted_data']['Invoice Number'] == "INV-001"
+            assert records['bad.pdf']['error'] == "Gemini API error: quota"
+            assert 'path' not in records['slow.pdf'] and records['slow.pdf']['latency']['processing'] >= 0
+
+            status = inbox.status()
+            assert (status['processed'], status['failed'], status['queue_depth'], status['in_flight']) == (2, 1, 0, 0)
+            print("✅ Inbox waits for files to settle, then processes and moves them")
+    finally:
+        ingest.extract_document = original
+
+
+def test_move_keeps_earlier_files():
+    """A file processed twice under the same name does not overwrite the first one"""
+    with tempfile.TemporaryDirectory() as folder:
+        inbox = Inbox(folder, 'key', ingest.DEFAULT_COLUMNS, db_path=os.path.join(folder, 'data', 'ledger.db'))
+        for _ in range(2):
+            write_pdf(os.path.join(folder, 'invoice.pdf'))
+            inbox._move(os.path.join(folder, 'invoice.pdf'), inbox.done_folder)
+        names = sorted(os.listdir(inbox.done_folder))
+        assert len(names) == 2 and names[0] == 'invoice.pdf' and names[1].startswith('invoice_')
+        print("✅ Moves never overwrite earlier files")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Inbox Tests\n")
+    test_inbox_settles_processes_and_moves_files()
+    test_move_keeps_earlier_files()
+    print("\n🎉 All inbox tests passed!")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test bulk ingest resumption using a stand-in for the Gemini call
+"""
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+import ingest
+from ledger import Ledger
+from page_scorer import MAX_PROMPT_PAGES
+from test_pdf_text import table_pdf
+
+
+def make_pdfs(folder, count):
+    for i in range(count):
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(width=100 + i, height=100)
+        with open(os.path.join(folder, f"invoice_{i}.pdf"), 'wb') as f:
+            writer.write(f)
+
+
+def test_resume_skips_completed_documents():
+    """A second run only repeats the model call for documents that failed"""
+    calls = []
+
+    def fake_extract(prepared, api_key, column_config):
+        calls.append(prepared['path'])
+        if prepared['path'].endswith('invoice_1.pdf') and len(calls) <= 3:
+            return {"error": "Gemini API error: quota"}
+        return {"Invoice Number": "INV-001", "Total Amount": "$10.00"}
+
+    original = ingest.extract_document
+    ingest.extract_document = fake_extract
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            make_pdfs(folder, 3)
+            db_path = os.path.join(folder, 'data', 'ledger.db')
+
+            first = ingest.run_ingest(folder, 'key', ingest.DEFAULT_COLUMNS, workers=1, db_path=db_path)
+            assert (first['succeeded'], first['failed']) == (2, 1)
+            assert first['top_errors'][0][0] == "Gemini API error: quota"
+
+            second = ingest.run_ingest(folder, 'key', ingest.DEFAULT_COLUMNS, workers=1, db_path=db_path)
+            assert (second['skipped'], second['succeeded']) == (2, 1)
+            assert len(calls) == 4
+            print(f"✅ Resumed run made {len(calls) - 3} model call")
+    finally:
+        ingest.extract_document = original
+
+
+def test_resume_does_not_append_twice():
+    """Documents appended to the ledger but missing from the journal (run killed in between) keep one entry"""
+    original = ingest.extract_document
+    ingest.extract_document = lambda prepared, api_key, column_config: {"Invoice Number": "INV-001"}
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            make_pdfs(folder, 3)
+            db_path = os.path.join(folder, 'data', 'ledger.db')
+            journal_path = os.path.join(folder, ingest.JOURNAL_NAME)
+            ingest.run_ingest(folder, 'key', ingest.DEFAULT_COLUMNS, workers=1, db_path=db_path)
+
+            # Keep only the run record, as if the run died before writing any outcome
+            with open(journal_path, encoding='utf-8') as f:
+                lines = [line for line in f if '"event": "run"' in line]
+            with open(journal_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+
+            second = ingest.run_ingest(folder, 'key', ingest.DEFAULT_COLUMNS, workers=1, db_path=db_path)
+            assert second['succeeded'] == 3
+            assert Ledger(db_path).summary()['entries'] == 3
+            print("✅ A resumed run does not append documents twice")
+    finally:
+        ingest.extract_document = original
+
+
+def test_near_duplicate_reuse_requires_same_identifiers():
+    """A re-scanned copy reuses its original's fields; next month's invoice of a series is extracted"""
+    from field_cache import FieldCache
+    from invoice_index import InvoiceIndex
+    from near_duplicates import NearDuplicateIndex
+    from test_near_duplicates import INVOICE, rescan
+
+    texts = {
+        "march.pdf": INVOICE,
+        "copy.pdf": rescan(INVOICE),
+        "april.pdf": INVOICE.replace("INV-2024-0417", "INV-2024-0418").replace("3 March 2025", "3 April 2025"),
+    }
+    calls = []
+
+    def fake_prepare(pdf_path, shared=False):
+        return {"path": pdf_path, "pdf_bytes": None, "pdf_shared": None, "pdf_text": texts[os.path.basename(pdf_path)],
+                "fallback_text": "", "pruning": None}
+
+    def fake_extract(prepared, api_key, column_config):
+        calls.append(os.path.basename(prepared['path']))
+        return {"Invoice Number": f"INV-{len(calls)}"}
+
+    originals = ingest.prepare_document, ingest.extract_document
+    ingest.prepare_document, ingest.extract_document = fake_prepare, fake_extract
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            db_path = os.path.join(folder, 'ledger.db')
+            ledger, index, cache = Ledger(db_path), InvoiceIndex(db_path), FieldCache(db_path)
+            near = NearDuplicateIndex(db_path)
+            columns = [{"name": "Invoice Number", "description": "The invoice number"}]
+            results = {}
+            for name in texts:
+                results[name] = ingest.process_document(
+                    os.path.join(folder, name), 'key', columns, ledger, index, doc_hash=name, field_cache=cache,
+                    near_duplicates=near, reuse_duplicates=True)
+
+            assert calls == ["march.pdf", "april.pdf"]
+            assert results["copy.pdf"]['extracted_data'] == {"Invoice Number": "INV-1"}
+            assert results["copy.pdf"]['near_duplicate']['fields_reused'] == 1
+            assert results["april.pdf"]['near_duplicate']['document_hash'] == "march.pdf"
+            assert results["april.pdf"]['extracted_data'] == {"Invoice Number": "INV-2"}
+            # Reused values stay the original's; the copy has no cache entries of its own
+            assert cache.lookup("copy.pdf", columns) == ({}, columns)
+            print("✅ Near-duplicates are reused only when their numbers and identifiers match")
+    finally:
+        ingest.prepare_document, ingest.extract_document = originals
+
+
+def test_prepared_pdf_handed_over_in_shared_memory():
+    """A worker returns a trimmed PDF through shared memory and an untrimmed one not at all"""
+    with tempfile.TemporaryDirectory() as folder:
+        long_pdf, short_pdf = os.path.join(folder, 'long.pdf'), os.path.join(folder, 'short.pdf')
+        with open(long_pdf, 'wb') as f:
+            f.write(table_pdf(MAX_PROMPT_PAGES + 2))
+        with open(short_pdf, 'wb') as f:
+            f.write(table_pdf(1))
+
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            trimmed = pool.submit(ingest.prepare_document, long_pdf, shared=True).result()
+            whole = pool.submit(ingest.prepare_document, short_pdf, shared=True).result()
+
+        assert trimmed['pdf_bytes'] is None and trimmed['pdf_shared'] is not None
+        pdf_bytes = ingest.load_pdf(trimmed)
+        assert len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages) == MAX_PROMPT_PAGES
+        assert trimmed.get('pdf_shared') is None and ingest.load_pdf(trimmed) == pdf_bytes
+
+        assert whole['pdf_bytes'] is None and whole['pdf_shared'] is None
+        assert ingest.load_pdf(whole) == table_pdf(1)
+        print("✅ Trimmed PDFs come back through shared memory")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Bulk Ingest Tests\n")
+    test_resume_skips_completed_documents()
+    test_resume_does_not_append_twice()
+    test_near_duplicate_reuse_requires_same_identifiers()
+    test_prepared_pdf_handed_over_in_shared_memory()
+    print("\n🎉 All ingest tests passed!")
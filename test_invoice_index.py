@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test the full-text and field index over processed invoices
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from invoice_index import InvoiceIndex, find_role_column
+
+COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number"},
+    {"name": "Vendor", "description": "Vendor or supplier name"},
+    {"name": "Invoice Date", "description": "Invoice date"},
+    {"name": "Tax Amount", "description": "Tax included in the total"},
+    {"name": "Total Amount", "description": "Total invoice amount"},
+]
+
+
+def build_index(folder):
+    index = InvoiceIndex(os.path.join(folder, 'index.db'))
+    index.add("hash1", "Consulting services for March", {
+        "Invoice Number": "INV-001", "Vendor": "ACME Corp", "Invoice Date": "Mar 3rd 2025",
+        "Tax Amount": "$10.00", "Total Amount": "$110.00"}, COLUMNS, entry_id=1)
+    index.add("hash2", "Hardware delivery", {
+        "Invoice Number": "INV-002", "Vendor": "Globex", "Invoice Date": "2025-04-15",
+        "Tax Amount": "1.000,00 €", "Total Amount": "12.500,00 €"}, COLUMNS, entry_id=2)
+    return index
+
+
+def test_role_columns():
+    """Vendor, total and invoice date are found among the configured columns"""
+    assert find_role_column(COLUMNS, 'vendor') == "Vendor"
+    assert find_role_column(COLUMNS, 'amount') == "Total Amount"
+    assert find_role_column(COLUMNS, 'date') == "Invoice Date"
+    print("✅ Role columns detected")
+
+
+def test_search_filters():
+    """Text, vendor, amount, date and field filters each narrow the results"""
+    with tempfile.TemporaryDirectory() as folder:
+        index = build_index(folder)
+
+        assert [r['entry_id'] for r in index.search(q="consulting")] == [1]
+        assert [r['entry_id'] for r in index.search(vendor="glo")] == [2]
+        assert [r['entry_id'] for r in index.search(min_amount=1000)] == [2]
+        assert [r['entry_id'] for r in index.search(date_from="2025-03-01", date_to="2025-03-31")] == [1]
+        assert [r['entry_id'] for r in index.search(field="Invoice Number", value="inv-002")] == [2]
+        assert [r['entry_id'] for r in index.search(field="Tax Amount", field_max=50)] == [1]
+        assert index.search(q='"unbalanced') == []
+
+        result = index.search(vendor="ACME")[0]
+        assert result['amount'] == 110.0 and result['currency'] == 'USD'
+        assert result['invoice_date'] == '2025-03-03'
+        print("✅ Search filters work")
+
+
+def test_reindex_replaces_entry():
+    """Re-extracting a document replaces its index entry; text columns are not parsed as numbers"""
+    with tempfile.TemporaryDirectory() as folder:
+        index = build_index(folder)
+        index.add("hash1", "Consulting services for March", {
+            "Invoice Number": "INV-001", "Vendor": "ACME Corp", "Invoice Date": "Mar 3rd 2025",
+            "Tax Amount": "$10.00", "Total Amount": "$120.00"}, COLUMNS, entry_id=3)
+
+        assert [r['entry_id'] for r in index.search(q="consulting")] == [3]
+        assert index.search(vendor="ACME")[0]['amount'] == 120.0
+        assert index.search(field="Invoice Number", field_max=0) == []
+        # A different column configuration is indexed separately
+        index.add("hash1", "Consulting services for March", {"Vendor": "ACME Corp"}, COLUMNS[1:2], entry_id=4)
+        assert sorted(r['entry_id'] for r in index.search(vendor="ACME")) == [3, 4]
+        print("✅ Re-indexed documents replace their earlier entry")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Invoice Index Tests\n")
+    test_role_columns()
+    test_search_filters()
+    test_reindex_replaces_entry()
+    print("\n🎉 All invoice index tests passed!")
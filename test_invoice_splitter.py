@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test invoice boundary detection in multi-invoice PDFs
+"""
+import io
+import os
+import sys
+
+import PyPDF2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from invoice_splitter import detect_invoices, invoice_number, page_marker, split_pdf
+
+HEADER = "ACME Supplies Ltd\n12 Harbour Road\nVAT GB123456789\n"
+
+
+def test_boundaries_from_markers_numbers_and_headers():
+    """Page markers, invoice number changes and repeated headers start new invoices"""
+    texts = [
+        HEADER + "Invoice No: INV-1001\nPage 1 of 2\nWidget 10.00",
+        "Invoice No: INV-1001\nPage 2 of 2\nTotal 20.00",
+        HEADER + "Invoice No: INV-1002\nTotal 5.00",
+        "Terms and conditions apply",
+        HEADER + "Invoice Date: 2025-03-01\nConsulting\nTotal due 99.00",
+        HEADER + "Invoice Date: 2025-03-02\nSupport\nTotal due 45.00",
+        "Seite 1 von 1\nRechnung Nr. RE-77\nSumme 10,00",
+    ]
+    segments = detect_invoices(texts=texts)
+    assert [segment['pages'] for segment in segments] == [[0, 1], [2, 3], [4], [5], [6]]
+    assert [segment['invoice_number'] for segment in segments] == ["INV-1001", "INV-1002", None, None, "RE-77"]
+
+    assert invoice_number("Invoice Date: 2025-01-01\nInvoice # A-17") == "A-17"
+    assert invoice_number("Invoice total 100.00") is None
+    assert page_marker("page 3/4") == (3, 4)
+    print("✅ Invoice boundaries are detected from page text")
+
+
+def test_split_pdf_pages():
+    """Each segment becomes its own PDF with its pages"""
+    writer = PyPDF2.PdfWriter()
+    for width in (100, 200, 300):
+        writer.add_blank_page(width=width, height=100)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+
+    parts = list(split_pdf(buffer.getvalue(), [{"pages": [0, 1]}, {"pages": [2]}]))
+    readers = [PyPDF2.PdfReader(io.BytesIO(part)) for part in parts]
+    assert [len(reader.pages) for reader in readers] == [2, 1]
+    assert float(readers[1].pages[0].mediabox.width) == 300
+    print("✅ Multi-invoice PDFs split into one PDF per invoice")
+
+
+if __name__ == "__main__":
+    test_boundaries_from_markers_numbers_and_headers()
+    test_split_pdf_pages()
+    print("\n🎉 All invoice splitter tests passed!")
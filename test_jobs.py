@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test the Flask app's upload jobs and page rendering using stand-ins for the pipeline
+"""
+import base64
+import os
+import tempfile
+import time
+import uuid
+
+# Parsing stays in the test process
+os.environ.setdefault('INVOICEPILOT_CPU_WORKERS', '0')
+
+import app
+
+
+class QueuedPool:
+    """Holds submitted documents until the test runs them, like a saturated job pool"""
+
+    def __init__(self):
+        self.queued = []
+
+    def submit(self, fn, *args):
+        self.queued.append((fn, args))
+
+    def run_all(self):
+        for fn, args in self.queued:
+            fn(*args)
+
+
+def test_queued_document_survives_upload_sweep():
+    """A document still waiting in a job is not swept, and is swept once it has run"""
+    seen = []
+
+    def fake_process_upload(file_path, filename, *args, **kwargs):
+        with open(file_path, 'rb') as f:
+            seen.append(f.read())
+        return {"success": True}, 200
+
+    original_pool, original_process = app.job_pool, app.process_upload
+    app.job_pool, app.process_upload = QueuedPool(), fake_process_upload
+    try:
+        file_path = app.upload_store.new_temp_path('invoice.pdf')
+        with open(file_path, 'wb') as f:
+            f.write(b'%PDF-1.4 queued')
+        job_id = app.start_job([(file_path, 'invoice.pdf')], 'key', [{"name": "Total"}])
+
+        # Waited longer than UPLOAD_TTL_SECONDS before a worker was free
+        old = time.time() - app.app.config['UPLOAD_TTL_SECONDS'] - 60
+        os.utime(file_path, (old, old))
+        app.upload_store.sweep()
+        app.job_pool.run_all()
+
+        assert seen == [b'%PDF-1.4 queued']
+        assert app.progress_hub.snapshot(job_id)['completed'] == 1
+        app.upload_store.sweep()
+        assert not os.path.exists(file_path)
+        print("✅ Queued job documents survive the upload sweeper")
+    finally:
+        app.job_pool, app.process_upload = original_pool, original_process
+
+
+def test_job_passes_text_options():
+    """/jobs validates text_backend and hands the text options to every document of the job"""
+    import io
+    from test_pdf_text import table_pdf
+
+    received = []
+
+    def fake_process_upload(file_path, filename, *args, **kwargs):
+        received.append((kwargs.get('text_options'), kwargs.get('refresh')))
+        os.remove(file_path)
+        return {"success": True}, 200
+
+    original_pool, original_process = app.job_pool, app.process_upload
+    app.job_pool, app.process_upload = QueuedPool(), fake_process_upload
+    try:
+        client = app.app.test_client()
+        form = {"api_key": "key", "column_config": '[{"name": "Total"}]', "text_layout": "false"}
+
+        response = client.post('/jobs', data=dict(form, text_backend='ocr', file=(io.BytesIO(table_pdf(1)), 'a.pdf')))
+        assert response.status_code == 400 and "Unknown text backend" in response.get_json()['error']
+
+        response = client.post('/jobs', data=dict(form, text_backend='pypdf2', refresh='1',
+                                                  file=(io.BytesIO(table_pdf(1)), 'a.pdf')))
+        assert response.status_code == 202
+        app.job_pool.run_all()
+        assert received == [({"backend": "pypdf2", "layout": False}, True)]
+        print("✅ Jobs pass text options and refresh to their documents")
+    finally:
+        app.job_pool, app.process_upload = original_pool, original_process
+
+
+def test_page_cache_is_per_rasterizer():
+    """Switching the rasterizer does not serve pages rendered by the other backend"""
+    from test_pdf_text import table_pdf
+
+    def fake_pdf_to_png(pdf_path, dpi):
+        return f"png by {app.app.config['RASTERIZER']}".encode(), 0
+
+    original_render, original_rasterizer = app.pdf_to_png, app.app.config['RASTERIZER']
+    app.pdf_to_png = fake_pdf_to_png
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            pdf_path = os.path.join(folder, 'invoice.pdf')
+            with open(pdf_path, 'wb') as f:
+                f.write(table_pdf(1))
+            doc_hash = uuid.uuid4().hex
+
+            app.app.config['RASTERIZER'] = 'pdfium'
+            assert app.render_page_png(pdf_path, doc_hash)[1]['cache_hit'] is False
+            memory = app.render_page_png(pdf_path, doc_hash)[1]
+            assert memory['cache_hit'] and memory['rasterizer'] == 'pdfium'
+            app.app.config['RASTERIZER'] = 'poppler'
+            img_base64, memory = app.render_page_png(pdf_path, doc_hash)
+            assert memory['cache_hit'] is False and memory['rasterizer'] == 'poppler'
+            assert base64.b64decode(img_base64) == b"png by poppler"
+        print("✅ Cached pages are kept per rasterizer")
+    finally:
+        app.pdf_to_png, app.app.config['RASTERIZER'] = original_render, original_rasterizer
+
+
+def test_refresh_skips_field_cache():
+    """Cached fields answer a re-upload unless refresh is set; empty answers are asked for again"""
+    from test_pdf_text import table_pdf
+
+    calls = []
+    answers = [{"Reference": None}, {"Reference": "REF-1"}, {"Reference": "REF-2"}]
+
+    def fake_extract(api_key, file_path, image, columns, on_field=None, metrics=None, model_name=None):
+        calls.append(model_name)
+        return dict(answers[len(calls) - 1])
+
+    original_render, original_extract = app.render_page_png, app.extract_invoice_data_with_gemini
+    app.render_page_png = lambda pdf_path, doc_hash: ("aW1n", {})
+    app.extract_invoice_data_with_gemini = fake_extract
+    try:
+        # Unique bytes, so earlier runs' cache entries do not apply
+        pdf_bytes = table_pdf(1) + f"\n% {uuid.uuid4().hex}\n".encode()
+        columns = [{"name": "Reference", "description": "Customer reference"}]
+
+        def upload(**kwargs):
+            file_path = app.upload_store.new_temp_path('invoice.pdf')
+            with open(file_path, 'wb') as f:
+                f.write(pdf_bytes)
+            body, status = app.process_upload(file_path, 'invoice.pdf', 'key', columns, **kwargs)
+            assert status == 200
+            return body['extracted_data']['Reference']
+
+        assert upload() is None and len(calls) == 1
+        assert upload() == "REF-1" and len(calls) == 2
+        assert upload() == "REF-1" and len(calls) == 2
+        assert upload(refresh=True) == "REF-2" and len(calls) == 3
+        assert upload() == "REF-2" and len(calls) == 3
+        print("✅ refresh re-extracts cached fields")
+    finally:
+        app.render_page_png, app.extract_invoice_data_with_gemini = original_render, original_extract
+
+
+def test_multi_invoice_results_share_one_workbook():
+    """A multi-invoice upload and a multi-document job each download one workbook with every invoice"""
+    import io
+    import itertools
+    import threading
+    from openpyxl import load_workbook
+    from test_pdf_text import table_pdf
+
+    counter = itertools.count(1)
+    counter_lock = threading.Lock()
+
+    def fake_extract(api_key, file_path, image, columns, on_field=None, metrics=None, model_name=None):
+        with counter_lock:
+            return {"Reference": f"REF-{next(counter)}"}
+
+    def fake_split(file_path, filename, text_options=None):
+        parts = []
+        for number in (1, 2):
+            part_path = app.upload_store.new_temp_path(f"part{number}.pdf")
+            with open(part_path, 'wb') as f:
+                f.write(table_pdf(1) + f"\n% {uuid.uuid4().hex}\n".encode())
+            parts.append((part_path, f"part{number}.pdf"))
+        os.remove(file_path)
+        return parts
+
+    def workbook_references(data):
+        rows = list(load_workbook(io.BytesIO(data)).active.iter_rows(values_only=True))
+        assert rows[0][0] == "Reference"
+        return sorted(row[0] for row in rows[1:])
+
+    originals = (app.render_page_png, app.extract_invoice_data_with_gemini, app.split_invoices, app.job_pool)
+    app.render_page_png = lambda pdf_path, doc_hash: ("aW1n", {})
+    app.extract_invoice_data_with_gemini = fake_extract
+    app.split_invoices = fake_split
+    try:
+        client = app.app.test_client()
+        response = client.post('/upload', data={
+            "api_key": "key", "column_config": '[{"name": "Reference", "description": "Customer reference"}]',
+            "file": (io.BytesIO(table_pdf(1)), 'two.pdf')})
+        body = response.get_json()
+        assert response.status_code == 200 and len(body['invoices']) == 2
+        expected = sorted(invoice['extracted_data']['Reference'] for invoice in body['invoices'])
+        workbook = client.get(f"/download/{body['excel_file']}")
+        assert workbook_references(workbook.data) == expected
+
+        app.job_pool = QueuedPool()
+        columns = [{"name": "Reference", "description": "Customer reference"}]
+        upload_path = app.upload_store.new_temp_path('two.pdf')
+        open(upload_path, 'wb').close()
+        job_id = app.start_job(fake_split(upload_path, 'two.pdf'), 'key', columns)
+        app.job_pool.run_all()
+        references = [event['data']['extracted_data']['Reference']
+                      for event in app.progress_hub.snapshot(job_id)['events'] if event['event'] == 'result']
+        workbook = client.get(f"/jobs/{job_id}/workbook")
+        assert workbook.status_code == 200 and workbook_references(workbook.data) == sorted(references)
+        print("✅ Multi-invoice uploads and jobs download one workbook with every invoice")
+    finally:
+        app.render_page_png, app.extract_invoice_data_with_gemini, app.split_invoices, app.job_pool = originals
+
+
+def test_metrics_report_raster_budget():
+    """/metrics reports the raster budget as the budget itself counts it"""
+    body = app.app.test_client().get('/metrics').get_json()
+    assert body['raster_budget'] == app.raster_budget.stats()
+    print("✅ Metrics report the raster memory budget")
+
+
+if __name__ == "__main__":
+    test_queued_document_survives_upload_sweep()
+    test_job_passes_text_options()
+    test_page_cache_is_per_rasterizer()
+    test_refresh_skips_field_cache()
+    test_multi_invoice_results_share_one_workbook()
+    test_metrics_report_raster_budget()
+    print("\n🎉 All job tests passed!")
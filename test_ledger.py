@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the extraction ledger and its streaming exports
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from ledger import Ledger, column_config_id, iter_csv, write_xlsx
+
+COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number"},
+    {"name": "Total Amount", "description": "Total amount"},
+]
+
+
+def test_append_and_filter_by_profile():
+    """Entries are stored with their column config id and filtered by it"""
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = Ledger(os.path.join(folder, 'ledger.db'))
+        first = ledger.append({"Invoice Number": "INV-001", "Total Amount": "$10"}, "hash1", COLUMNS, "a.pdf")
+        ledger.append({"Vendor": "ACME"}, "hash2", [{"name": "Vendor", "description": "Vendor"}], "b.pdf")
+
+        entry = ledger.get(first)
+        assert entry['config_id'] == column_config_id(COLUMNS)
+        assert entry['extracted_data']['Invoice Number'] == "INV-001"
+
+        rows = list(ledger.iter_entries(config_id=column_config_id(COLUMNS)))
+        assert [row['document_hash'] for row in rows] == ["hash1"]
+        assert ledger.columns_for() == ["Invoice Number", "Total Amount", "Vendor"]
+        print(f"✅ Ledger has {len(ledger.profiles())} profiles")
+
+
+def test_exports_stream_all_rows():
+    """CSV and Excel exports contain one row per entry"""
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = Ledger(os.path.join(folder, 'ledger.db'))
+        for i in range(1200):
+            ledger.append({"Invoice Number": f"INV-{i}", "Total Amount": i}, f"hash{i}", COLUMNS)
+
+        columns = ledger.columns_for()
+        text = "".join(iter_csv(ledger.iter_entries(), columns))
+        rows = list(csv.reader(io.StringIO(text)))
+        assert len(rows) == 1201
+        assert rows[1][-2:] == ["INV-0", "0"]
+
+        path = os.path.join(folder, 'ledger.xlsx')
+        write_xlsx(path, ledger.iter_entries(end='2999-12-31'), columns)
+
+        from openpyxl import load_workbook
+        sheet = load_workbook(path, read_only=True).active
+        assert sum(1 for _ in sheet.iter_rows()) == 1201
+        print("✅ Exported 1200 ledger rows")
+
+
+def test_range_bounds_in_other_timezones():
+    """Start and end timestamps with any UTC offset select the same entries"""
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = Ledger(os.path.join(folder, 'ledger.db'))
+        ledger.append({"Invoice Number": "INV-001"}, "hash1", COLUMNS)
+        tokyo = timezone(timedelta(hours=9))
+        before = (datetime.now(timezone.utc) - timedelta(minutes=5)).astimezone(tokyo).isoformat()
+        after = (datetime.now(timezone.utc) + timedelta(minutes=5)).astimezone(tokyo).isoformat()
+        assert ledger.summary(start=before)['entries'] == 1
+        assert ledger.summary(end=before)['entries'] == 0
+        assert ledger.summary(start=after)['entries'] == 0
+        assert ledger.summary(end=after)['entries'] == 1
+        print("✅ Range bounds are compared in UTC")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Ledger Tests\n")
+    test_append_and_filter_by_profile()
+    test_exports_stream_all_rows()
+    test_range_bounds_in_other_timezones()
+    print("\n🎉 All ledger tests passed!")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test the shared memory budget used to bound concurrent page renders
+"""
+import threading
+import time
+
+from memory_budget import MemoryBudget, MemoryBudgetExceeded
+
+
+def test_concurrent_reservations_stay_within_budget():
+    """Renders wait for each other instead of exceeding max_bytes"""
+    budget = MemoryBudget(100)
+
+    def render():
+        with budget.reserve(40):
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=render) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = budget.stats()
+    assert stats['peak'] <= 100
+    assert stats['in_use'] == 0
+    print(f"✅ Peak reservation {stats['peak']} of {stats['max_bytes']} bytes")
+
+
+def test_oversized_and_timed_out_reservations():
+    """Oversized requests are clamped; a full budget times out"""
+    budget = MemoryBudget(100)
+    assert budget.acquire(500) == 100
+
+    try:
+        budget.acquire(1, timeout=0.05)
+        assert False, "expected MemoryBudgetExceeded"
+    except MemoryBudgetExceeded:
+        pass
+
+    budget.release(100)
+    assert budget.acquire(1, timeout=0.05) == 1
+    print("✅ Clamping and timeouts work")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Memory Budget Tests\n")
+    test_concurrent_reservations_stay_within_budget()
+    test_oversized_and_timed_out_reservations()
+    print("\n🎉 All memory budget tests passed!")
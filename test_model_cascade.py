@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test the model cascade and its local validators
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from model_cascade import CascadeStats, amount_role, run_cascade, validate_fields
+
+COLUMNS = [
+    {"name": "Invoice Number", "description": "The invoice number"},
+    {"name": "Date", "description": "Invoice date"},
+    {"name": "Line Items", "description": "Each line with quantity, unit price and amount"},
+    {"name": "Subtotal", "description": "Net amount"},
+    {"name": "VAT", "description": "Tax amount"},
+    {"name": "Total Amount", "description": "Total invoice amount"},
+]
+GOOD = {
+    "Invoice Number": "INV-9",
+    "Date": "3 March 2025",
+    "Line Items": [{"description": "Widgets", "qty": 2, "unit price": "10.00"}, {"description": "Fee", "amount": "5,00"}],
+    "Subtotal": "25.00",
+    "VAT": "5.00",
+    "Total Amount": "€30.00",
+}
+
+
+def test_validators():
+    """Dates and numbers must parse, and lines, subtotal and tax must add up to the total"""
+    assert validate_fields(GOOD, COLUMNS) == {}
+    assert validate_fields(dict(GOOD, Date=None, VAT=None), COLUMNS) == {}
+
+    failures = validate_fields(dict(GOOD, Date="sometime in spring", **{"Invoice Number": "??"}), COLUMNS)
+    assert list(failures) == ["Date"]
+
+    failures = validate_fields(dict(GOOD, **{"Total Amount": "31.00"}), COLUMNS)
+    assert set(failures) == {"Subtotal", "VAT", "Total Amount"}
+    failures = validate_fields(dict(GOOD, Subtotal="26.00", **{"Total Amount": "31.00"}), COLUMNS)
+    assert failures == {"Line Items": "line items sum to 25.00, total is 31.00",
+                        "Total Amount": "line items sum to 25.00, total is 31.00"}
+
+    failures = validate_fields({k: v for k, v in GOOD.items() if k != "VAT"}, COLUMNS)
+    assert failures == {"VAT": "missing from the response"}
+    print("✅ Validators catch unparseable values and totals that do not add up")
+
+
+def test_amount_roles_use_whole_words():
+    """Roles come from whole words, with the total recognised before its tax"""
+    names = {"Internet Fee": None, "Total (incl. VAT)": 'total', "Total VAT": 'tax', "Sub Total": 'subtotal',
+             "Total excl. VAT": 'subtotal', "Net Amount": 'subtotal', "Sales Tax": 'tax', "Grand Total": 'total'}
+    assert {name: amount_role(name) for name in names} == names
+
+    columns = [{"name": "Internet Fee"}, {"name": "Subtotal"}, {"name": "VAT"}, {"name": "Total (incl. VAT)"}]
+    data = {"Internet Fee": "9.99", "Subtotal": "100.00", "VAT": "20.00", "Total (incl. VAT)": "120.00"}
+    assert validate_fields(data, columns) == {}
+    assert set(validate_fields(dict(data, **{"Total (incl. VAT)": "125.00"}), columns)) == \
+        {"Subtotal", "VAT", "Total (incl. VAT)"}
+    print("✅ Amount roles match whole words and put the total before its tax")
+
+
+def test_cascade_escalates_only_failing_fields():
+    """Only the fields that fail validation go to the stronger model"""
+    calls = []
+
+    def extract(model_name, columns, metrics):
+        calls.append((model_name, [col['name'] for col in columns]))
+        metrics.update(input_tokens=100, output_tokens=10)
+        if model_name == "cheap":
+            return dict(GOOD, Date="tomorrow-ish")
+        return {"Date": "2025-03-03"}
+
+    stats = CascadeStats()
+    result, report = run_cascade(extract, COLUMNS, models=("cheap", "strong"), stats=stats)
+    assert calls == [("cheap", [col['name'] for col in COLUMNS]), ("strong", ["Date"])]
+    assert result == dict(GOOD, Date="2025-03-03")
+    assert report['escalated_fields'] == ["Date"] and report['failures'] == {}
+    assert [usage['model'] for usage in report['usage']] == ["cheap", "strong"]
+
+    # A failed call escalates the whole document; a clean one stops at the first model
+    responses = iter([{"error": "Gemini API error: overloaded"}, GOOD, GOOD])
+    result, report = run_cascade(lambda m, c, metrics: next(responses), COLUMNS, models=("cheap", "strong"), stats=stats)
+    assert result == GOOD and len(report['escalated_fields']) == len(COLUMNS)
+    result, report = run_cascade(lambda m, c, metrics: next(responses), COLUMNS, models=("cheap", "strong"), stats=stats)
+    assert report['models'] == ["cheap"] and report['usage'] == []
+
+    # Fields the stronger model leaves out keep the cheaper model's answer
+    responses = iter([dict(GOOD, **{"Total Amount": "€31.00"}), {"Total Amount": "€30.00"}])
+    result, report = run_cascade(lambda m, c, metrics: next(responses), COLUMNS, models=("cheap", "strong"))
+    assert result == GOOD and report['failures'] == {}
+
+    snapshot = stats.snapshot()
+    assert (snapshot['documents'], snapshot['escalated_documents']) == (3, 2)
+    assert snapshot['field_escalation_rate'] == round(7 / 18, 4)
+    assert snapshot['calls_per_model'] == {"cheap": 3, "strong": 2}
+    print("✅ Cascade escalates failing fields only and reports escalation rates")
+
+
+if __name__ == "__main__":
+    test_validators()
+    test_amount_roles_use_whole_words()
+    test_cascade_escalates_only_failing_fields()
+    print("\n🎉 All model cascade tests passed!")
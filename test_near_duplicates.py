@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test near-duplicate detection over invoice text
+"""
+import os
+import random
+import tempfile
+import time
+
+from near_duplicates import NearDuplicateIndex, signature, similarity
+
+INVOICE = """
+ACME Office Supplies Ltd, 12 Market Street, Leeds LS1 4AB
+INVOICE  Invoice number: INV-2024-0417   Date: 3 March 2025   Due: 2 April 2025
+Bill to: Northwind Traders, 88 Harbour Road, Bristol BS1 5TT
+Description              Qty   Unit price   Amount
+A4 copy paper, 5 reams     4       21.50     86.00
+Black toner cartridge      2       64.00    128.00
+Desk organiser             1       18.75     18.75
+Subtotal 232.75   VAT 20% 46.55   Total due GBP 279.30
+Payment by bank transfer to sort code 20-00-00, account 55779911, within 30 days.
+"""
+
+
+def rescan(text):
+    """What OCR of a re-scanned copy looks like: other line breaks, case and a couple of misread words"""
+    words = text.replace("Office", "0ffice").replace("toner", "t0ner").split()
+    return "\n".join(" ".join(words[i:i + 7]).upper() for i in range(0, len(words), 7))
+
+
+def test_signatures():
+    """Re-scans stay close, different invoices do not, and too little text is not fingerprinted"""
+    original = signature(INVOICE)
+    assert similarity(original, signature(INVOICE.replace("  ", " ").lower())) == 1.0
+    assert similarity(original, signature(rescan(INVOICE))) >= 0.85
+
+    other = INVOICE.replace("INV-2024-0417", "INV-2024-0522").replace("3 March", "9 May") \
+        .replace("A4 copy paper, 5 reams     4       21.50     86.00", "Stapler 1 9.99 9.99")
+    assert similarity(original, signature(other)) < 0.85
+    assert signature("Page 2 of 2") is None
+    print("✅ MinHash signatures tolerate re-scans and tell different invoices apart")
+
+
+def test_index_lookup():
+    """Lookups find the processed copy, skip the document itself and take under a millisecond"""
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, 'near.db')
+        index = NearDuplicateIndex(db_path, threshold=0.6)
+        rng = random.Random(3)
+        for n in range(2000):
+            index.add(f"hash{n}", " ".join(rng.choice(["paper", "toner", "invoice", "total", "vat", str(n)])
+                                          for _ in range(60)) + f" document {n}", entry_id=n)
+        assert index.add("original", INVOICE, entry_id=9001)
+        assert not index.add("blank", "")
+
+        copy = rescan(INVOICE)
+        match = index.find(copy)
+        assert match['document_hash'] == "original" and match['entry_id'] == 9001
+        assert match['same_identifiers']
+        assert index.find(INVOICE, exclude_hash="original") is None
+
+        started = time.perf_counter()
+        for _ in range(200):
+            index.find(copy)
+        per_lookup = (time.perf_counter() - started) / 200
+        assert per_lookup < 0.001, per_lookup
+
+        # A new process loads the stored signatures
+        reopened = NearDuplicateIndex(db_path, threshold=0.6)
+        assert reopened.stats()['documents'] == 2001
+        assert reopened.find(copy)['document_hash'] == "original"
+        print(f"✅ Near-duplicates are found in {per_lookup * 1e6:.0f}µs per lookup across 2,001 documents")
+
+
+def test_recurring_invoice_is_not_the_same_invoice():
+    """Next month's invoice of a series matches on text but not on its numbers and identifiers"""
+    with tempfile.TemporaryDirectory() as folder:
+        index = NearDuplicateIndex(os.path.join(folder, 'near.db'))
+        index.add("march", INVOICE, entry_id=1)
+        april = INVOICE.replace("INV-2024-0417", "INV-2024-0418").replace("3 March 2025", "3 April 2025")
+        match = index.find(april)
+        assert match['document_hash'] == "march" and match['similarity'] >= 0.85
+        assert not match['same_identifiers']
+        print("✅ Recurring invoices are flagged but not treated as copies")
+
+
+if __name__ == "__main__":
+    test_signatures()
+    test_index_lookup()
+    test_recurring_invoice_is_not_the_same_invoice()
+    print("\n🎉 All near-duplicate tests passed!")
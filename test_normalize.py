@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test vectorized normalization of extracted values and typed workbooks
+"""
+import datetime
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from normalize import frame_rows, normalize_amounts, normalize_dates, normalize_frame, normalize_percentages
+from value_parsing import column_type, parse_amount, parse_date, parse_percentage
+from ledger import Ledger, write_xlsx
+
+AMOUNTS = ["1.234,50 €", "$1,234.56", "USD 99", "(12.00)", "-5", "1,234", "12,50", "1.234.567", "abc", None,
+           12, 3.5, "£ 1 234,00", "CHF 1'234.50", "", True, "99.", "INV-2024 total 500", "Rs. 1,00,000"]
+DATES = ["Mar 3rd 2025", "2025-03-03", "03/04/2025", "3.4.2025", "March 3, 2025", "Sept 5 2024", "Mar. 3 2025",
+         "garbage", None, datetime.date(2024, 1, 2), "2025-3-3", "2025-03-03T10:00:00"]
+
+
+def test_columns_match_value_parsers():
+    """Whole-column results equal value_parsing's per-value results"""
+    amounts, currencies = normalize_amounts(AMOUNTS)
+    expected = [parse_amount(value) for value in AMOUNTS]
+    assert [None if pd.isna(a) else a for a in amounts] == [amount for amount, _ in expected]
+    assert list(currencies) == [currency for _, currency in expected]
+    assert parse_amount("INV-2024 total 500") == (500.0, 'INV') and parse_amount("Rs. 1,00,000")[0] == 100000.0
+    assert parse_amount("-5")[0] == -5.0 and parse_amount("(12.00)")[0] == -12.0
+
+    dates = normalize_dates(DATES)
+    assert [None if pd.isna(d) else d.date() for d in dates] == [parse_date(value) for value in DATES]
+
+    rates = ["7.5%", "7,5 %", 0.075, None, "n/a"]
+    assert [None if pd.isna(r) else r for r in normalize_percentages(rates)] == [parse_percentage(r) for r in rates]
+    print("✅ Vectorized normalization matches the per-value parsers")
+
+
+def test_typed_workbook():
+    """Ledger workbooks written from column definitions hold typed cells and a Currency column"""
+    columns = [
+        {"name": "Invoice Number", "description": "The invoice number"},
+        {"name": "Date", "description": "Invoice date"},
+        {"name": "Total Amount", "description": "Total amount"},
+        {"name": "Line Items", "description": "Lines"},
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        ledger = Ledger(os.path.join(folder, 'ledger.db'))
+        ledger.append({"Invoice Number": "INV-1", "Date": "Mar 3rd 2025", "Total Amount": "1.234,50 €",
+                       "Line Items": [{"amount": 1}]}, "hash1", columns)
+        ledger.append({"Invoice Number": "INV-2", "Date": "soon", "Total Amount": "USD 99"}, "hash2", columns)
+
+        path = os.path.join(folder, 'typed.xlsx')
+        write_xlsx(path, ledger.iter_entries(), ledger.column_definitions_for(), include_metadata=False)
+
+        from openpyxl import load_workbook
+        rows = [[cell.value for cell in row] for row in load_workbook(path, read_only=True).active.iter_rows()]
+        assert rows[0] == ["Invoice Number", "Date", "Total Amount", "Line Items", "Currency"]
+        assert rows[1] == ["INV-1", datetime.datetime(2025, 3, 3), 1234.5, '[{"amount": 1}]', "EUR"]
+        assert rows[2] == ["INV-2", "soon", 99.0, None, "USD"]
+        print("✅ Workbooks are written with typed dates, amounts and currencies")
+
+
+def test_identifiers_are_not_coerced():
+    """Column types come from whole words, and identifier columns stay text"""
+    names = {"Tax ID": 'text', "VAT Number": 'text', "Invoice #": 'text', "Summary": 'text',
+             "Exchange Rate": 'number', "VAT Rate": 'percent', "Sub-total": 'number', "Taxes": 'number',
+             "Total (incl. VAT)": 'number', "Due Date": 'date'}
+    assert {name: column_type({"name": name}) for name in names} == names
+
+    columns = [{"name": name} for name in names]
+    frame = pd.DataFrame([{"Tax ID": "12-3456789", "VAT Number": "GB123456789", "Summary": "2 items",
+                           "Exchange Rate": "1.0832", "VAT Rate": "20%"}], columns=list(names), dtype=object)
+    row = dict(zip(names, frame_rows(normalize_frame(frame, columns))[0]))
+    assert row["Tax ID"] == "12-3456789" and row["VAT Number"] == "GB123456789" and row["Summary"] == "2 items"
+    assert row["Exchange Rate"] == 1.0832 and row["VAT Rate"] == 20.0
+    print("✅ Identifier and summary columns are kept as text")
+
+
+def test_unparsed_values_keep_their_text():
+    """Only values that parse cleanly are replaced; the rest keep the original text"""
+    columns = [{"name": "Total"}, {"name": "Date"}, {"name": "PO", "type": "number"}]
+    frame = pd.DataFrame({"Total": ["USD 99", "INV-2024 total 500", "n/a", None],
+                          "Date": ["2025-03-03", "next week", "", None],
+                          "PO": ["123", "12-3456789", "GB123", None]}, dtype=object)
+    rows = frame_rows(normalize_frame(frame, columns))
+    assert rows[0] == [99.0, datetime.date(2025, 3, 3), 123.0, "USD"]
+    assert rows[1] == ["INV-2024 total 500", "next week", "12-3456789", None]
+    assert rows[2] == ["n/a", None, "GB123", None]
+    assert rows[3] == [None, None, None, None]
+    print("✅ Values that do not parse cleanly keep their text")
+
+
+if __name__ == "__main__":
+    test_columns_match_value_parsers()
+    test_typed_workbook()
+    test_identifiers_are_not_coerced()
+    test_unparsed_values_keep_their_text()
+    print("\n🎉 All normalization tests passed!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the bounded output store used for generated Excel files
+"""
+import os
+import tempfile
+import time
+
+from output_store import OutputStore
+
+
+def write_bytes(data):
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return write
+
+
+def test_identical_content_is_deduplicated():
+    """Identical content keys share one file and skip the second write"""
+    with tempfile.TemporaryDirectory() as folder:
+        store = OutputStore(folder)
+        calls = []
+
+        def write(path):
+            calls.append(path)
+            write_bytes(b'workbook')(path)
+
+        first = store.put('{"Invoice Number": "INV-001"}', write)
+        second = store.put('{"Invoice Number": "INV-001"}', write)
+
+        assert first == second
+        assert len(calls) == 1
+        assert os.listdir(folder) == [first]
+        print(f"✅ Deduplicated to {first}")
+
+
+def test_sweep_enforces_ttl_and_size():
+    """Expired files go first, then the oldest until under max_bytes"""
+    with tempfile.TemporaryDirectory() as folder:
+        store = OutputStore(folder, max_bytes=30, ttl_seconds=3600)
+        names = [store.put(str(i), write_bytes(b'x' * 10)) for i in range(3)]
+
+        # Age the first file past the TTL and the second one slightly
+        now = time.time()
+        os.utime(os.path.join(folder, names[0]), (now - 7200, now - 7200))
+        os.utime(os.path.join(folder, names[1]), (now - 60, now - 60))
+        store.put('3', write_bytes(b'x' * 10))
+
+        remaining = os.listdir(folder)
+        assert names[0] not in remaining
+        assert names[1] in remaining
+
+        store.max_bytes = 20
+        store.sweep()
+        remaining = os.listdir(folder)
+        assert names[1] not in remaining
+        assert len(remaining) == 2
+        print(f"✅ Sweep kept {len(remaining)} files")
+
+
+def test_pinned_files_survive_sweeps():
+    """A pinned file is kept past its TTL and swept normally once unpinned"""
+    with tempfile.TemporaryDirectory() as folder:
+        store = OutputStore(folder, max_bytes=None, ttl_seconds=3600)
+        path = store.new_temp_path('invoice.pdf')
+        write_bytes(b'%PDF')(path)
+        store.pin(path)
+        old = time.time() - 7200
+        os.utime(path, (old, old))
+
+        assert store.sweep() == 0 and os.path.exists(path)
+        store.unpin(path)
+        assert store.sweep() == 1 and not os.path.exists(path)
+        print("✅ Pinned files survive sweeps")
+
+
+def test_path_for_rejects_traversal():
+    """Only plain filenames inside the store resolve"""
+    with tempfile.TemporaryDirectory() as folder:
+        store = OutputStore(folder)
+        name = store.put('data', write_bytes(b'data'))
+
+        assert store.path_for(name) == os.path.join(folder, name)
+        assert store.path_for('../app.py') is None
+        assert store.path_for('missing.xlsx') is None
+        print("✅ Path resolution is restricted to the store")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Output Store Tests\n")
+    test_identical_content_is_deduplicated()
+    test_sweep_enforces_ttl_and_size()
+    test_pinned_files_survive_sweeps()
+    test_path_for_rejects_traversal()
+    print("\n🎉 All output store tests passed!")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test the rendered page image cache
+"""
+import tempfile
+
+from page_cache import PageImageCache
+
+
+def test_keys_cover_render_settings():
+    """Different DPI or encoding settings never share an entry"""
+    base = PageImageCache.key("hash", 1, 300, 'PNG')
+    assert base == PageImageCache.key("hash", 1, 300, 'PNG')
+    assert base != PageImageCache.key("hash", 1, 200, 'PNG')
+    assert base != PageImageCache.key("hash", 2, 300, 'PNG')
+    assert base != PageImageCache.key("hash", 1, 300, 'JPEG', 'quality=85')
+    print("✅ Cache keys include page, DPI and encoding")
+
+
+def test_lru_eviction_by_total_bytes():
+    """The least recently used entry is evicted first, also after a restart"""
+    with tempfile.TemporaryDirectory() as folder:
+        cache = PageImageCache(folder, max_bytes=30)
+        cache.put('a', b'a' * 10)
+        cache.put('b', b'b' * 10)
+        cache.put('c', b'c' * 10)
+        assert cache.get('a') == b'a' * 10  # 'b' is now the oldest
+        cache.put('d', b'd' * 10)
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.stats()['bytes'] == 30
+
+        reopened = PageImageCache(folder, max_bytes=30)
+        assert reopened.stats()['entries'] == 3
+        print(f"✅ LRU eviction works: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Page Cache Tests\n")
+    test_keys_cover_render_settings()
+    test_lru_eviction_by_total_bytes()
+    print("\n🎉 All page cache tests passed!")
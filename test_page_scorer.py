@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test relevant-page pruning for long documents
+"""
+import io
+import os
+import sys
+
+import PyPDF2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from page_scorer import prune_pdf, score_page, select_pages
+
+INVOICE_PAGE = ("ACME Supplies Ltd\nInvoice No: INV-1001\nInvoice Date: 2025-03-01\nBill To: Globex\n"
+                "Description Qty Unit Price Amount\nWidgets 2 10.00 20.00\n")
+ITEMS_PAGE = "Description Qty Amount\n" + "".join(f"Item {i} 1 {i}.50 {i}.50\n" for i in range(1, 15))
+TOTALS_PAGE = "Subtotal 1,250.00\nVAT 20% 250.00\nTotal due 1,500.00\n"
+TERMS_PAGE = "Terms and conditions\n" + "Liability is limited as set out in the governing law clause.\n" * 20
+REMITTANCE_PAGE = "Remittance advice - please detach\nReturn this slip with your payment\n"
+
+
+def test_invoice_pages_outscore_boilerplate():
+    """Header, line-item and totals pages score above terms and remittance slips"""
+    assert score_page("") == 0.0
+    boilerplate = max(score_page(TERMS_PAGE), score_page(REMITTANCE_PAGE), score_page("Appendix A"))
+    assert min(score_page(INVOICE_PAGE), score_page(ITEMS_PAGE), score_page(TOTALS_PAGE)) > boilerplate
+
+    texts = [INVOICE_PAGE, TERMS_PAGE, ITEMS_PAGE, "Appendix A", TOTALS_PAGE, REMITTANCE_PAGE]
+    assert select_pages(texts, max_pages=3) == [0, 2, 4]
+    assert select_pages(texts, max_pages=0) == list(range(6))
+    assert select_pages(["", "", "", "", ""], max_pages=2) == [0, 1, 2, 3, 4]
+    print("✅ Invoice pages outscore terms, appendices and remittance slips")
+
+
+def test_scanned_pages_are_kept():
+    """Pages without a text layer are kept on top of the budget instead of being ranked last"""
+    texts = [INVOICE_PAGE, TERMS_PAGE, ITEMS_PAGE, "", "Page 5 of 6\n", REMITTANCE_PAGE]
+    assert select_pages(texts, max_pages=2) == [0, 2, 3, 4]
+    print("✅ Scanned pages in mixed documents are kept")
+
+
+def test_prune_pdf_reports_kept_and_dropped():
+    """The trimmed PDF holds only the kept pages and the report lists both"""
+    writer = PyPDF2.PdfWriter()
+    for width in range(100, 700, 100):
+        writer.add_blank_page(width=width, height=100)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    texts = [INVOICE_PAGE, TERMS_PAGE, ITEMS_PAGE, "Appendix A", TOTALS_PAGE, REMITTANCE_PAGE]
+
+    pdf_bytes, kept_text, report = prune_pdf(buffer.getvalue(), max_pages=3, texts=texts)
+    assert report == {"pages_total": 6, "pages_kept": [1, 3, 5], "pages_dropped": [2, 4, 6]}
+    pages = PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages
+    assert [float(page.mediabox.width) for page in pages] == [100, 300, 500]
+    assert "Total due" in kept_text and "Terms and conditions" not in kept_text
+
+    unchanged, _, report = prune_pdf(buffer.getvalue(), max_pages=10, texts=texts)
+    assert unchanged == buffer.getvalue() and report['pages_dropped'] == []
+    print("✅ Pruned PDFs keep the best pages and report what was dropped")
+
+
+if __name__ == "__main__":
+    test_invoice_pages_outscore_boilerplate()
+    test_scanned_pages_are_kept()
+    test_prune_pdf_reports_kept_and_dropped()
+    print("\n🎉 All page scorer tests passed!")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test PDF text extraction backends and their selection
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+import pdf_text
+from pdf_text import available_text_backends, choose_text_backend, extract_pages, extract_text, parse_layout
+
+# A two-column table: descriptions at x=50, amounts at x=400
+ROWS = [(700, "Description", "Amount"), (680, "Consulting services", "1,200.00"), (660, "Travel", "85.50")]
+
+
+def table_pdf(pages=2):
+    """Bytes of a PDF with the ROWS table on every page"""
+    content = "\n".join(f"BT /F1 10 Tf {x} {y} Td ({text}) Tj ET"
+                        for y, left, right in ROWS for x, text in ((50, left), (400, right))).encode('latin-1')
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % (5 + 2 * i) for i in range(pages)), pages),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for _ in range(pages):
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % (len(objects)))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def test_backends_agree_on_text():
+    """Every installed backend returns one text per page with the same words"""
+    pdf_bytes = table_pdf()
+    assert available_text_backends()[:1] == ['pdfium'] and 'pypdf2' in available_text_backends()
+    for backend in available_text_backends():
+        texts = extract_pages(pdf_bytes, backend=backend, layout=False)
+        assert len(texts) == 2, backend
+        assert texts[0].split() == "Description Amount Consulting services 1,200.00 Travel 85.50".split(), backend
+    assert extract_text(pdf_bytes, backend='pdfium').count("Travel") == 2
+    print("✅ Text backends agree page by page")
+
+
+def test_layout_keeps_columns_aligned():
+    """In layout mode each row is one line and the amounts start in the same column"""
+    lines = extract_pages(table_pdf(1), backend='pdfium', layout=True)[0].splitlines()
+    assert [line.split()[0] for line in lines] == ["Description", "Consulting", "Travel"]
+    columns = {line.index(amount) for line, amount in zip(lines, ["Amount", "1,200.00", "85.50"])}
+    assert len(columns) == 1 and columns.pop() > len("Consulting services")
+    print("✅ Layout mode keeps table columns aligned")
+
+
+def test_selection():
+    """Unknown backends are rejected and unavailable ones fall back to the best installed one"""
+    try:
+        choose_text_backend('ocr')
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+    original = pdf_text.is_available
+    pdf_text.is_available = lambda name: name == 'pypdf2'
+    try:
+        assert choose_text_backend() == 'pypdf2'
+        assert choose_text_backend('pdftotext') == 'pypdf2'
+    finally:
+        pdf_text.is_available = original
+    assert [parse_layout(v) for v in (None, '', 'false', '0', 'True', '1', True, False)] == \
+        [None, None, False, False, True, True, True, False]
+    print("✅ Text backend selection follows availability and preference")
+
+
+if __name__ == "__main__":
+    test_backends_agree_on_text()
+    test_layout_keeps_columns_aligned()
+    test_selection()
+    print("\n🎉 All text extraction tests passed!")
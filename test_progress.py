@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Test job progress events for the server-sent event stream
+"""
+import threading
+
+from progress import ProgressHub, format_sse
+
+
+def test_events_replay_and_end_with_job():
+    """Subscribers get every event after their last id and the stream ends after done"""
+    hub = ProgressHub()
+    job_id = hub.create(total=2)
+    hub.emit(job_id, "received", document=0)
+    hub.emit(job_id, "received", document=1)
+
+    def finish():
+        hub.emit(job_id, "result", document=0, excel_file="invoice_1.xlsx")
+        hub.document_done(job_id, True)
+        hub.emit(job_id, "error", document=1, error="Gemini API error")
+        hub.document_done(job_id, False)
+
+    threading.Timer(0.1, finish).start()
+    events = [event for event in hub.events(job_id, heartbeat=0.05) if event]
+    assert [e['event'] for e in events] == ["received", "received", "result", "error", "done"]
+    assert events[-1]['data']['completed'] == 1 and events[-1]['data']['failed'] == 1
+
+    # Reconnecting with Last-Event-ID only replays what was missed
+    replay = list(hub.events(job_id, after=events[2]['id']))
+    assert [e['event'] for e in replay] == ["error", "done"]
+
+    assert format_sse(events[0]).startswith(f"id: {events[0]['id']}\nevent: received\ndata: {{")
+    assert hub.snapshot(job_id)['finished']
+    assert hub.snapshot("missing") is None
+    print("✅ Progress events replay from the last id and end with the job")
+
+
+if __name__ == "__main__":
+    test_events_replay_and_end_with_job()
+    print("\n🎉 All progress tests passed!")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test rasterizer backends and their selection
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import PyPDF2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+import rasterizer
+from pdf_text import pages_pdfium
+from rasterizer import available_rasterizers, choose_rasterizer, render_page
+
+
+def blank_pdf(pages):
+    """PDF bytes with one blank page per (width, height, rotate)"""
+    writer = PyPDF2.PdfWriter()
+    for width, height, rotate in pages:
+        writer.add_blank_page(width=width, height=height)
+        if rotate:
+            writer.pages[-1].rotate(rotate)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_pdfium_renders_in_process():
+    """pdfium renders any page from bytes or a path at the requested DPI, honouring /Rotate"""
+    pdf_bytes = blank_pdf([(144, 72, 0), (144, 72, 90)])
+    image = render_page(pdf_bytes, 1, dpi=100, backend='pdfium')
+    assert (image.size, image.mode) == ((200, 100), 'RGB')
+    assert image.getpixel((10, 10)) == (255, 255, 255)
+    assert render_page(pdf_bytes, 2, dpi=100, backend='pdfium').size == (100, 200)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'page.pdf')
+        with open(path, 'wb') as f:
+            f.write(pdf_bytes)
+        assert render_page(path, 1, dpi=72, backend='pdfium').size == (144, 72)
+    print("✅ pdfium renders pages in-process at the requested resolution")
+
+
+def test_selection():
+    """The preferred installed backend is chosen; unknown names are rejected, missing ones skipped"""
+    assert available_rasterizers()[0] == 'pdfium'
+    assert choose_rasterizer() == 'pdfium'
+
+    original = rasterizer.is_available
+    rasterizer.is_available = lambda name: name == 'pdfium'
+    try:
+        assert choose_rasterizer('poppler') == 'pdfium'
+        rasterizer.is_available = lambda name: False
+        assert choose_rasterizer() is None
+        try:
+            render_page(b"%PDF-1.4")
+            assert False, "expected RuntimeError"
+        except RuntimeError:
+            pass
+    finally:
+        rasterizer.is_available = original
+
+    try:
+        choose_rasterizer('ghostscript')
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("✅ Rasterizer selection follows availability and preference")
+
+
+def test_concurrent_pdfium_calls_are_serialized():
+    """Threads rendering and reading text at once never enter pdfium together"""
+    pdf_bytes = blank_pdf([(144 + 36 * i, 72, 0) for i in range(4)])
+    expected = [render_page(pdf_bytes, page, dpi=50, backend='pdfium').size for page in range(1, 5)]
+
+    pdfium = rasterizer.pdfium
+    state = {"open": 0, "max_open": 0}
+    state_lock = threading.Lock()
+
+    class TrackedDocument(pdfium.PdfDocument):
+        def __init__(self, *args, **kwargs):
+            with state_lock:
+                state["open"] += 1
+                state["max_open"] = max(state["max_open"], state["open"])
+            super().__init__(*args, **kwargs)
+
+        def close(self):
+            super().close()
+            with state_lock:
+                state["open"] -= 1
+
+    def work(i):
+        if i % 2:
+            return pages_pdfium(pdf_bytes)
+        return render_page(pdf_bytes, i % 4 + 1, dpi=50, backend='pdfium').size
+
+    original = pdfium.PdfDocument
+    pdfium.PdfDocument = TrackedDocument
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(work, range(64)))
+    finally:
+        pdfium.PdfDocument = original
+
+    assert state["max_open"] == 1
+    for i, result in enumerate(results):
+        assert result == ([""] * 4 if i % 2 else expected[i % 4])
+    print("✅ Concurrent pdfium calls from threads are serialized")
+
+
+if __name__ == "__main__":
+    test_pdfium_renders_in_process()
+    test_selection()
+    test_concurrent_pdfium_calls_are_serialized()
+    print("\n🎉 All rasterizer tests passed!")
@@ -22,11 +22,13 @@ def test_imports():
         print(f"❌ Google Generative AI import failed: {e}")
         return False
     
-    try:
-        from pdf2image import convert_from_path
-        print(" pdf2image imported successfully")
-    except ImportError as e:
-        print(f"❌ pdf2image import failed: {e}")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vercel-app', 'api'))
+    from rasterizer import available_rasterizers
+    rasterizers = available_rasterizers()
+    if rasterizers:
+        print(f" PDF rasterizers available: {', '.join(rasterizers)}")
+    else:
+        print("❌ No PDF rasterizer: pip install pypdfium2, or install poppler-utils")
         return False
     
     try:
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test incremental field emission from streamed model responses
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from streaming import IncrementalJSONParser, generate_streaming
+
+RESPONSE = '''```json
+{
+  "Invoice Number": "INV-\\"7\\"",
+  "Total Amount": 1234.5,
+  "Paid": null,
+  "Line Items": [{"desc": "a, b}"}, {"desc": "c"}],
+  "Vendor": "ACME {Ltd}"
+}
+```'''
+
+
+def test_fields_complete_as_text_arrives():
+    """Fields are emitted once complete, however the text is chunked"""
+    for size in (1, 3, 7, len(RESPONSE)):
+        parser = IncrementalJSONParser()
+        emitted = []
+        for start in range(0, len(RESPONSE), size):
+            emitted.extend(parser.feed(RESPONSE[start:start + size]))
+        assert emitted == [
+            ("Invoice Number", 'INV-"7"'),
+            ("Total Amount", 1234.5),
+            ("Paid", None),
+            ("Line Items", [{"desc": "a, b}"}, {"desc": "c"}]),
+            ("Vendor", "ACME {Ltd}"),
+        ]
+        assert parser.done
+
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"Vendor": "AC') == []
+    assert parser.feed('ME", "Total') == [("Vendor", "ACME")]
+    print("✅ Fields complete incrementally across chunk boundaries")
+
+
+def test_generate_streaming_reports_first_field():
+    """The first field is reported before the stream ends, with timings recorded"""
+    seen = []
+
+    class Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    class FakeModel:
+        def generate_content(self, content, stream=False):
+            assert stream
+            yield Chunk('{"Vendor": "ACME",')
+            assert seen == [("Vendor", "ACME")]
+            yield Chunk(' "Total": 10}')
+
+    metrics = {}
+    text = generate_streaming(FakeModel(), ["prompt"], lambda name, value: seen.append((name, value)), metrics)
+    assert text == '{"Vendor": "ACME", "Total": 10}'
+    assert seen == [("Vendor", "ACME"), ("Total", 10)]
+    assert set(metrics) == {"time_to_first_token", "time_to_first_field", "total_seconds"}
+    print("✅ Streaming reports fields before the response completes")
+
+
+if __name__ == "__main__":
+    test_fields_complete_as_text_arrives()
+    test_generate_streaming_reports_first_field()
+    print("\n🎉 All streaming tests passed!")
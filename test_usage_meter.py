@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test token and cost accounting and hourly budgets
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'vercel-app', 'api'))
+
+from streaming import generate_streaming
+from usage_meter import BudgetExceeded, UsageMeter, estimate_cost, request_usage, sum_usage
+
+
+class Usage:
+    def __init__(self, prompt, candidates, cached=0):
+        self.prompt_token_count = prompt
+        self.candidates_token_count = candidates
+        self.cached_content_token_count = cached
+
+
+class Chunk:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeModel:
+    def generate_content(self, content, stream=False):
+        yield Chunk('{"Total": ', Usage(1000, 2))
+        yield Chunk('10}', Usage(1000, 8, cached=400))
+
+
+def test_usage_from_stream_and_cost():
+    """Token counts come from the last chunk, accumulate across calls and are priced"""
+    metrics = {}
+    generate_streaming(FakeModel(), ["prompt"], metrics=metrics)
+    generate_streaming(FakeModel(), ["retry"], metrics=metrics)
+    assert (metrics['input_tokens'], metrics['output_tokens'], metrics['cached_tokens']) == (2000, 16, 800)
+
+    usage = request_usage(metrics, 'gemini-2.0-flash-exp')
+    # 1200 uncached + 800 cached at a quarter of $0.10/M, 16 output at $0.40/M
+    assert usage['cost_usd'] == round((1200 + 200) * 0.10 / 1e6 + 16 * 0.40 / 1e6, 6)
+    assert estimate_cost('models/gemini-2.5-pro', 1_000_000, 0) == 1.25
+    assert request_usage({'total_seconds': 1.0}, 'gemini-2.0-flash') is None
+    assert sum_usage([usage, None, usage])['input_tokens'] == 4000
+    print("✅ Token usage is read from streamed responses and priced")
+
+
+def test_totals_and_hourly_budget():
+    """Totals are kept per key and batch; a key over its hourly budget is refused"""
+    with tempfile.TemporaryDirectory() as folder:
+        meter = UsageMeter(os.path.join(folder, 'usage.db'), hourly_budget_usd=0.05)
+        usage = {"model": "gemini-2.0-flash", "input_tokens": 100, "output_tokens": 10,
+                 "cached_tokens": 0, "cost_usd": 0.03}
+        meter.record("key-a", usage, batch_id="job-1")
+        meter.record("key-b", usage, batch_id="job-1")
+        meter.check_budget("key-a")
+
+        meter.record("key-a", usage, batch_id="job-2")
+        assert meter.totals(api_key="key-a")['requests'] == 2
+        assert meter.totals(batch_id="job-1") == {"requests": 2, "input_tokens": 200, "output_tokens": 20,
+                                                  "cached_tokens": 0, "cost_usd": 0.06}
+        assert [row['requests'] for row in meter.totals_by_key()] == [2, 1]
+        assert "key-a" not in str(meter.totals_by_key())
+
+        try:
+            meter.check_budget("key-a")
+            assert False, "key-a is over budget"
+        except BudgetExceeded as e:
+            assert e.spent == 0.06 and 3590 <= e.retry_after <= 3601
+        meter.check_budget("key-b")
+
+        # Queued work gives up after its timeout
+        started = time.monotonic()
+        try:
+            meter.wait_for_budget("key-a", timeout=0.05)
+            assert False
+        except BudgetExceeded:
+            assert time.monotonic() - started < 1
+        print("✅ Usage totals per key and batch, hourly budgets enforced")
+
+
+if __name__ == "__main__":
+    test_usage_from_stream_and_cost()
+    test_totals_and_hourly_budget()
+    print("\n🎉 All usage meter tests passed!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test the durable work queue: leases, heartbeats, acks, dead letters and workers
+"""
+import os
+import tempfile
+import time
+
+import ingest
+from test_ingest import make_pdfs
+from work_queue import QueueWorker, WorkQueue
+
+
+def test_lease_heartbeat_ack():
+    """A leased item is hidden from other workers until it is acked; stale tokens are refused"""
+    with tempfile.TemporaryDirectory() as folder:
+        make_pdfs(folder, 2)
+        queue = WorkQueue(os.path.join(folder, 'queue.db'), visibility=60)
+        first = queue.enqueue(os.path.join(folder, 'invoice_0.pdf'), ingest.DEFAULT_COLUMNS)
+        assert first is not None
+        # The same document and columns are only queued once
+        assert queue.enqueue(os.path.join(folder, 'invoice_0.pdf'), ingest.DEFAULT_COLUMNS) is None
+        second = queue.enqueue(os.path.join(folder, 'invoice_1.pdf'), ingest.DEFAULT_COLUMNS)
+
+        a = queue.lease('node-a')
+        b = queue.lease('node-b')
+        assert (a['id'], b['id']) == (first, second) and a['column_config'] == ingest.DEFAULT_COLUMNS
+        assert queue.lease('node-c') is None
+
+        assert queue.heartbeat(a['id'], a['lease_token'])
+        assert not queue.ack(a['id'], b['lease_token'])
+        assert queue.ack(a['id'], a['lease_token'], entry_id=7, result={"extracted_data": {"Vendor": "Acme"}})
+        assert not queue.heartbeat(a['id'], a['lease_token'])
+
+        done = queue.get(a['id'])
+        assert done['status'] == 'done' and done['entry_id'] == 7 and done['result']['extracted_data'] == {"Vendor": "Acme"}
+        stats = queue.stats()
+        assert (stats['done'], stats['leased'], stats['workers']) == (1, 1, {'node-b': 1})
+    print("✅ Leases hide items until they are acked")
+
+
+def test_expired_lease_is_picked_up_again():
+    """A crashed worker's lease expires, the item goes to another worker and dies after max_attempts"""
+    with tempfile.TemporaryDirectory() as folder:
+        make_pdfs(folder, 1)
+        queue = WorkQueue(os.path.join(folder, 'queue.db'), visibility=0.2, max_attempts=2)
+        item_id = queue.enqueue(os.path.join(folder, 'invoice_0.pdf'), ingest.DEFAULT_COLUMNS)
+
+        crashed = queue.lease('node-a')
+        assert queue.lease('node-b') is None
+        time.sleep(0.3)
+        assert queue.stats()['expired_leases'] == 1
+        retried = queue.lease('node-b')
+        assert retried['id'] == item_id and retried['attempts'] == 2
+        assert retried['last_error'] == "Lease expired (node-a)"
+        # The crashed worker can no longer ack or renew
+        assert not queue.ack(item_id, crashed['lease_token'])
+        assert not queue.heartbeat(item_id, crashed['lease_token'])
+
+        time.sleep(0.3)
+        assert queue.lease('node-c') is None
+        dead = queue.dead_letters()
+        assert [item['id'] for item in dead] == [item_id] and "attempt 2" in dead[0]['last_error']
+
+        assert queue.retry_dead() == 1
+        assert queue.lease('node-c')['attempts'] == 1
+    print("✅ Expired leases are picked up again, then dead-lettered")
+
+
+def test_fail_backs_off_then_dead_letters():
+    """Failed attempts are retried after a delay until the item runs out of attempts"""
+    with tempfile.TemporaryDirectory() as folder:
+        make_pdfs(folder, 1)
+        queue = WorkQueue(os.path.join(folder, 'queue.db'), max_attempts=2)
+        item_id = queue.enqueue(os.path.join(folder, 'invoice_0.pdf'), ingest.DEFAULT_COLUMNS)
+
+        item = queue.lease('node-a')
+        assert queue.fail(item_id, item['lease_token'], "quota", retry_delay=0.2) == 'queued'
+        assert queue.lease('node-a') is None
+        time.sleep(0.3)
+        item = queue.lease('node-a')
+        assert queue.fail(item_id, item['lease_token'], "quota", retry_delay=0.2) == 'dead'
+        assert queue.get(item_id)['last_error'] == "quota"
+    print("✅ Failures back off, then dead-letter")
+
+
+def test_worker_runs_pipeline():
+    """Workers process queued documents into the ledger; only files that open but cannot be processed are dead-lettered"""
+    calls = []
+
+    def fake_extract(prepared, api_key, column_config):
+        calls.append(prepared['path'])
+        return {"Invoice Number": "INV-001", "Total Amount": "$10.00"}
+
+    def fake_prepare(pdf_path, shared=False):
+        if pdf_path.endswith('invoice_3.pdf'):
+            raise ValueError("cannot parse")
+        return prepare_document(pdf_path, shared=shared)
+
+    prepare_document = ingest.prepare_document
+    original = ingest.extract_document
+    ingest.extract_document = fake_extract
+    ingest.prepare_document = fake_prepare
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            make_pdfs(folder, 4)
+            queue = WorkQueue(os.path.join(folder, 'queue.db'))
+            ids = [queue.enqueue(os.path.join(folder, f"invoice_{i}.pdf"), ingest.DEFAULT_COLUMNS) for i in range(4)]
+            # Removed from the share after it was queued (or not mounted on this node)
+            os.remove(os.path.join(folder, 'invoice_2.pdf'))
+
+            worker = QueueWorker(queue, 'key', db_path=os.path.join(folder, 'data', 'ledger.db'), worker_id='test')
+            while worker.run_one():
+                pass
+
+            assert len(calls) == 2 and (worker.processed, worker.failed) == (2, 2)
+            done = queue.get(ids[0])
+            assert done['status'] == 'done' and done['result']['extracted_data']['Invoice Number'] == "INV-001"
+            assert worker.ledger.summary()['entries'] == 2
+            # A missing file is retried later, possibly by a node that can reach it
+            missing = queue.get(ids[2])
+            assert missing['status'] == 'queued' and missing['attempts'] == 1 and "PDF processing error" in missing['last_error']
+            dead = queue.get(ids[3])
+            assert dead['status'] == 'dead' and "cannot parse" in dead['last_error']
+    finally:
+        ingest.extract_document = original
+        ingest.prepare_document = prepare_document
+    print("✅ Workers run queued documents through the pipeline")
+
+
+if __name__ == "__main__":
+    print("🧪 InvoicePilot - Work Queue Tests\n")
+    test_lease_heartbeat_ack()
+    test_expired_lease_is_picked_up_again()
+    test_fail_backs_off_then_dead_letters()
+    test_worker_runs_pipeline()
+    print("\n🎉 All work queue tests passed!")
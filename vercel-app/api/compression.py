@@ -0,0 +1,154 @@
+"""
+HTTP response compression and cache validation helpers
+Shared by the Flask app and the local Vercel mock server: gzip/brotli
+negotiation for JSON and text, and precompressed static assets with
+ETag / Last-Modified validators for 304 responses
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies are not worth the CPU or the extra header bytes
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+    'application/xml', 'image/svg+xml',
+)
+
+
+def available_encodings():
+    """Encodings this server can produce, most preferred first"""
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def is_compressible(content_type):
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the best supported encoding from an Accept-Encoding header, or None
+    Honours q-values, including q=0 to refuse an encoding
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, static=False):
+    """
+    Compress bytes with gzip or brotli; static assets are compressed once at
+    the highest level, dynamic responses at a fast level
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if static else 6, mtime=0)
+    return data
+
+
+class StaticAsset:
+    """A static file with its validators and precompressed variants"""
+
+    def __init__(self, data, mtime, content_type):
+        self.content_type = content_type
+        self.mtime = mtime
+        self.etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.variants = {None: data}
+        if is_compressible(content_type) and len(data) >= MIN_COMPRESS_BYTES:
+            for encoding in available_encodings():
+                compressed = compress(data, encoding, static=True)
+                if len(compressed) < len(data):
+                    self.variants[encoding] = compressed
+
+    def not_modified(self, if_none_match=None, if_modified_since=None):
+        """True when the client's cached copy is still current"""
+        if if_none_match:
+            # If-None-Match takes precedence over If-Modified-Since
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags or f"W/{self.etag}" in tags
+        if if_modified_since:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def body(self, accept_encoding):
+        """(bytes, content encoding or None) for the client's Accept-Encoding"""
+        encoding = choose_encoding(accept_encoding)
+        if encoding in self.variants:
+            return self.variants[encoding], encoding
+        return self.variants[None], None
+
+    def headers(self):
+        return {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Vary": "Accept-Encoding",
+            # Always revalidate; unchanged files cost a 304 with no body
+            "Cache-Control": "no-cache",
+        }
+
+
+class StaticAssetCache:
+    """Static assets keyed by path, rebuilt whenever the file's mtime changes"""
+
+    def __init__(self):
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, render=None, content_type=None):
+        """
+        Asset for a file on disk. render() may produce the bytes instead of
+        reading the file (e.g. a rendered template); it is re-run when the
+        file changes.
+        """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            asset = self._assets.get(path)
+        if asset is not None and asset.mtime == mtime:
+            return asset
+
+        if render is not None:
+            data = render()
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+        content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') and 'charset' not in content_type:
+            content_type += '; charset=utf-8'
+        asset = StaticAsset(data, mtime, content_type)
+        with self._lock:
+            self._assets[path] = asset
+        return asset
@@ -0,0 +1,28 @@
+"""
+SQLite connections for the ledger, search index, caches, usage meter and work queue
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+def create_database(db_path, schema, journal_mode='WAL'):
+    """Create the database's folder and apply its schema"""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    with connect(db_path) as conn:
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        conn.executescript(schema)
+
+
+@contextmanager
+def connect(db_path, isolation_level=''):
+    """Connection returning sqlite3.Row rows, committed when the block succeeds"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=isolation_level)
+    conn.row_factory = sqlite3.Row
+    # WAL keeps readers unblocked; NORMAL sync is durable across app crashes
+    conn.execute("PRAGMA synchronous=NORMAL")
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,174 @@
+"""
+Upload-once document references for model calls
+A PDF is uploaded to the provider's file storage the first time it is needed
+and the returned handle is reused, until it expires, for every later call on
+the same document (retries, fallbacks, re-extractions of new columns)
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+
+import google.generativeai as genai
+
+# Gemini keeps uploaded files for 48 hours
+DEFAULT_TTL_SECONDS = 48 * 3600
+# Stop handing out a reference this long before the provider deletes it
+EXPIRY_MARGIN_SECONDS = 10 * 60
+# Small documents are cheaper to inline than to upload separately
+DEFAULT_MIN_BYTES = 1024 * 1024
+
+
+class GeminiFileBackend:
+    """Gemini File API storage"""
+
+    def __init__(self, poll_interval=0.5, poll_timeout=30):
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+
+    def upload(self, api_key, pdf_bytes, doc_hash, mime_type='application/pdf'):
+        """Upload a document and return (handle, expires_at epoch seconds)"""
+        genai.configure(api_key=api_key)
+        uploaded = genai.upload_file(io.BytesIO(pdf_bytes), mime_type=mime_type,
+                                     display_name=doc_hash[:32])
+
+        # Large files are processed asynchronously before they can be referenced
+        deadline = time.monotonic() + self.poll_timeout
+        while getattr(uploaded.state, 'name', 'ACTIVE') == 'PROCESSING':
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Uploaded file {uploaded.name} is still processing")
+            time.sleep(self.poll_interval)
+            uploaded = genai.get_file(uploaded.name)
+        if getattr(uploaded.state, 'name', 'ACTIVE') == 'FAILED':
+            raise RuntimeError(f"Provider failed to process uploaded file {uploaded.name}")
+
+        expiration = getattr(uploaded, 'expiration_time', None)
+        if expiration is not None and hasattr(expiration, 'timestamp'):
+            expires_at = expiration.timestamp()
+        else:
+            expires_at = time.time() + DEFAULT_TTL_SECONDS
+        return uploaded, expires_at
+
+
+class StubFile:
+    """Stand-in for a provider file handle"""
+
+    def __init__(self, name, uri, mime_type, size_bytes):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.size_bytes = size_bytes
+
+    def __repr__(self):
+        return f"StubFile({self.name!r})"
+
+
+class LocalFileBackend:
+    """In-memory file storage for tests and offline runs"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.files = {}
+        self.uploads = 0
+
+    def upload(self, api_key, pdf_bytes, doc_hash, mime_type='application/pdf'):
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        handle = StubFile(name, f"local://{name}", mime_type, len(pdf_bytes))
+        self.files[name] = pdf_bytes
+        self.uploads += 1
+        return handle, time.time() + self.ttl_seconds
+
+
+def key_fingerprint(api_key):
+    """Uploaded files belong to the key's project, so handles are scoped per key"""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+class DocumentRefs:
+    """Cache of uploaded document handles keyed by API key and document hash"""
+
+    def __init__(self, backend=None, min_bytes=DEFAULT_MIN_BYTES, max_entries=1024):
+        self.backend = backend or GeminiFileBackend()
+        self.min_bytes = min_bytes
+        self.max_entries = max_entries
+        self.uploads = 0
+        self.reuses = 0
+        self._handles = {}  # (key fingerprint, doc hash) -> (handle, expires_at)
+        self._lock = threading.Lock()
+        self._uploading = {}  # (key fingerprint, doc hash) -> Lock, one upload per document
+
+    def get(self, api_key, pdf_bytes, doc_hash=None, mime_type='application/pdf'):
+        """
+        Return a provider handle for the document, uploading it only if there is
+        no unexpired handle yet. Returns None for documents below min_bytes.
+        """
+        if len(pdf_bytes) < self.min_bytes:
+            return None
+        doc_hash = doc_hash or hashlib.sha256(pdf_bytes).hexdigest()
+        cache_key = (key_fingerprint(api_key), doc_hash)
+
+        handle = self._cached(cache_key)
+        if handle is not None:
+            return handle
+
+        with self._lock:
+            upload_lock = self._uploading.setdefault(cache_key, threading.Lock())
+        with upload_lock:
+            # Another thread may have finished the upload while we waited
+            handle = self._cached(cache_key)
+            if handle is not None:
+                return handle
+            handle, expires_at = self.backend.upload(api_key, pdf_bytes, doc_hash, mime_type)
+            with self._lock:
+                self._handles[cache_key] = (handle, expires_at)
+                self.uploads += 1
+                self._uploading.pop(cache_key, None)
+                self._prune()
+            print(f"📤 Uploaded document {doc_hash[:12]} ({len(pdf_bytes)} bytes) as {handle.name}")
+            return handle
+
+    def _cached(self, cache_key):
+        with self._lock:
+            entry = self._handles.get(cache_key)
+            if entry is None:
+                return None
+            handle, expires_at = entry
+            if time.time() >= expires_at - EXPIRY_MARGIN_SECONDS:
+                del self._handles[cache_key]
+                return None
+            self.reuses += 1
+            return handle
+
+    def invalidate(self, api_key, doc_hash):
+        """Forget a handle the provider rejected (deleted or expired early)"""
+        with self._lock:
+            self._handles.pop((key_fingerprint(api_key), doc_hash), None)
+
+    def _prune(self):
+        now = time.time()
+        for cache_key, (_, expires_at) in list(self._handles.items()):
+            if now >= expires_at - EXPIRY_MARGIN_SECONDS:
+                del self._handles[cache_key]
+        # Oldest insertions first once the cache is full
+        while len(self._handles) > self.max_entries:
+            del self._handles[next(iter(self._handles))]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._handles), "uploads": self.uploads, "reuses": self.reuses}
+
+
+def default_backend():
+    """INVOICEPILOT_DOCUMENT_REFS=stub selects the local backend, off disables references"""
+    mode = os.environ.get('INVOICEPILOT_DOCUMENT_REFS', 'gemini').lower()
+    if mode == 'off':
+        return None
+    if mode == 'stub':
+        return LocalFileBackend()
+    return GeminiFileBackend()
+
+
+_backend = default_backend()
+document_refs = DocumentRefs(_backend) if _backend else None
@@ -0,0 +1,109 @@
+"""
+Split multi-invoice PDFs into one document per invoice
+Boundaries are detected from page text: "Page 1 of N" markers, a change of
+invoice number, and a repeat of the first page's header once the current
+invoice has shown its total
+"""
+import io
+import re
+
+import PyPDF2
+
+from pdf_text import extract_pages
+
+PAGE_MARKER = re.compile(r'\b(?:page|seite|page\s+no\.?|p\.)\s*(\d{1,3})\s*(?:of|/|von|sur|de)\s*(\d{1,3})\b', re.IGNORECASE)
+INVOICE_NUMBER = re.compile(
+    r'\b(?:invoice|inv|rechnung|facture|factura|bill)\s*'
+    r'(?:no\.?|number|num\.?|nr\.?|n°|#|id)?\s*[:#.]?\s*'
+    r'([A-Z0-9][A-Z0-9\-/_.]{2,24})',
+    re.IGNORECASE
+)
+TOTAL_LINE = re.compile(r'\b(?:grand\s+total|total\s+due|amount\s+due|balance\s+due|total)\b[^\n]*\d', re.IGNORECASE)
+# Words that can follow "invoice" and would otherwise be read as the number
+NOT_A_NUMBER = {'date', 'number', 'total', 'to', 'from', 'address', 'amount', 'details', 'no', 'nr'}
+HEADER_LINES = 3
+
+
+def _reader(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return PyPDF2.PdfReader(source)
+
+
+def page_texts(source, backend=None, layout=None):
+    """Text of every page with pdf_text's backends (a page that fails to extract is treated as empty)"""
+    return extract_pages(source, backend=backend, layout=layout)
+
+
+def page_marker(text):
+    """(page, of) from a 'Page 2 of 3' style marker, or None"""
+    for match in PAGE_MARKER.finditer(text):
+        page, total = int(match.group(1)), int(match.group(2))
+        if 1 <= page <= total:
+            return page, total
+    return None
+
+
+def invoice_number(text):
+    """First plausible invoice number on the page, normalized, or None"""
+    for match in INVOICE_NUMBER.finditer(text):
+        candidate = match.group(1).strip('.-/_')
+        if candidate.lower() in NOT_A_NUMBER or not any(ch.isdigit() for ch in candidate):
+            continue
+        return candidate.upper()
+    return None
+
+
+def header_signature(text):
+    """First lines of the page with digits removed, for comparing page headers"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()][:HEADER_LINES]
+    return tuple(re.sub(r'[\d\s]+', ' ', line).strip().lower() for line in lines)
+
+
+def detect_invoices(source=None, texts=None):
+    """
+    Group pages into invoices
+    Returns [{"pages": [page indexes], "invoice_number": str or None}, ...]
+    """
+    if texts is None:
+        texts = page_texts(source)
+    segments = []
+    current = None
+
+    for index, text in enumerate(texts):
+        marker = page_marker(text)
+        number = invoice_number(text)
+        header = header_signature(text)
+
+        if current is None:
+            boundary = True
+        elif marker:
+            # Explicit pagination decides on its own
+            boundary = marker[0] == 1
+        elif number and current['invoice_number'] and number != current['invoice_number']:
+            boundary = True
+        else:
+            # Same letterhead again after the current invoice already showed its total
+            boundary = bool(header) and header == current['header'] and current['has_total']
+
+        if boundary:
+            current = {"pages": [], "invoice_number": number, "header": header, "has_total": False}
+            segments.append(current)
+        elif number and not current['invoice_number']:
+            current['invoice_number'] = number
+        current['pages'].append(index)
+        current['has_total'] = current['has_total'] or bool(TOTAL_LINE.search(text))
+
+    return [{"pages": segment['pages'], "invoice_number": segment['invoice_number']} for segment in segments]
+
+
+def split_pdf(source, segments):
+    """Yield the bytes of one PDF per segment"""
+    reader = _reader(source)
+    for segment in segments:
+        writer = PyPDF2.PdfWriter()
+        for index in segment['pages']:
+            writer.add_page(reader.pages[index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        yield buffer.getvalue()
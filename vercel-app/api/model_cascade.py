@@ -0,0 +1,227 @@
+"""
+Model cascade: cheap model first, stronger model only where validation fails
+Each document is extracted with the fastest, cheapest model; local validators
+then check the result (parseable dates and numbers, line items and subtotals
+adding up to the total) and only the failing fields - or the whole document
+if the call failed - are asked again of the next model
+"""
+import os
+import re
+import threading
+from collections import Counter
+
+from usage_meter import request_usage
+from value_parsing import column_type, parse_amount, parse_date, parse_percentage
+
+# Fastest/cheapest first; INVOICEPILOT_MODEL_CASCADE="model-a,model-b" overrides,
+# a single model turns escalation off
+DEFAULT_CASCADE = ('gemini-2.0-flash-lite', 'gemini-2.5-pro')
+# Totals may differ from their parts by rounding
+SUM_TOLERANCE = 0.02
+
+LINE_AMOUNT_KEYS = ('line total', 'line_total', 'total', 'amount', 'net', 'value')
+QUANTITY_KEYS = ('quantity', 'qty', 'hours', 'units')
+UNIT_PRICE_KEYS = ('unit price', 'unit_price', 'price', 'rate')
+
+# Whole words of an amount column's name that give its role in total = subtotal + tax
+TAX_WORDS = {'tax', 'vat', 'gst', 'hst'}
+INCLUSIVE_WORDS = {'incl', 'including', 'inc', 'gross', 'with'}
+EXCLUSIVE_WORDS = {'excl', 'excluding', 'ex', 'before', 'pre', 'without'}
+
+
+def cascade_models():
+    configured = os.environ.get('INVOICEPILOT_MODEL_CASCADE')
+    if configured:
+        return tuple(name.strip() for name in configured.split(',') if name.strip())
+    return DEFAULT_CASCADE
+
+
+def _find(item, keys):
+    """First value in a line-item dict whose key matches one of keys"""
+    lowered = {str(key).lower(): value for key, value in item.items()}
+    for key in keys:
+        if key in lowered:
+            return lowered[key]
+    for key in keys:
+        for name, value in lowered.items():
+            if key in name:
+                return value
+    return None
+
+
+def line_amount(item):
+    """Amount of one line item: its own total, or quantity × unit price"""
+    if not isinstance(item, dict):
+        return parse_amount(item)[0]
+    amount = parse_amount(_find(item, LINE_AMOUNT_KEYS))[0]
+    if amount is not None:
+        return amount
+    quantity = parse_amount(_find(item, QUANTITY_KEYS))[0]
+    price = parse_amount(_find(item, UNIT_PRICE_KEYS))[0]
+    if quantity is not None and price is not None:
+        return quantity * price
+    return None
+
+
+def _close(a, b):
+    return abs(a - b) <= max(SUM_TOLERANCE, abs(b) * 0.001)
+
+
+def amount_role(name):
+    """
+    subtotal / tax / total for an amount column from the whole words of its
+    name, or None: "Total (incl. VAT)" is the total, "Total VAT" the tax,
+    "Total excl. VAT" and "Net Amount" the subtotal, "Internet Fee" none
+    """
+    words = set(re.findall(r'[a-z]+', name.lower()))
+    if 'subtotal' in words or {'sub', 'total'} <= words or 'net' in words:
+        return 'subtotal'
+    if 'total' in words and words & EXCLUSIVE_WORDS:
+        return 'subtotal'
+    if 'total' in words and (not words & TAX_WORDS or words & INCLUSIVE_WORDS):
+        return 'total'
+    if words & TAX_WORDS:
+        return 'tax'
+    return None
+
+
+def validate_fields(extracted_data, column_config):
+    """
+    Local checks on an extraction; returns {column name: reason} for failures
+    A null value is an answer ("not on the invoice"); a value that cannot be
+    read as its column's type is not
+    """
+    failures = {}
+    roles = {}
+    for col in column_config:
+        name = col['name']
+        if name not in extracted_data:
+            failures[name] = "missing from the response"
+            continue
+        value = extracted_data[name]
+        kind = column_type(col)
+        if isinstance(value, list):
+            roles.setdefault('items', name)
+            continue
+        if value is None or value == "":
+            continue
+
+        if kind == 'date' and parse_date(value) is None:
+            failures[name] = f"unparseable date {value!r}"
+        elif kind == 'number' and parse_amount(value)[0] is None:
+            failures[name] = f"not a number {value!r}"
+        elif kind == 'percent' and parse_percentage(value) is None:
+            failures[name] = f"not a percentage {value!r}"
+        elif kind == 'number' and amount_role(name):
+            roles.setdefault(amount_role(name), name)
+
+    total_name = roles.get('total')
+    if total_name and total_name not in failures:
+        total = parse_amount(extracted_data[total_name])[0]
+        items_name = roles.get('items')
+        if items_name:
+            amounts = [line_amount(item) for item in extracted_data[items_name]]
+            if amounts and None not in amounts:
+                lines = sum(amounts)
+                subtotal_name = roles.get('subtotal')
+                expected = parse_amount(extracted_data[subtotal_name])[0] if subtotal_name else None
+                # Line items add up to the subtotal when there is one, else to the total
+                if not (_close(lines, expected if expected is not None else total) or _close(lines, total)):
+                    reason = f"line items sum to {lines:.2f}, total is {total:.2f}"
+                    failures[items_name] = reason
+                    failures[total_name] = reason
+        if 'subtotal' in roles and 'tax' in roles:
+            subtotal = parse_amount(extracted_data[roles['subtotal']])[0]
+            tax = parse_amount(extracted_data[roles['tax']])[0]
+            if subtotal is not None and tax is not None and not _close(subtotal + tax, total):
+                reason = f"subtotal {subtotal:.2f} + tax {tax:.2f} != total {total:.2f}"
+                for role in ('subtotal', 'tax', 'total'):
+                    failures[roles[role]] = reason
+    return failures
+
+
+class CascadeStats:
+    """Thread-safe escalation counters (rates are per document and per field)"""
+
+    def __init__(self):
+        self.documents = 0
+        self.escalated_documents = 0
+        self.fields = 0
+        self.escalated_fields = 0
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, report, fields):
+        with self._lock:
+            self.documents += 1
+            self.fields += fields
+            if report['escalated_fields']:
+                self.escalated_documents += 1
+                self.escalated_fields += len(report['escalated_fields'])
+            self.calls.update(report['models'])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "documents": self.documents,
+                "escalated_documents": self.escalated_documents,
+                "document_escalation_rate": round(self.escalated_documents / self.documents, 4) if self.documents else 0.0,
+                "fields": self.fields,
+                "escalated_fields": self.escalated_fields,
+                "field_escalation_rate": round(self.escalated_fields / self.fields, 4) if self.fields else 0.0,
+                "calls_per_model": dict(self.calls),
+            }
+
+
+def run_cascade(extract, column_config, models=None, stats=None):
+    """
+    Extract with each model of the cascade in turn until the result validates
+    extract(model_name, columns, metrics) runs one call and returns the
+    extracted dict (or {"error": ...}); metrics receives its token counts
+    Returns (extracted data, report) where report lists the models called,
+    the escalated fields, validation failures left after the last model and
+    the usage of every call
+    """
+    models = models or cascade_models()
+    report = {"models": [], "escalated_fields": [], "failures": {}, "usage": []}
+    result = None
+    columns = column_config
+
+    for tier, model_name in enumerate(models):
+        metrics = {}
+        attempt = extract(model_name, columns, metrics)
+        report['models'].append(model_name)
+        usage = request_usage(metrics, model_name)
+        if usage:
+            report['usage'].append(usage)
+
+        if "error" in attempt:
+            if result is not None:
+                # Keep the cheaper answer rather than losing the document
+                break
+            result = attempt
+        elif result is None or "error" in result:
+            result = dict(attempt)
+        else:
+            # A field the stronger model left out keeps the cheaper model's answer
+            result.update({col['name']: attempt[col['name']] for col in columns if col['name'] in attempt})
+
+        if "error" in result:
+            columns = column_config
+        else:
+            report['failures'] = validate_fields(result, column_config)
+            if not report['failures']:
+                break
+            columns = [col for col in column_config if col['name'] in report['failures']]
+
+        if tier + 1 < len(models):
+            escalating = [col['name'] for col in columns]
+            print(f"⬆️ Escalating {len(escalating)} field(s) to {models[tier + 1]}: "
+                  f"{report['failures'] or result.get('error')}")
+            report['escalated_fields'] = sorted(set(report['escalated_fields']) | set(escalating))
+
+    (stats or cascade_stats).record(report, len(column_config))
+    return result, report
+
+
+cascade_stats = CascadeStats()
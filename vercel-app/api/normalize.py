@@ -0,0 +1,221 @@
+"""
+Vectorized normalization of extracted values
+Turns whole columns of free-form strings ("1.234,50 €", "Mar 3rd 2025",
+"USD 99", "7,5 %") into typed values with pandas column operations, so a
+batch of any size is cleaned in a few passes instead of value by value.
+Results match value_parsing's per-value parsers.
+"""
+import numpy as np
+import pandas as pd
+
+from value_parsing import (CURRENCY_SYMBOLS, DATE_FORMATS, DAY_FIRST_FORMATS, NUMBER_PATTERN as VALUE_NUMBER,
+                           THOUSANDS_COMMAS, column_type)
+
+try:
+    import pyarrow  # noqa: F401 - Arrow-backed strings run .str operations in C
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    STRING_DTYPE = 'string'
+
+CURRENCY_COLUMN = 'Currency'
+SYMBOL_PATTERN = '([' + ''.join(CURRENCY_SYMBOLS) + '])'
+NUMBER_PATTERN = f"({VALUE_NUMBER.pattern})"
+# All that may surround a cleanly parsed number once it, currency symbols and codes are removed
+CLEAN_RESIDUE = r'[\s()+\-.%]*'
+# Rows normalized and written at a time when streaming a workbook
+CHUNK_ROWS = 10000
+
+
+def _as_text(series):
+    """Strings for parsing; numbers and missing values are handled separately"""
+    return series.astype(STRING_DTYPE)
+
+
+def per_distinct(normalize, series):
+    """
+    Run a column normalizer over the distinct values only and spread the
+    results back; extracted batches repeat the same dates, rates and
+    formats heavily, so this cuts the work to a fraction of the rows
+    """
+    series = pd.Series(series, dtype=object)
+    try:
+        codes, uniques = pd.factorize(series)
+    except TypeError:
+        # Unhashable values (lists, dicts) - normalize every row
+        return normalize(series)
+    # Missing values map to a trailing None
+    codes = np.where(codes < 0, len(uniques), codes)
+    distinct = pd.Series(list(uniques) + [None], dtype=object)
+    result = normalize(distinct)
+    spread = lambda values: pd.Series(values.to_numpy()[codes], index=series.index, dtype=values.dtype)
+    if isinstance(result, tuple):
+        return tuple(spread(values) for values in result)
+    return spread(result)
+
+
+def normalize_amounts(series):
+    """
+    Amounts and currencies of a column of values
+    Returns (float Series with NaN where no number was found, currency Series)
+    """
+    series = pd.Series(series, dtype=object)
+    numeric = series.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+    text = _as_text(series.where(~numeric))
+
+    currency = text.str.extract(SYMBOL_PATTERN, expand=False).map(CURRENCY_SYMBOLS)
+    currency = currency.fillna(text.str.extract(r'\b([A-Z]{3})\b', expand=False)).astype(object)
+
+    raw = text.str.extract(NUMBER_PATTERN, expand=False).str.replace(r"[ ']", '', regex=True)
+    negative = raw.str.startswith('(') | raw.str.startswith('-')
+    raw = raw.str.strip('()-')
+
+    has_comma = raw.str.contains(',', regex=False)
+    has_dot = raw.str.contains('.', regex=False)
+    comma_last = raw.str.rfind(',') > raw.str.rfind('.')
+    # Whichever separator comes last is the decimal point; a lone comma is a
+    # thousands separator only in "1,234" / "1,234,567" / "1,00,000" form
+    cleaned = pd.Series(np.select(
+        [
+            (has_comma & has_dot & comma_last).fillna(False),
+            (has_comma & has_dot).fillna(False),
+            (has_comma & raw.str.fullmatch(THOUSANDS_COMMAS)).fillna(False),
+            has_comma.fillna(False),
+            (raw.str.count(r'\.') > 1).fillna(False),
+        ],
+        [
+            raw.str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+            raw.str.replace(',', '', regex=False),
+            raw.str.replace(',', '', regex=False),
+            raw.str.replace(',', '.', regex=False),
+            raw.str.replace('.', '', regex=False),
+        ],
+        default=raw,
+    ), index=series.index, dtype='string').str.rstrip('.')
+
+    amounts = pd.to_numeric(cleaned, errors='coerce').astype(float)
+    amounts = amounts.where(~negative.fillna(False), -amounts)
+    amounts = amounts.where(~numeric, pd.to_numeric(series.where(numeric), errors='coerce'))
+    return amounts, currency.where(currency.notna(), None)
+
+
+def parsed_cleanly(series):
+    """
+    True where a value is a single number with at most a sign, brackets,
+    percent sign and currency around it; "INV-2024 total 500" or "12-3456789"
+    yield a number but not one that can replace the text
+    """
+    series = pd.Series(series, dtype=object)
+    numeric = series.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+    # Python's regex engine: Arrow's has no lookbehind for NUMBER_PATTERN
+    text = _as_text(series.where(~numeric)).astype(object)
+    residue = (text.str.replace(VALUE_NUMBER.pattern, '', n=1, regex=True)
+               .str.replace(SYMBOL_PATTERN, '', regex=True)
+               .str.replace(r'\b(?:[A-Z]{3}|Rs|kr)\b', '', regex=True))
+    has_number = text.str.contains(VALUE_NUMBER.pattern, regex=True)
+    return (numeric | (has_number & residue.str.fullmatch(CLEAN_RESIDUE)).fillna(False)).astype(bool)
+
+
+def keep_unparsed(original, typed, clean):
+    """Typed values where the original parsed cleanly, the original value everywhere else"""
+    original = pd.Series(original, dtype=object)
+    blank = _as_text(original.map(lambda v: None if isinstance(v, bool) else v)).str.strip().fillna('').eq('')
+    keep = clean | blank
+    if keep.all():
+        return typed
+    if pd.api.types.is_datetime64_any_dtype(typed):
+        typed = typed.dt.date
+    return typed.astype(object).where(keep, original)
+
+
+def normalize_percentages(series):
+    """'7.5%' / '7,5 %' / 7.5 as float percentages"""
+    series = pd.Series(series, dtype=object)
+    is_text = series.map(lambda v: isinstance(v, str))
+    stripped = _as_text(series).str.replace('%', '', regex=False).astype(object)
+    return normalize_amounts(series.where(~is_text, stripped))[0]
+
+
+def normalize_dates(series, day_first=False):
+    """Dates in any of value_parsing's formats as datetime64 (NaT when unparseable)"""
+    series = pd.Series(series, dtype=object)
+    text = (_as_text(series)
+            .str.replace(r'(?i)(\d+)(st|nd|rd|th)\b', r'\1', regex=True)
+            .str.replace(',', ' ', regex=False)
+            .str.replace('Sept', 'Sep', regex=False)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .str.rstrip('.'))
+    formats = DATE_FORMATS
+    if day_first:
+        formats = DAY_FIRST_FORMATS + [fmt for fmt in DATE_FORMATS if fmt not in DAY_FIRST_FORMATS]
+
+    dates = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    # One vectorized pass per format over the rows still unparsed, then again
+    # without dots for abbreviations like "Mar. 3 2025"
+    for candidates in (text, text.str.replace('.', '', regex=False)):
+        for fmt in formats:
+            pending = dates.isna() & candidates.notna()
+            if not pending.any():
+                break
+            parsed = pd.to_datetime(candidates[pending], format=fmt, errors='coerce')
+            dates[pending] = parsed
+    # Values that were already dates
+    is_date = series.map(lambda v: hasattr(v, 'year') and hasattr(v, 'month'))
+    if is_date.any():
+        dates[is_date] = pd.to_datetime(series[is_date])
+    return dates.dt.normalize()
+
+
+def normalize_frame(frame, columns):
+    """
+    Typed copy of a DataFrame of extracted values
+    Date columns become datetime64, amount and percentage columns floats; the
+    currency of amount columns goes to a Currency column (first one found in
+    each row) unless the configuration already has one. Values that do not
+    parse cleanly keep their original text
+    """
+    frame = frame.copy()
+    currencies = []
+    for col in columns:
+        name = col['name']
+        if name not in frame:
+            continue
+        kind = column_type(col)
+        original = frame[name]
+        if kind == 'date':
+            dates = per_distinct(normalize_dates, original)
+            frame[name] = keep_unparsed(original, dates, dates.notna())
+        elif kind == 'percent':
+            clean = per_distinct(parsed_cleanly, original)
+            frame[name] = keep_unparsed(original, per_distinct(normalize_percentages, original), clean)
+        elif kind == 'number':
+            clean = per_distinct(parsed_cleanly, original)
+            amounts, currency = per_distinct(normalize_amounts, original)
+            frame[name] = keep_unparsed(original, amounts, clean)
+            currencies.append(currency.where(clean, None))
+
+    names = {col['name'] for col in columns}
+    if currencies and CURRENCY_COLUMN not in names:
+        combined = currencies[0]
+        for currency in currencies[1:]:
+            combined = combined.where(combined.notna(), currency)
+        frame[CURRENCY_COLUMN] = combined
+    return frame
+
+
+def output_columns(columns):
+    """Column names of normalize_frame's output, in order"""
+    names = [col['name'] for col in columns]
+    if CURRENCY_COLUMN not in names and any(column_type(col) == 'number' for col in columns):
+        names.append(CURRENCY_COLUMN)
+    return names
+
+
+def frame_rows(frame):
+    """Rows of a normalized frame as plain Python values for a workbook (dates as date, gaps as None)"""
+    frame = frame.copy()
+    for name in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[name]):
+            frame[name] = frame[name].dt.date
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.values.tolist()
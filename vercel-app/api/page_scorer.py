@@ -0,0 +1,100 @@
+"""
+Relevant-page pruning for long documents
+Each page is scored locally from keyword and numeric density (totals, invoice
+headers, line-item tables) and only the best pages are sent to the model,
+so terms, remittance slips and appendices stop costing tokens and latency
+"""
+import os
+import re
+
+from invoice_splitter import page_texts, split_pdf
+
+# Pages sent to the model per invoice; 0 sends every page
+MAX_PROMPT_PAGES = int(os.environ.get('INVOICEPILOT_MAX_PROMPT_PAGES', '4'))
+
+# (pattern, weight) - each pattern counts at most MAX_HITS times per page so a
+# long legal page repeating "total" cannot outscore the real invoice page
+SIGNALS = [
+    # Totals
+    (re.compile(r'\b(?:grand\s+total|total\s+due|amount\s+due|balance\s+due|sub-?total|total|summe|montant)\b', re.IGNORECASE), 3.0),
+    (re.compile(r'\b(?:vat|tax|gst|hst|mwst|tva|iva)\b', re.IGNORECASE), 1.5),
+    # Invoice header
+    (re.compile(r'\b(?:invoice|rechnung|facture|factura)\b', re.IGNORECASE), 2.0),
+    (re.compile(r'\b(?:invoice\s+date|due\s+date|bill\s+to|ship\s+to|sold\s+to|purchase\s+order|po\s+(?:no|number))\b', re.IGNORECASE), 2.0),
+    # Line-item table headers
+    (re.compile(r'\b(?:qty|quantity|unit\s+price|rate|description|item|hours|amount)\b', re.IGNORECASE), 1.0),
+]
+PENALTIES = [
+    (re.compile(r'\b(?:terms\s+(?:and|&)\s+conditions|general\s+terms|governing\s+law|liability|privacy|'
+                r'appendix|annex|remittance\s+advice|please\s+detach|return\s+this\s+(?:slip|portion))\b',
+                re.IGNORECASE), 2.0),
+]
+AMOUNT = re.compile(r'(?<![\d.,])\d{1,3}(?:[,.\s]?\d{3})*[.,]\d{2}(?!\d)')
+MAX_HITS = 3
+# A page number or stray marks is all the text layer of a scanned page has
+PAGE_NUMBER = re.compile(r'\b(?:page|seite|p\.)\s*\d+(?:\s*(?:of|/|von)\s*\d+)?', re.IGNORECASE)
+WORD = re.compile(r'[^\W\d_]{3,}')
+
+
+def score_page(text):
+    """Relevance of one page's text (0 for an empty page)"""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+
+    score = 0.0
+    for pattern, weight in SIGNALS:
+        score += min(len(pattern.findall(text)), MAX_HITS) * weight
+    for pattern, weight in PENALTIES:
+        score -= min(len(pattern.findall(text)), MAX_HITS) * weight
+
+    # Line items and totals are lines with money amounts on them
+    amount_lines = sum(1 for line in lines if AMOUNT.search(line))
+    score += 10.0 * amount_lines / len(lines) + 0.25 * min(amount_lines, 20)
+    return round(score, 2)
+
+
+def is_scanned(text):
+    """True for a page with no real text layer (an image), which cannot be scored"""
+    return WORD.search(PAGE_NUMBER.sub(' ', text)) is None
+
+
+def select_pages(texts, max_pages=MAX_PROMPT_PAGES):
+    """
+    Indexes of the pages to keep, in document order
+    The first page (letterhead, invoice number) and the best-scoring text
+    pages fill the budget. Scanned pages cannot be scored and may hold the
+    totals or continued line items, so they are kept on top of it. Documents
+    that fit the budget are kept whole
+    """
+    if max_pages <= 0 or len(texts) <= max_pages:
+        return list(range(len(texts)))
+
+    scanned = [index for index in range(1, len(texts)) if is_scanned(texts[index])]
+    scores = [score_page(text) for text in texts]
+    ranked = sorted((index for index in range(1, len(texts)) if index not in scanned),
+                    key=lambda index: (-scores[index], index))
+    return sorted([0] + scanned + ranked[:max_pages - 1])
+
+
+def prune_pdf(pdf_bytes, max_pages=MAX_PROMPT_PAGES, texts=None):
+    """
+    Trim a PDF to its most relevant pages
+    Returns (pdf bytes, text of the kept pages, report) where report has
+    pages_total and the 1-based pages_kept / pages_dropped
+    """
+    if texts is None:
+        texts = page_texts(pdf_bytes)
+    kept = select_pages(texts, max_pages)
+    report = {
+        "pages_total": len(texts),
+        "pages_kept": [index + 1 for index in kept],
+        "pages_dropped": [index + 1 for index in range(len(texts)) if index not in kept],
+    }
+    kept_text = "".join(texts[index] + "\n" for index in kept)
+    if not report['pages_dropped']:
+        return pdf_bytes, kept_text, report
+
+    trimmed = next(split_pdf(pdf_bytes, [{"pages": kept}]))
+    print(f"✂️ Sending {len(kept)} of {len(texts)} pages (dropped {report['pages_dropped']})")
+    return trimmed, kept_text, report
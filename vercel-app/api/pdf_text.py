@@ -0,0 +1,181 @@
+"""
+PDF text extraction backends
+pdfium (pypdfium2) and poppler's pdftotext are native and much faster than
+PyPDF2 on large or complex documents; PyPDF2 stays as the pure-Python
+fallback. With layout=True, pdfium and pdftotext keep each text run at its
+horizontal position, so table columns stay aligned instead of being run
+together. The first available backend in PREFERENCE is used unless
+INVOICEPILOT_TEXT_BACKEND (or the caller) names another one;
+INVOICEPILOT_TEXT_LAYOUT=1 turns layout mode on by default.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+import PyPDF2
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+from rasterizer import PDFIUM_LOCK
+
+PREFERENCE = ('pdfium', 'pdftotext', 'pypdf2')
+POPPLER_PATH = os.environ.get('POPPLER_PATH') or None
+PDFTOTEXT_TIMEOUT = 60
+
+
+def parse_layout(value):
+    """A text_layout request field (bool, or a string such as "1" / "false"); None when unset"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def layout_from_env():
+    return bool(parse_layout(os.environ.get('INVOICEPILOT_TEXT_LAYOUT')))
+
+
+def _pdfium_layout(textpage):
+    """Lines of a page rebuilt from pdfium's text runs, each placed at its column"""
+    runs = []
+    for index in range(textpage.count_rects()):
+        left, bottom, right, top = textpage.get_rect(index)
+        text = textpage.get_text_bounded(left, bottom, right, top).strip()
+        if text:
+            runs.append((left, bottom, right, top, text))
+    if not runs:
+        return ""
+
+    # Column width of one character, from the runs themselves
+    widths = sorted((right - left) / len(text) for left, _, right, _, text in runs)
+    char_width = max(widths[len(widths) // 2], 1.0)
+    margin = min(run[0] for run in runs)
+
+    # Runs whose vertical centres fall within one run's height form a line
+    lines = []
+    for run in sorted(runs, key=lambda run: (-(run[1] + run[3]), run[0])):
+        centre = (run[1] + run[3]) / 2
+        if lines and abs(lines[-1][0] - centre) <= (run[3] - run[1]) / 2:
+            lines[-1][1].append(run)
+        else:
+            lines.append([centre, [run]])
+
+    out = []
+    for _, line in lines:
+        text = ""
+        for left, _, _, _, run_text in sorted(line):
+            column = int(round((left - margin) / char_width))
+            text += " " * max(column - len(text), 1 if text else 0) + run_text
+        out.append(text.rstrip())
+    return "\n".join(out)
+
+
+def pages_pdfium(source, layout=False):
+    if isinstance(source, (bytes, bytearray)):
+        source = bytes(source)
+    texts = []
+    with PDFIUM_LOCK:
+        document = pdfium.PdfDocument(source)
+        try:
+            for index in range(len(document)):
+                page = document[index]
+                try:
+                    textpage = page.get_textpage()
+                    try:
+                        if layout:
+                            texts.append(_pdfium_layout(textpage))
+                        else:
+                            texts.append(textpage.get_text_range().replace('\r\n', '\n').replace('\r', '\n'))
+                    finally:
+                        textpage.close()
+                except Exception:
+                    texts.append("")
+                finally:
+                    page.close()
+        finally:
+            document.close()
+    return texts
+
+
+def pages_pdftotext(source, layout=False):
+    """pdftotext writes every page to stdout, separated by form feeds"""
+    temp_path = None
+    if isinstance(source, (bytes, bytearray)):
+        fd, temp_path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(source)
+        source = temp_path
+    try:
+        command = [shutil.which('pdftotext', path=POPPLER_PATH), '-enc', 'UTF-8', '-q']
+        if layout:
+            command.append('-layout')
+        completed = subprocess.run(command + [source, '-'], capture_output=True, timeout=PDFTOTEXT_TIMEOUT, check=True)
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+    pages = completed.stdout.decode('utf-8', errors='replace').split('\f')
+    # The output ends with a form feed after the last page
+    return pages[:-1] if pages and not pages[-1].strip() else pages
+
+
+def pages_pypdf2(source, layout=False):
+    """PyPDF2 3.0 has no layout mode; layout is ignored"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    texts = []
+    for page in PyPDF2.PdfReader(source).pages:
+        try:
+            texts.append(page.extract_text() or "")
+        except Exception:
+            texts.append("")
+    return texts
+
+
+TEXT_BACKENDS = {
+    'pdfium': pages_pdfium,
+    'pdftotext': pages_pdftotext,
+    'pypdf2': pages_pypdf2,
+}
+
+
+def is_available(name):
+    if name == 'pdfium':
+        return pdfium is not None
+    if name == 'pdftotext':
+        return shutil.which('pdftotext', path=POPPLER_PATH) is not None
+    return name == 'pypdf2'
+
+
+def available_text_backends():
+    """Installed backends, in order of preference"""
+    return [name for name in PREFERENCE if is_available(name)]
+
+
+def choose_text_backend(name=None):
+    """Backend to extract with: name, else $INVOICEPILOT_TEXT_BACKEND, else the first available one"""
+    requested = name or os.environ.get('INVOICEPILOT_TEXT_BACKEND')
+    if requested:
+        if requested not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend: {requested} (choose from {', '.join(TEXT_BACKENDS)})")
+        if is_available(requested):
+            return requested
+        print(f"⚠️ Text backend {requested} is not available, choosing automatically")
+    return available_text_backends()[0]
+
+
+def extract_pages(source, backend=None, layout=None):
+    """Text of every page of a PDF (path or bytes); pages that fail to extract are empty"""
+    if layout is None:
+        layout = layout_from_env()
+    return TEXT_BACKENDS[choose_text_backend(backend)](source, layout=layout)
+
+
+def extract_text(source, backend=None, layout=None):
+    """Text of the whole PDF, one newline after each page"""
+    return "".join(text + "\n" for text in extract_pages(source, backend=backend, layout=layout))
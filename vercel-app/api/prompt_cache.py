@@ -0,0 +1,183 @@
+"""
+Shared prompt-prefix context caching
+The extraction instructions and compiled column section are identical for
+every document processed with the same column configuration, so they are
+registered once as cached context with the provider and each document's call
+only sends the document itself
+"""
+import datetime
+import hashlib
+import os
+import threading
+import time
+
+import google.generativeai as genai
+
+from document_refs import key_fingerprint
+
+DEFAULT_TTL_SECONDS = 3600
+# Refresh a cached context this long before it expires
+REFRESH_MARGIN_SECONDS = 60
+# Providers refuse to cache short contexts; the minimum depends on the model
+DEFAULT_MIN_TOKENS = 4096
+MODEL_MIN_TOKENS = {
+    'gemini-2.5-flash': 1024,
+    'gemini-2.5-flash-lite': 1024,
+    'gemini-2.5-pro': 2048,
+}
+# After the provider refuses caching for a model, retry no sooner than this
+UNSUPPORTED_RETRY_SECONDS = 3600
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4
+
+
+def prefix_hash(prefix):
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:16]
+
+
+class GeminiContextBackend:
+    """Gemini CachedContent storage"""
+
+    def create(self, api_key, model_name, prefix, ttl_seconds):
+        """Register the prefix and return (handle, expires_at epoch seconds)"""
+        genai.configure(api_key=api_key)
+        cached = genai.caching.CachedContent.create(
+            model=model_name,
+            display_name=f"invoicepilot-{prefix_hash(prefix)}",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+        expire_time = getattr(cached, 'expire_time', None)
+        if expire_time is not None and hasattr(expire_time, 'timestamp'):
+            return cached, expire_time.timestamp()
+        return cached, time.time() + ttl_seconds
+
+    def model(self, handle):
+        return genai.GenerativeModel.from_cached_content(handle)
+
+
+class StubContext:
+    """Stand-in for a provider cached-content handle"""
+
+    def __init__(self, name, model_name, prefix):
+        self.name = name
+        self.model_name = model_name
+        self.prefix = prefix
+
+
+class PrefixedModel:
+    """Model wrapper that prepends a locally cached prefix to every call"""
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = prefix
+
+    def generate_content(self, contents, **kwargs):
+        return self.model.generate_content([self.prefix] + list(contents), **kwargs)
+
+
+class LocalContextBackend:
+    """In-memory cached contexts for tests and offline runs"""
+
+    def __init__(self):
+        self.created = 0
+
+    def create(self, api_key, model_name, prefix, ttl_seconds):
+        self.created += 1
+        handle = StubContext(f"cachedContents/local-{self.created}", model_name, prefix)
+        return handle, time.time() + ttl_seconds
+
+    def model(self, handle):
+        return PrefixedModel(genai.GenerativeModel(handle.model_name), handle.prefix)
+
+
+class PromptCache:
+    """Cached prompt prefixes keyed by API key, model and prefix hash"""
+
+    def __init__(self, backend=None, ttl_seconds=DEFAULT_TTL_SECONDS, min_tokens=None):
+        self.backend = backend or GeminiContextBackend()
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens  # None: the model's own minimum
+        self.created = 0
+        self.hits = 0
+        self.skipped = 0
+        self._contexts = {}  # (key fingerprint, model, prefix hash) -> (handle, expires_at)
+        self._unsupported = {}  # (key fingerprint, model) -> retry after (epoch seconds)
+        self._lock = threading.Lock()
+
+    def model_for(self, api_key, model_name, prefix):
+        """
+        A model whose calls already include the prefix, or None when the prefix
+        is too short to cache or the provider does not support caching for the
+        model - the caller then sends the prompt inline as before
+        """
+        if estimate_tokens(prefix) < self.min_tokens_for(model_name):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        fingerprint = key_fingerprint(api_key)
+        cache_key = (fingerprint, model_name, prefix_hash(prefix))
+        with self._lock:
+            if self._unsupported.get((fingerprint, model_name), 0) > time.time():
+                self.skipped += 1
+                return None
+            entry = self._contexts.get(cache_key)
+            if entry and time.time() < entry[1] - REFRESH_MARGIN_SECONDS:
+                self.hits += 1
+                return self.backend.model(entry[0])
+
+        try:
+            handle, expires_at = self.backend.create(api_key, model_name, prefix, self.ttl_seconds)
+        except Exception as e:
+            print(f"⚠️ Prompt caching unavailable for {model_name}: {e}")
+            with self._lock:
+                self._unsupported[(fingerprint, model_name)] = time.time() + UNSUPPORTED_RETRY_SECONDS
+                self.skipped += 1
+            return None
+
+        with self._lock:
+            self._contexts[cache_key] = (handle, expires_at)
+            self.created += 1
+            # Drop expired contexts; the provider deletes them on its own
+            now = time.time()
+            for key, (_, expiry) in list(self._contexts.items()):
+                if expiry <= now:
+                    del self._contexts[key]
+        print(f"🗂️ Cached prompt prefix {cache_key[2]} for {model_name} (~{estimate_tokens(prefix)} tokens)")
+        return self.backend.model(handle)
+
+    def min_tokens_for(self, model_name):
+        if self.min_tokens is not None:
+            return self.min_tokens
+        return MODEL_MIN_TOKENS.get(model_name, DEFAULT_MIN_TOKENS)
+
+    def invalidate(self, api_key, model_name, prefix):
+        """Forget a cached context the provider rejected"""
+        with self._lock:
+            self._contexts.pop((key_fingerprint(api_key), model_name, prefix_hash(prefix)), None)
+
+    def stats(self):
+        with self._lock:
+            return {"contexts": len(self._contexts), "created": self.created,
+                    "hits": self.hits, "skipped": self.skipped}
+
+
+def default_prompt_cache():
+    """
+    INVOICEPILOT_PROMPT_CACHE=stub selects the local backend, off disables caching
+    INVOICEPILOT_PROMPT_CACHE_MIN_TOKENS overrides the per-model minimum prefix size
+    """
+    mode = os.environ.get('INVOICEPILOT_PROMPT_CACHE', 'gemini').lower()
+    if mode == 'off':
+        return None
+    min_tokens = os.environ.get('INVOICEPILOT_PROMPT_CACHE_MIN_TOKENS')
+    min_tokens = int(min_tokens) if min_tokens else None
+    backend = LocalContextBackend() if mode == 'stub' else GeminiContextBackend()
+    return PromptCache(backend, min_tokens=min_tokens)
+
+
+prompt_cache = default_prompt_cache()
@@ -0,0 +1,118 @@
+"""
+PDF page rasterizers
+pdfium (pypdfium2) renders in-process straight from the PDF bytes; poppler
+(pdf2image) runs a pdftoppm subprocess per call and reads the image back
+through temp files. The first available backend in PREFERENCE is used unless
+INVOICEPILOT_RASTERIZER names another one.
+"""
+import io
+import os
+import shutil
+import threading
+
+import PyPDF2
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    from pdf2image import convert_from_bytes, convert_from_path
+except ImportError:
+    convert_from_bytes = None
+    convert_from_path = None
+
+PREFERENCE = ('pdfium', 'poppler')
+# Optional folder holding pdftoppm when it is not on PATH
+POPPLER_PATH = os.environ.get('POPPLER_PATH') or None
+# pdfium is not thread-safe: every call into it in this process (rendering
+# here, text extraction in pdf_text) holds this lock. Worker processes each
+# have their own copy, so the CPU pool still renders in parallel
+PDFIUM_LOCK = threading.Lock()
+
+
+def page_size(source, page_number=1):
+    """Width and height of a page (1-based) in PDF points (1/72 inch), honouring /Rotate"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    page = PyPDF2.PdfReader(source).pages[page_number - 1]
+    width, height = float(page.mediabox.width), float(page.mediabox.height)
+    if (page.get('/Rotate') or 0) % 180:
+        width, height = height, width
+    return width, height
+
+
+def render_pdfium(source, page_number=1, dpi=200):
+    """Render one page (1-based) of a PDF path or bytes as an RGB PIL image"""
+    with PDFIUM_LOCK:
+        document = pdfium.PdfDocument(source)
+        try:
+            page = document[page_number - 1]
+            try:
+                # /Rotate is applied by pdfium; RGB order so PIL does not swap channels
+                bitmap = page.render(scale=dpi / 72, rev_byteorder=True)
+                try:
+                    # to_pil copies 3-byte RGB, so the image outlives the bitmap
+                    return bitmap.to_pil()
+                finally:
+                    bitmap.close()
+            finally:
+                page.close()
+        finally:
+            document.close()
+
+
+def render_poppler(source, page_number=1, dpi=200):
+    """Render one page (1-based) of a PDF path or bytes with pdftoppm"""
+    convert = convert_from_bytes if isinstance(source, (bytes, bytearray)) else convert_from_path
+    images = convert(source, dpi=dpi, first_page=page_number, last_page=page_number, poppler_path=POPPLER_PATH)
+    return images[0] if images else None
+
+
+RASTERIZERS = {
+    'pdfium': render_pdfium,
+    'poppler': render_poppler,
+}
+
+
+def is_available(name):
+    if name == 'pdfium':
+        return pdfium is not None
+    if name == 'poppler':
+        if convert_from_path is None:
+            return False
+        return shutil.which('pdftoppm', path=POPPLER_PATH) is not None
+    return False
+
+
+def available_rasterizers():
+    """Installed backends, in order of preference"""
+    return [name for name in PREFERENCE if is_available(name)]
+
+
+def choose_rasterizer(name=None):
+    """
+    Backend to render with: name, else $INVOICEPILOT_RASTERIZER, else the
+    first available one; None when no backend is installed
+    """
+    requested = name or os.environ.get('INVOICEPILOT_RASTERIZER')
+    if requested:
+        if requested not in RASTERIZERS:
+            raise ValueError(f"Unknown rasterizer: {requested} (choose from {', '.join(RASTERIZERS)})")
+        if is_available(requested):
+            return requested
+        print(f"⚠️ Rasterizer {requested} is not available, choosing automatically")
+    available = available_rasterizers()
+    return available[0] if available else None
+
+
+def render_page(source, page_number=1, dpi=200, backend=None):
+    """
+    Render one page of a PDF (path or bytes) as a PIL image with the chosen backend
+    Raises RuntimeError when no backend is installed
+    """
+    backend = backend or choose_rasterizer()
+    if backend is None:
+        raise RuntimeError("No PDF rasterizer available: pip install pypdfium2, or install poppler-utils")
+    return RASTERIZERS[backend](source, page_number=page_number, dpi=dpi)
@@ -0,0 +1,153 @@
+"""
+Streaming model responses with incremental field emission
+Gemini's response is consumed as a stream and fed through an incremental JSON
+parser, so each top-level key/value pair is reported as soon as its value is
+complete instead of after the whole response has arrived
+"""
+import json
+import time
+
+
+class IncrementalJSONParser:
+    """
+    Finds completed top-level fields of the first JSON object in streamed text
+    Text before the opening brace (e.g. a ```json fence) is ignored
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = 'key'
+        self._key = None
+        self._token_start = None
+
+    def feed(self, text):
+        """Add streamed text; returns the (key, value) pairs completed by it"""
+        self.buffer += text
+        completed = []
+        while self._pos < len(self.buffer) and not self.done:
+            i = self._pos
+            c = self.buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if c == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == 'key_string':
+                        self._key = self._decode(self.buffer[self._token_start:i + 1])
+                        self._expect = 'colon'
+                    elif self._depth == 1 and self._expect == 'value_string':
+                        completed.append(self._emit(self.buffer[self._token_start:i + 1]))
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect in ('key', 'value'):
+                    self._token_start = i
+                    self._expect = 'key_string' if self._expect == 'key' else 'value_string'
+                continue
+
+            if self._depth > 1:
+                if c in '{[':
+                    self._depth += 1
+                elif c in '}]':
+                    self._depth -= 1
+                    if self._depth == 1:
+                        completed.append(self._emit(self.buffer[self._token_start:i + 1]))
+                continue
+
+            # Top level of the object
+            if c == ':' and self._expect == 'colon':
+                self._expect = 'value'
+            elif c in '{[' and self._expect == 'value':
+                self._token_start = i
+                self._depth += 1
+            elif c in ',}':
+                if self._expect == 'value_scalar':
+                    completed.append(self._emit(self.buffer[self._token_start:i]))
+                if c == '}':
+                    self._depth = 0
+                    self.done = True
+                else:
+                    self._expect = 'key'
+            elif self._expect == 'value' and not c.isspace():
+                # Number, true/false/null - complete at the next , or }
+                self._token_start = i
+                self._expect = 'value_scalar'
+        return completed
+
+    @staticmethod
+    def _decode(raw):
+        raw = raw.strip()
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # Malformed values are passed on as text; the final parse decides
+            return raw.strip('"')
+
+    def _emit(self, raw):
+        value = self._decode(raw)
+        self.fields[self._key] = value
+        self._expect = 'after_value'
+        return self._key, value
+
+
+def generate_streaming(model, content, on_field=None, metrics=None):
+    """
+    Run generate_content with stream=True and return the full response text
+    on_field(name, value) is called for each top-level JSON field as soon as
+    it is complete; metrics (a dict) receives time_to_first_token,
+    time_to_first_field and total_seconds, and adds the call's input_tokens,
+    output_tokens and cached_tokens to any already there (retries included)
+    """
+    started = time.monotonic()
+    parser = IncrementalJSONParser()
+    parts = []
+    usage = None
+    for chunk in model.generate_content(content, stream=True):
+        # Counts are cumulative; the last chunk carrying them has the totals
+        usage = getattr(chunk, 'usage_metadata', None) or usage
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks carrying only a finish reason or safety ratings have no text
+            continue
+        if not text:
+            continue
+        if not parts and metrics is not None:
+            metrics['time_to_first_token'] = round(time.monotonic() - started, 3)
+        parts.append(text)
+        for name, value in parser.feed(text):
+            if metrics is not None and 'time_to_first_field' not in metrics:
+                metrics['time_to_first_field'] = round(time.monotonic() - started, 3)
+            if on_field:
+                on_field(name, value)
+    if metrics is not None:
+        metrics['total_seconds'] = round(time.monotonic() - started, 3)
+        if usage is not None:
+            add_usage(metrics, usage)
+    return "".join(parts)
+
+
+def add_usage(metrics, usage):
+    """Add a response's usage_metadata token counts to metrics"""
+    for name, field in (('input_tokens', 'prompt_token_count'),
+                        ('output_tokens', 'candidates_token_count'),
+                        ('cached_tokens', 'cached_content_token_count')):
+        metrics[name] = metrics.get(name, 0) + (getattr(usage, field, 0) or 0)
@@ -33,6 +33,8 @@ class handler(BaseHTTPRequestHandler):
                 self.send_response(status_code)
                 self.send_header('Content-type', 'application/json')
                 self.send_header('Access-Control-Allow-Origin', '*')
+                if 'retry_after' in result:
+                    self.send_header('Retry-After', str(result['retry_after']))
                 self.end_headers()
                 
             self.wfile.write(json.dumps(result).encode())
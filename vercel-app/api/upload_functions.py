@@ -10,23 +10,16 @@ import os
 from datetime import datetime
 import google.generativeai as genai
 import pandas as pd
-import PyPDF2
 from PIL import Image
 
+from pdf_text import extract_text
+
 def extract_text_from_pdf(pdf_bytes):
-    """Extract text from PDF using PyPDF2"""
-    text = ""
+    """Extract text from PDF with the best available backend (pdfium, pdftotext or PyPDF2)"""
     try:
-        pdf_file = io.BytesIO(pdf_bytes)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-            
+        return extract_text(pdf_bytes)
     except Exception as e:
         raise Exception(f"PDF text extraction failed: {e}")
-    
-    return text
 
 def extract_invoice_data_with_gemini(api_key, pdf_text, column_config):
     """Extract invoice data using Gemini AI"""
@@ -4,95 +4,156 @@ This works perfectly on Vercel with no system dependencies
 """
 import json
 import base64
+import hashlib
 import io
+import uuid
 from datetime import datetime
 import google.generativeai as genai
 import pandas as pd
-import PyPDF2
 
-def extract_text_from_pdf(pdf_bytes):
-    """Extract text from PDF using PyPDF2 (for fallback)"""
-    text = ""
+from document_refs import document_refs
+from prompt_cache import prompt_cache
+from streaming import generate_streaming
+from invoice_splitter import detect_invoices, page_texts, split_pdf
+from pdf_text import choose_text_backend, extract_text, parse_layout
+from page_scorer import prune_pdf
+from usage_meter import BudgetExceeded, sum_usage, usage_meter
+from model_cascade import run_cascade
+from normalize import frame_rows, normalize_frame
+from concurrent.futures import ThreadPoolExecutor
+
+MODEL_NAME = 'gemini-2.0-flash-exp'
+# Invoices from one multi-invoice PDF extracted at the same time
+MAX_PARALLEL_INVOICES = 4
+
+# Identical for every document extracted with the same columns; together with
+# the column schema it is the prompt prefix registered as cached context
+EXTRACTION_INSTRUCTIONS = """You are an expert at extracting data from invoices. Analyze the attached invoice (a PDF, or an image of its first page) and extract the fields described in the column schema below.
+
+Reading the document:
+- Read every part of the document, including headers, footers, tables, stamps, handwritten notes and small print.
+- When a field appears more than once (for example a total repeated on every page), use the value that applies to the invoice as a whole, normally the last or most prominent one.
+- Prefer values printed on the invoice over values you would have to calculate. Only calculate a value when the column description asks for it.
+- Do not guess. If a field is not on the document, or cannot be read with confidence, use null.
+
+Formatting values:
+- Dates: write them as YYYY-MM-DD. When day and month are ambiguous (03/04/2025), use the document's language, currency and addresses to decide the order.
+- Amounts: copy the number with the currency symbol or ISO code shown on the document (for example "€1.234,50" or "USD 99.00"). Show credits and refunds with a leading minus sign.
+- Percentages: write them with a percent sign (for example "7.5%").
+- Identifiers such as invoice and order numbers, tax or VAT registration numbers, IBANs and account numbers: copy them exactly as printed, with letters, dashes, spaces and leading zeros. Never turn them into numbers.
+- Names and addresses: copy them as printed, on one line, with commas between address lines.
+- Line items: when a column asks for line items, return a list with one object per line, using the keys "description", "quantity", "unit price" and "line total" where the document shows them.
+
+Consistency:
+- The total normally equals the subtotal plus tax, minus discounts, and line totals add up to the subtotal. When they do not, report the values as printed rather than correcting them.
+- Amounts are in the invoice's currency unless the document says otherwise.
+
+Return a single JSON object whose keys are exactly the column names of the schema, in the same order, and nothing else. Example format:
+{"column_name_1": "extracted_value_1", "column_name_2": null}
+"""
+
+
+def extraction_prefix(column_config):
+    """Instructions plus the column schema: the part of the prompt shared by every document"""
+    schema = [{key: col[key] for key in ('name', 'description', 'type') if col.get(key)} for col in column_config]
+    return f"{EXTRACTION_INSTRUCTIONS}\nColumn schema:\n{json.dumps(schema, indent=2, ensure_ascii=False)}\n"
+
+def extract_text_from_pdf(pdf_bytes, backend=None, layout=None):
+    """Extract text from PDF (for fallback) with the chosen or best available backend"""
     try:
-        pdf_file = io.BytesIO(pdf_bytes)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-            
+        return extract_text(pdf_bytes, backend=backend, layout=layout)
     except Exception as e:
         raise Exception(f"PDF text extraction failed: {e}")
-    
-    return text
 
-def extract_invoice_data_with_gemini_native_pdf(api_key, pdf_base64, pdf_text_fallback, column_config):
+def document_part(api_key, pdf_base64, doc_hash=None, mime_type="application/pdf"):
+    """
+    Content part for the document (a PDF, or a page image with its mime_type):
+    an uploaded file reference when document references are enabled (uploaded
+    once per document and reused), otherwise the inline base64 data.
+    Returns (part, doc_hash or None if inlined)
+    """
+    inline = {"mime_type": mime_type, "data": pdf_base64}
+    if document_refs is None:
+        return inline, None
+    try:
+        pdf_bytes = base64.b64decode(pdf_base64)
+        doc_hash = doc_hash or hashlib.sha256(pdf_bytes).hexdigest()
+        handle = document_refs.get(api_key, pdf_bytes, doc_hash, mime_type=mime_type)
+    except Exception as e:
+        print(f"⚠️ Document upload failed, sending inline: {e}")
+        return inline, None
+    if handle is None:
+        return inline, None
+    return handle, doc_hash
+
+def generate_with_prefix(model, api_key, model_name, prefix, part, ref_hash, inline, on_field=None, metrics=None):
+    """
+    Stream the response to prefix + document part
+    The prefix goes through the prompt cache when it is long enough. A rejected
+    call with a document reference drops the reference and resends the
+    document inline; the cached prefix is only invalidated when the call still
+    fails with the document inline
+    """
+    cached_model = prompt_cache.model_for(api_key, model_name, prefix) if prompt_cache else None
+    if cached_model is not None:
+        try:
+            return generate_streaming(cached_model, [part], on_field, metrics)
+        except Exception as cache_error:
+            if ref_hash is not None:
+                print(f"⚠️ Document reference rejected: {cache_error}")
+                document_refs.invalidate(api_key, ref_hash)
+                part, ref_hash = inline, None
+                try:
+                    return generate_streaming(cached_model, [part], on_field, metrics)
+                except Exception as inline_error:
+                    cache_error = inline_error
+            print(f"⚠️ Cached prompt rejected, sending it inline: {cache_error}")
+            prompt_cache.invalidate(api_key, model_name, prefix)
+
+    try:
+        return generate_streaming(model, [prefix, part], on_field, metrics)
+    except Exception as ref_error:
+        if ref_hash is None:
+            raise
+        # The provider may have dropped the file early - resend inline once
+        print(f"⚠️ Document reference rejected: {ref_error}")
+        document_refs.invalidate(api_key, ref_hash)
+        return generate_streaming(model, [prefix, inline], on_field, metrics)
+
+def extract_invoice_data_with_gemini_native_pdf(api_key, pdf_base64, pdf_text_fallback, column_config, doc_hash=None,
+                                                on_field=None, metrics=None, model_name=MODEL_NAME):
     """
     Extract invoice data using Gemini with NATIVE PDF support
     Sends PDF directly to Gemini - no image conversion needed!
+    doc_hash (SHA-256 of the PDF bytes) keys the uploaded document reference
+    The response is streamed: on_field(name, value) fires as each field completes
+    and metrics (a dict) receives the streaming timings
     """
     try:
         # Configure Gemini
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        # Prepare column descriptions for the prompt
-        column_descriptions = []
-        for col in column_config:
-            column_descriptions.append(f"- {col['name']}: {col['description']}")
-        
-        column_descriptions_text = "\n".join(column_descriptions)
-        
-        # Create the prompt for PDF analysis
-        prompt = f"""
-        You are an expert at extracting data from invoices. Please analyze the provided PDF invoice and extract the following information:
-
-        {column_descriptions_text}
-
-        Please return the data in JSON format with the exact column names provided above. If any information is not found, use null for that field.
-
-        Example format:
-        {{
-            "column_name_1": "extracted_value_1",
-            "column_name_2": "extracted_value_2"
-        }}
-
-        Please analyze the PDF document thoroughly, including any visual elements, tables, and formatting that might contain relevant information.
+        model = genai.GenerativeModel(model_name)
         
-        Extract the data now:
-        """
-        
-        # Prepare the content for Gemini with native PDF support
-        content = [prompt]
+        # Instructions and column schema, identical for every document with these columns
+        prefix = extraction_prefix(column_config)
         
         # Try to send PDF directly to Gemini
         try:
-            content.append({
-                "mime_type": "application/pdf",
-                "data": pdf_base64
-            })
+            part, ref_hash = document_part(api_key, pdf_base64, doc_hash)
             
             print("✅ Using native PDF processing mode")
             
-            # Generate response with PDF
-            response = model.generate_content(content)
+            inline = {"mime_type": "application/pdf", "data": pdf_base64}
+            response_text = generate_with_prefix(model, api_key, model_name, prefix, part, ref_hash, inline,
+                                                 on_field, metrics)
             
         except Exception as pdf_error:
             print(f"⚠️ Native PDF processing failed: {pdf_error}")
             print("🔄 Falling back to text-only mode...")
             
             # Fallback to text-only processing
-            text_prompt = f"""
-            You are an expert at extracting data from invoices. Please analyze the provided invoice text and extract the following information:
-
-            {column_descriptions_text}
-
-            Please return the data in JSON format with the exact column names provided above. If any information is not found, use null for that field.
-
-            Example format:
-            {{
-                "column_name_1": "extracted_value_1",
-                "column_name_2": "extracted_value_2"
-            }}
+            text_prompt = f"""{prefix}
+            The document could not be attached; its extracted text follows.
 
             Invoice text:
             {pdf_text_fallback}
@@ -100,12 +161,11 @@ def extract_invoice_data_with_gemini_native_pdf(api_key, pdf_base64, pdf_text_fa
             Extract the data now:
             """
             
-            response = model.generate_content([text_prompt])
+            response_text = generate_streaming(model, [text_prompt], on_field, metrics)
         
         # Parse the JSON response
         try:
             # Extract JSON from the response text
-            response_text = response.text
             print(f"📋 Gemini response length: {len(response_text)} chars")
             
             # Find JSON in the response
@@ -126,10 +186,77 @@ def extract_invoice_data_with_gemini_native_pdf(api_key, pdf_base64, pdf_text_fa
     except Exception as e:
         return {"error": f"Gemini API error: {e}"}
 
-def create_excel_file(extracted_data):
-    """Create Excel file and return as base64"""
+def split_invoice_pdf(pdf_bytes, text_options=None):
+    """
+    One (pdf_bytes, segment) per invoice found in the PDF, where segment has
+    the page indexes and invoice number; a PDF that holds a single invoice
+    (or cannot be analysed) is returned unchanged with segment None
+    """
+    try:
+        segments = detect_invoices(texts=page_texts(pdf_bytes, **(text_options or {})))
+    except Exception as e:
+        print(f"⚠️ Invoice boundary detection failed: {e}")
+        return [(pdf_bytes, None)]
+    if len(segments) < 2:
+        return [(pdf_bytes, None)]
+    print(f"✂️ Found {len(segments)} invoices in the PDF")
+    return list(zip(split_pdf(pdf_bytes, segments), segments))
+
+def extract_single_invoice(api_key, pdf_bytes, column_config, text_options=None):
+    """
+    Text fallback plus native PDF extraction for one invoice, sending only
+    its most relevant pages, through the model cascade
+    text_options (backend, layout) are passed to the text extraction
+    Returns (extracted data, page pruning report, cascade report)
+    """
+    pdf_text_fallback = ""
+    pruning = None
     try:
-        df = pd.DataFrame([extracted_data])
+        texts = page_texts(pdf_bytes, **(text_options or {}))
+        pdf_bytes, pdf_text_fallback, pruning = prune_pdf(pdf_bytes, texts=texts)
+        print(f"📝 Extracted text length: {len(pdf_text_fallback)} chars")
+    except Exception as e:
+        print(f"⚠️ Text extraction failed: {e}")
+    
+    pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
+    def extract(model_name, columns, metrics):
+        try:
+            return extract_invoice_data_with_gemini_native_pdf(api_key, pdf_base64, pdf_text_fallback, columns,
+                                                               metrics=metrics, model_name=model_name)
+        except Exception as e:
+            return {"error": f"AI extraction error: {e}"}
+    
+    result, cascade = run_cascade(extract, column_config)
+    return result, pruning, cascade
+
+def cascade_summary(cascade):
+    """Models called and fields escalated for the response (usage is reported separately)"""
+    return {key: cascade[key] for key in ("models", "escalated_fields", "failures")}
+
+def merge_pruning(reports, segments):
+    """Combine per-invoice pruning reports, numbering pages as in the original PDF"""
+    merged = {"pages_total": 0, "pages_kept": [], "pages_dropped": []}
+    for report, segment in zip(reports, segments):
+        if report is None:
+            continue
+        original = segment['pages'] if segment else list(range(report['pages_total']))
+        merged['pages_total'] += report['pages_total']
+        merged['pages_kept'] += [original[page - 1] + 1 for page in report['pages_kept']]
+        merged['pages_dropped'] += [original[page - 1] + 1 for page in report['pages_dropped']]
+    return merged
+
+def create_excel_file(extracted_data, column_config=None):
+    """
+    Create Excel file (one row per invoice) and return as base64
+    With the column configuration, dates, amounts and percentages are written
+    as typed cells and currencies get their own column
+    """
+    try:
+        rows = extracted_data if isinstance(extracted_data, list) else [extracted_data]
+        df = pd.DataFrame(rows)
+        if column_config:
+            df = normalize_frame(df.astype(object), column_config)
+            df = pd.DataFrame(frame_rows(df), columns=df.columns)
         
         # Create Excel file in memory
         excel_buffer = io.BytesIO()
@@ -158,6 +285,8 @@ def process_invoice_request(request_data):
         api_key = data.get('api_key')
         column_config = data.get('column_config', [])
         file_data = data.get('file_data')
+        # Optional per-request text extraction backend and layout mode
+        text_options = {"backend": data.get('text_backend') or None, "layout": parse_layout(data.get('text_layout'))}
         
         print("🚀 Starting native PDF processing...")
         
@@ -170,6 +299,11 @@ def process_invoice_request(request_data):
         
         if not file_data:
             return {"error": "No file data provided", "status": 400}
+        
+        try:
+            text_backend = choose_text_backend(text_options['backend'])
+        except ValueError as e:
+            return {"error": str(e), "status": 400}
 
         # Extract base64 PDF data
         try:
@@ -185,40 +319,63 @@ def process_invoice_request(request_data):
         except Exception as e:
             return {"error": f"Invalid PDF data: {e}", "status": 400}
 
-        # Extract text as fallback (in case native PDF fails)
-        pdf_text_fallback = ""
+        # Over its hourly spend ceiling the key is refused until spend ages out
         try:
-            pdf_text_fallback = extract_text_from_pdf(pdf_bytes)
-            print(f"📝 Extracted text length: {len(pdf_text_fallback)} chars")
-        except Exception as e:
-            print(f"⚠️ Text extraction failed: {e}")
+            usage_meter.check_budget(api_key)
+        except BudgetExceeded as e:
+            return {"error": str(e), "retry_after": e.retry_after, "status": 429}
 
-        # Process with Gemini using native PDF support
-        try:
-            extracted_data = extract_invoice_data_with_gemini_native_pdf(
-                api_key, pdf_base64, pdf_text_fallback, column_config
-            )
-            
-            if "error" in extracted_data:
-                return {"error": extracted_data["error"], "status": 500}
-                
-        except Exception as e:
-            return {"error": f"AI extraction error: {e}", "status": 500}
+        # A PDF may bundle several invoices - each is extracted as its own
+        # document, in parallel (text fallback included)
+        invoices = split_invoice_pdf(pdf_bytes, text_options)
+        if len(invoices) == 1:
+            outcomes = [extract_single_invoice(api_key, pdf_bytes, column_config, text_options)]
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_PARALLEL_INVOICES) as pool:
+                outcomes = list(pool.map(
+                    lambda invoice: extract_single_invoice(api_key, invoice[0], column_config, text_options), invoices
+                ))
+        results = [result for result, _, _ in outcomes]
+        page_pruning = merge_pruning([pruning for _, pruning, _ in outcomes], [segment for _, segment in invoices])
+        cascades = [cascade for _, _, cascade in outcomes]
+        usages = [sum_usage(cascade['usage']) for cascade in cascades]
+        # The invoices of one request are totalled as a batch
+        batch_id = uuid.uuid4().hex
+        for cascade in cascades:
+            for usage in cascade['usage']:
+                usage_meter.record(api_key, usage, batch_id=batch_id)
+        
+        extracted_rows = [result for result in results if "error" not in result]
+        if not extracted_rows:
+            return {"error": results[0]["error"], "status": 500}
 
         # Create Excel file
         try:
-            excel_data = create_excel_file(extracted_data)
+            excel_data = create_excel_file(extracted_rows, column_config)
             excel_filename = f"invoice_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             
             response = {
                 "success": True,
                 "message": "Invoice data extracted successfully (native PDF processing)",
-                "extracted_data": extracted_data,
+                "extracted_data": extracted_rows[0],
                 "excel_file": excel_filename,
                 "excel_data": excel_data,
                 "processing_mode": "native_pdf",
+                "page_pruning": page_pruning,
+                "text_backend": text_backend,
+                "usage": sum_usage(usages),
+                "cascade": cascade_summary(cascades[0]),
                 "status": 200
             }
+            if len(invoices) > 1:
+                response["message"] = f"Extracted {len(extracted_rows)} of {len(invoices)} invoices (native PDF processing)"
+                del response["cascade"]
+                response["invoices"] = [
+                    {"invoice_number": segment['invoice_number'], "pages": [page + 1 for page in segment['pages']],
+                     "extracted_data": result if "error" not in result else None, "error": result.get("error"),
+                     "usage": usage, "cascade": cascade_summary(cascade)}
+                    for (_, segment), result, usage, cascade in zip(invoices, results, usages, cascades)
+                ]
             
             print("✅ Processing completed successfully!")
             return response
@@ -10,41 +10,33 @@ import os
 from datetime import datetime
 import google.generativeai as genai
 import pandas as pd
-import PyPDF2
 from PIL import Image
 
+from pdf_text import extract_text
+from rasterizer import choose_rasterizer, render_page
+
 def extract_text_from_pdf(pdf_bytes):
-    """Extract text from PDF using PyPDF2"""
-    text = ""
+    """Extract text from PDF with the best available backend (pdfium, pdftotext or PyPDF2)"""
     try:
-        pdf_file = io.BytesIO(pdf_bytes)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-            
+        return extract_text(pdf_bytes)
     except Exception as e:
         raise Exception(f"PDF text extraction failed: {e}")
-    
-    return text
 
 def try_pdf_to_image(pdf_bytes):
     """
     Attempt to convert PDF to image (Vercel-optimized)
     Returns None if not possible (graceful fallback for serverless)
     """
-    # For Vercel deployment, disable image processing due to poppler dependency
-    # This will always return None, falling back to text-only mode
-    return None
-    
-    # Commented out for Vercel compatibility:
-    # try:
-    #     from pdf2image import convert_from_bytes
-    #     images = convert_from_bytes(pdf_bytes, dpi=200, first_page=1, last_page=1)
-    #     if images:
-    #         return images[0]
-    # except (ImportError, Exception):
-    #     return None
+    # poppler is not available on Vercel; pdfium renders in-process when
+    # pypdfium2 is installed, otherwise fall back to text-only mode
+    backend = choose_rasterizer()
+    if backend is None:
+        return None
+    try:
+        return render_page(pdf_bytes, 1, dpi=200, backend=backend)
+    except Exception as e:
+        print(f"⚠️ PDF to image conversion failed: {e}")
+        return None
 
 def encode_image_to_base64(image):
     """Convert PIL Image to base64 string"""
@@ -0,0 +1,223 @@
+"""
+Token and cost accounting for model calls
+Every extraction records its input/output token counts and estimated cost
+per API key (fingerprinted, never stored in clear) and batch, so spend can
+be totalled and an hourly budget per key enforced
+"""
+import os
+import tempfile
+import threading
+import time
+
+from db import connect, create_database
+from document_refs import key_fingerprint
+
+# Estimated USD per million (input, output) tokens; cached input is billed at
+# CACHED_INPUT_RATE of the input price. Override with
+# INVOICEPILOT_PRICE_PER_MILLION="input,output" for negotiated or new prices
+PRICES_PER_MILLION = {
+    'gemini-2.5-pro': (1.25, 10.00),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.0-flash-lite': (0.075, 0.30),
+    'gemini-2.0-flash': (0.10, 0.40),
+    'gemini-1.5-pro': (1.25, 5.00),
+    'gemini-1.5-flash': (0.075, 0.30),
+}
+DEFAULT_PRICE = (0.10, 0.40)
+CACHED_INPUT_RATE = 0.25
+BUDGET_WINDOW_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    key_fingerprint TEXT NOT NULL,
+    batch_id TEXT,
+    model TEXT,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_key_time ON usage_events (key_fingerprint, created_at);
+CREATE INDEX IF NOT EXISTS idx_usage_batch ON usage_events (batch_id);
+"""
+
+
+class BudgetExceeded(Exception):
+    """The key's spend over the last hour reached its ceiling"""
+
+    def __init__(self, spent, budget, retry_after):
+        super().__init__(f"Hourly budget of ${budget:g} reached (${spent:.4f} spent in the last hour)")
+        self.spent = spent
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+def model_price(model_name):
+    """(input, output) USD per million tokens for a model name"""
+    override = os.environ.get('INVOICEPILOT_PRICE_PER_MILLION')
+    if override:
+        input_price, output_price = (float(part) for part in override.split(','))
+        return input_price, output_price
+    name = (model_name or '').split('/')[-1]
+    # Longest matching family first, so 2.0-flash-exp prices as 2.0-flash
+    for family in sorted(PRICES_PER_MILLION, key=len, reverse=True):
+        if name.startswith(family):
+            return PRICES_PER_MILLION[family]
+    return DEFAULT_PRICE
+
+
+def estimate_cost(model_name, input_tokens, output_tokens, cached_tokens=0):
+    """Estimated USD cost of one call"""
+    input_price, output_price = model_price(model_name)
+    billed_input = (input_tokens - cached_tokens) + cached_tokens * CACHED_INPUT_RATE
+    return round((billed_input * input_price + output_tokens * output_price) / 1_000_000, 6)
+
+
+def request_usage(metrics, model_name):
+    """Usage summary from a call's streaming metrics, or None if none was reported"""
+    if not metrics or 'input_tokens' not in metrics:
+        return None
+    input_tokens = metrics.get('input_tokens', 0)
+    output_tokens = metrics.get('output_tokens', 0)
+    cached_tokens = metrics.get('cached_tokens', 0)
+    return {
+        "model": model_name,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": cached_tokens,
+        "cost_usd": estimate_cost(model_name, input_tokens, output_tokens, cached_tokens),
+    }
+
+
+def sum_usage(usages):
+    """Combine several request usages (None entries are skipped)"""
+    usages = [usage for usage in usages if usage]
+    if not usages:
+        return None
+    return {
+        "model": "+".join(dict.fromkeys(usage['model'] for usage in usages)),
+        "input_tokens": sum(usage['input_tokens'] for usage in usages),
+        "output_tokens": sum(usage['output_tokens'] for usage in usages),
+        "cached_tokens": sum(usage['cached_tokens'] for usage in usages),
+        "cost_usd": round(sum(usage['cost_usd'] for usage in usages), 6),
+    }
+
+
+class UsageMeter:
+    """SQLite-backed log of model usage with per-key and per-batch totals"""
+
+    def __init__(self, db_path, hourly_budget_usd=None):
+        self.db_path = db_path
+        self.hourly_budget_usd = hourly_budget_usd
+        self._write_lock = threading.Lock()
+        create_database(db_path, SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def record(self, api_key, usage, batch_id=None):
+        """Log one request's usage (a request_usage() dict; None is ignored)"""
+        if not usage:
+            return
+        with self._write_lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO usage_events (created_at, key_fingerprint, batch_id, model, input_tokens, "
+                "output_tokens, cached_tokens, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), key_fingerprint(api_key), batch_id, usage['model'], usage['input_tokens'],
+                 usage['output_tokens'], usage['cached_tokens'], usage['cost_usd'])
+            )
+
+    def totals(self, api_key=None, batch_id=None, since=None):
+        """Request count, token counts and cost, optionally for one key, batch or period"""
+        clauses, params = [], []
+        if api_key is not None:
+            clauses.append("key_fingerprint = ?")
+            params.append(key_fingerprint(api_key))
+        if batch_id is not None:
+            clauses.append("batch_id = ?")
+            params.append(batch_id)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0), "
+                f"COALESCE(SUM(cached_tokens), 0), COALESCE(SUM(cost_usd), 0) FROM usage_events {where}",
+                params
+            ).fetchone()
+        return {
+            "requests": row[0],
+            "input_tokens": row[1],
+            "output_tokens": row[2],
+            "cached_tokens": row[3],
+            "cost_usd": round(row[4], 6),
+        }
+
+    def totals_by_key(self, since=None):
+        """Totals for every key fingerprint, highest spend first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key_fingerprint, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(cost_usd) "
+                "FROM usage_events WHERE created_at >= ? GROUP BY key_fingerprint ORDER BY SUM(cost_usd) DESC",
+                (since or 0,)
+            ).fetchall()
+        return [{"key": key, "requests": requests, "input_tokens": input_tokens,
+                 "output_tokens": output_tokens, "cost_usd": round(cost, 6)}
+                for key, requests, input_tokens, output_tokens, cost in rows]
+
+    def check_budget(self, api_key):
+        """Raise BudgetExceeded when the key has spent its hourly budget"""
+        if not self.hourly_budget_usd:
+            return
+        window_start = time.time() - BUDGET_WINDOW_SECONDS
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT created_at, cost_usd FROM usage_events WHERE key_fingerprint = ? AND created_at >= ? "
+                "ORDER BY created_at",
+                (key_fingerprint(api_key), window_start)
+            ).fetchall()
+        spent = sum(cost for _, cost in rows)
+        if spent < self.hourly_budget_usd:
+            return
+
+        # Room opens up once enough of the oldest spend leaves the window
+        over = spent - self.hourly_budget_usd
+        released = 0.0
+        for created_at, cost in rows:
+            released += cost
+            if released > over:
+                break
+        retry_after = max(1, int(created_at - window_start) + 1)
+        raise BudgetExceeded(round(spent, 6), self.hourly_budget_usd, retry_after)
+
+    def wait_for_budget(self, api_key, timeout=BUDGET_WINDOW_SECONDS, on_wait=None):
+        """
+        Block until the key is back under its hourly budget (queueing work
+        instead of rejecting it); re-raises BudgetExceeded after timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.check_budget(api_key)
+            except BudgetExceeded as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise
+                if on_wait:
+                    on_wait(e)
+                time.sleep(min(e.retry_after, remaining))
+
+
+def hourly_budget_from_env():
+    """INVOICEPILOT_HOURLY_BUDGET_USD sets the per-key ceiling (unset means no limit)"""
+    value = os.environ.get('INVOICEPILOT_HOURLY_BUDGET_USD')
+    return float(value) if value else None
+
+
+usage_meter = UsageMeter(
+    os.environ.get('INVOICEPILOT_USAGE_DB', os.path.join(tempfile.gettempdir(), 'invoicepilot-usage.db')),
+    hourly_budget_usd=hourly_budget_from_env(),
+)
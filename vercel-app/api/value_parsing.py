@@ -0,0 +1,162 @@
+"""
+Parsing helpers for free-form values returned by Gemini
+Turns strings like "1.234,50 €", "Mar 3rd 2025" or "7.5%" into typed values
+"""
+import re
+from datetime import date, datetime
+
+CURRENCY_SYMBOLS = {
+    '$': 'USD',
+    '€': 'EUR',
+    '£': 'GBP',
+    '¥': 'JPY',
+    '₹': 'INR',
+}
+
+# A '-' is only a sign when it does not join an identifier, as in "INV-2024"
+NUMBER_PATTERN = re.compile(r"\(?(?:(?<![A-Za-z0-9])-)?(?<![A-Za-z0-9]-)(?<!\d)\d[\d.,' ]*")
+# Commas as thousands separators: "1,234,567", or Indian lakh grouping "1,00,000"
+THOUSANDS_COMMAS = r'\d{1,3}(?:,\d{3})+|\d{1,2}(?:,\d{2})+,\d{3}'
+CURRENCY_CODE_PATTERN = re.compile(r'\b([A-Z]{3})\b')
+ORDINAL_PATTERN = re.compile(r'(\d+)(st|nd|rd|th)\b', re.IGNORECASE)
+
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d',
+    '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y',
+    '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d.%m.%y',
+    '%B %d %Y', '%b %d %Y', '%d %B %Y', '%d %b %Y',
+    '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S',
+]
+
+DAY_FIRST_FORMATS = ['%d/%m/%Y', '%d-%m-%Y']
+
+# Checked against the whole words of the column name, in order
+TYPE_KEYWORDS = [
+    ('date', ['date']),
+    ('number', ['exchange rate', 'conversion rate', 'fx rate']),
+    ('percent', ['percent', 'percentage', 'rate', '%']),
+    ('number', ['amount', 'total', 'subtotal', 'price', 'cost', 'tax', 'vat', 'balance',
+                'quantity', 'qty', 'fee', 'discount', 'sum']),
+]
+# Identifiers stay text however they are named: "Invoice Number", "Tax ID", "VAT No."
+IDENTIFIER_WORDS = {'id', 'number', 'no', 'nr', 'num', '#', 'code', 'ref', 'reference', 'iban'}
+COLUMN_TYPES = ('text', 'number', 'percent', 'date')
+
+
+def column_type(column):
+    """text / number / percent / date for a configured column (an explicit "type" wins)"""
+    explicit = column.get('type')
+    if explicit in COLUMN_TYPES:
+        return explicit
+    words = re.findall(r'[a-z]+|[%#]', column['name'].lower())
+    if IDENTIFIER_WORDS.intersection(words):
+        return 'text'
+    # Plurals count too ("Totals", "Taxes", "Fees")
+    singular = [re.sub(r'(?<=x)es$|(?<=[^s])s$', '', word) for word in words]
+    phrases = {' '.join(names[i:i + size]) for names in (words, singular)
+               for size in (1, 2) for i in range(len(names))}
+    for column_type_name, keywords in TYPE_KEYWORDS:
+        if phrases.intersection(keywords):
+            return column_type_name
+    return 'text'
+
+
+def normalize_number_text(text):
+    """Convert a number with any thousands/decimal separators to '1234.50' form"""
+    text = text.strip().replace(' ', '').replace("'", '')
+    negative = text.startswith('(') or text.startswith('-')
+    text = text.strip('()-')
+
+    if ',' in text and '.' in text:
+        # Whichever separator comes last is the decimal point
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        # "1,234" / "1,00,000" are thousands; "12,50" is a decimal comma
+        if re.fullmatch(THOUSANDS_COMMAS, text):
+            text = text.replace(',', '')
+        else:
+            text = text.replace(',', '.')
+    elif text.count('.') > 1:
+        # "1.234.567" uses dots as thousands separators
+        text = text.replace('.', '')
+
+    text = text.rstrip('.')
+    return ('-' if negative else '') + text
+
+
+def parse_amount(value):
+    """
+    Parse a monetary value into (amount, currency)
+    Returns (None, None) when no number is present
+    """
+    if value is None or isinstance(value, bool):
+        return None, None
+    if isinstance(value, (int, float)):
+        return float(value), None
+
+    text = str(value)
+    currency = None
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        if symbol in text:
+            currency = code
+            break
+    if currency is None:
+        match = CURRENCY_CODE_PATTERN.search(text)
+        if match:
+            currency = match.group(1)
+
+    match = NUMBER_PATTERN.search(text)
+    if not match:
+        return None, currency
+    try:
+        return float(normalize_number_text(match.group(0))), currency
+    except ValueError:
+        return None, currency
+
+
+def parse_number(value):
+    """Parse a numeric value, ignoring currency symbols"""
+    return parse_amount(value)[0]
+
+
+def parse_percentage(value):
+    """Parse '7.5%' / '7,5 %' into a percentage number (7.5); numbers are taken as percentages already"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    number = parse_number(str(value).replace('%', ''))
+    return number
+
+
+def parse_date(value, day_first=False):
+    """Parse a date string in any of the common invoice formats, or None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = ORDINAL_PATTERN.sub(r'\1', str(value).strip())
+    text = text.replace(',', ' ').replace('Sept', 'Sep')
+    text = re.sub(r'\s+', ' ', text).strip().rstrip('.')
+    if not text:
+        return None
+
+    formats = DATE_FORMATS
+    if day_first:
+        formats = DAY_FIRST_FORMATS + [fmt for fmt in DATE_FORMATS if fmt not in DAY_FIRST_FORMATS]
+
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    # Abbreviated months written with a trailing dot, e.g. "Mar. 3 2025"
+    if '.' in text:
+        return parse_date(text.replace('.', ''), day_first)
+    return None
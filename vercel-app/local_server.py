@@ -14,6 +14,11 @@ import io
 # Add the api directory to the path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'api'))
 
+from compression import StaticAssetCache, choose_encoding, compress, MIN_COMPRESS_BYTES
+
+# Static files are compressed once and revalidated with ETag / Last-Modified
+static_assets = StaticAssetCache()
+
 class VercelMockHandler(http.server.SimpleHTTPRequestHandler):
     """HTTP handler that mimics Vercel's routing"""
     
@@ -44,7 +49,45 @@ class VercelMockHandler(http.server.SimpleHTTPRequestHandler):
             # Serve static files from public directory
             if self.path == '/':
                 self.path = '/index.html'
-            super().do_GET()
+            file_path = os.path.abspath(self.translate_path(self.path))
+            if os.path.isfile(file_path):
+                self.send_static(file_path)
+            else:
+                super().do_GET()
+    
+    def send_static(self, file_path):
+        """Serve a static file: 304 when unchanged, otherwise the best precompressed variant"""
+        asset = static_assets.get(file_path)
+        if asset.not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+            self.send_response(304)
+            for name, value in asset.headers().items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        
+        body, encoding = asset.body(self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in asset.headers().items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_json_body(self, body):
+        """Write a JSON body, compressed when the client accepts it; call before end_headers()"""
+        encoding = None
+        if len(body) >= MIN_COMPRESS_BYTES:
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'))
+        if encoding:
+            body = compress(body, encoding)
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
     def handle_api_upload(self):
         """Handle the /api/upload endpoint"""
@@ -70,11 +113,12 @@ class VercelMockHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
+            if 'retry_after' in result:
+                self.send_header('Retry-After', str(result['retry_after']))
             
             # Send the response data
             response_json = json.dumps(result).encode('utf-8')
-            self.wfile.write(response_json)
+            self.send_json_body(response_json)
             
             # Log the result
             if result.get('success'):
@@ -87,14 +131,13 @@ class VercelMockHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(500)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
             
             error_response = json.dumps({
                 "error": f"Server error: {str(e)}",
                 "type": type(e).__name__
             }).encode('utf-8')
             
-            self.wfile.write(error_response)
+            self.send_json_body(error_response)
             
             # Print error for debugging
             print(f"❌ Server Error: {e}")
@@ -128,6 +171,11 @@ def start_server(port=8000):
         print("   Make sure you're running this from the vercel-app directory")
         sys.exit(1)
     
+    # Precompress static files so the first request doesn't pay for it
+    for root, _, files in os.walk('public'):
+        for name in files:
+            static_assets.get(os.path.abspath(os.path.join(root, name)))
+    
     print("🚀 InvoicePilot Local Development Server")
     print("="*50)
     print(f"📁 Serving static files from: {os.path.join(script_dir, 'public')}")
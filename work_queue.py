@@ -0,0 +1,387 @@
+"""
+Durable work queue for extraction across several machines
+Documents are queued in a SQLite file that every node can open. A worker
+leases an item for a visibility timeout and keeps the lease alive with
+heartbeats while the pipeline runs. Once the result is written it acks the
+item. A lease that is neither renewed nor acked (the worker crashed or lost
+its node) expires and the item goes to the next worker. Items that keep
+failing end up in the dead-letter state.
+Lease times are wall-clock, so the nodes' clocks must be kept in sync (NTP).
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from ingest import process_document
+from ledger import Ledger, document_hash, column_config_id
+from db import connect, create_database
+from invoice_index import InvoiceIndex
+from field_cache import FieldCache
+from near_duplicates import NearDuplicateIndex, reuse_from_env
+from usage_meter import UsageMeter, hourly_budget_from_env
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    source_name TEXT,
+    document_hash TEXT NOT NULL,
+    config_id TEXT NOT NULL,
+    column_config TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    entry_id INTEGER,
+    result TEXT,
+    enqueued_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_ready ON work_items(status, available_at);
+-- A document is queued at most once per column configuration until it is done
+CREATE UNIQUE INDEX IF NOT EXISTS idx_work_items_pending ON work_items(document_hash, config_id)
+    WHERE status IN ('queued', 'leased');
+"""
+
+STATUSES = ('queued', 'leased', 'done', 'dead')
+DEFAULT_VISIBILITY = 300
+DEFAULT_MAX_ATTEMPTS = 5
+# Seconds before a failed item is retried: RETRY_DELAY * 2^(attempts - 1)
+RETRY_DELAY = 30
+
+
+def wal_from_env():
+    """
+    False when $INVOICEPILOT_QUEUE_WAL is 0: WAL's shared-memory index only
+    works between processes on one host, so a queue file on a network share
+    needs the rollback journal
+    """
+    return os.environ.get('INVOICEPILOT_QUEUE_WAL', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class WorkQueue:
+    """SQLite-backed queue with leases, heartbeats, acks and a dead-letter state"""
+
+    def __init__(self, db_path, visibility=DEFAULT_VISIBILITY, max_attempts=DEFAULT_MAX_ATTEMPTS, wal=None):
+        self.db_path = db_path
+        self.visibility = visibility
+        self.max_attempts = max_attempts
+        create_database(db_path, SCHEMA, journal_mode='WAL' if (wal_from_env() if wal is None else wal) else 'DELETE')
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front, so two nodes never lease the same item"""
+        with connect(self.db_path, isolation_level=None) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, path, column_config, source_name=None, max_attempts=None):
+        """
+        Queue a PDF for extraction with the given columns
+        Returns the item id, or None when the document is already queued or leased
+        """
+        path = os.path.abspath(path)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO work_items (path, source_name, document_hash, config_id, column_config, "
+                "max_attempts, available_at, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, source_name or os.path.basename(path), document_hash(path), column_config_id(column_config),
+                 json.dumps(column_config), max_attempts or self.max_attempts, time.time(), _now_iso())
+            )
+            return cursor.lastrowid if cursor.rowcount else None
+
+    def lease(self, owner, visibility=None):
+        """
+        Take the oldest ready item (queued, or leased with an expired lease)
+        for visibility seconds; returns the item dict or None when nothing is ready
+        The item's lease_token must be passed to heartbeat, ack and fail
+        """
+        now = time.time()
+        visibility = visibility or self.visibility
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM work_items WHERE (status = 'queued' AND available_at <= ?) "
+                    "OR (status = 'leased' AND lease_expires <= ?) ORDER BY id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row['status'] == 'leased' and row['attempts'] >= row['max_attempts']:
+                    # Its last attempt died with the worker
+                    conn.execute(
+                        "UPDATE work_items SET status = 'dead', lease_token = NULL, last_error = ?, finished_at = ? "
+                        "WHERE id = ?",
+                        (f"Lease expired on attempt {row['attempts']} ({row['lease_owner']})", _now_iso(), row['id'])
+                    )
+                    continue
+                token = uuid.uuid4().hex
+                expired = f"Lease expired ({row['lease_owner']})" if row['status'] == 'leased' else None
+                conn.execute(
+                    "UPDATE work_items SET status = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                    "lease_token = ?, lease_expires = ?, last_error = COALESCE(?, last_error) WHERE id = ?",
+                    (owner, token, now + visibility, expired, row['id'])
+                )
+                item = dict(row, status='leased', attempts=row['attempts'] + 1, lease_owner=owner,
+                            lease_token=token, lease_expires=now + visibility,
+                            last_error=expired or row['last_error'])
+                item['column_config'] = json.loads(item['column_config'])
+                return item
+
+    def _update_leased(self, item_id, token, assignments, params):
+        """Apply an update only while the caller still holds the lease; True when it did"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE work_items SET {assignments} WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                list(params) + [item_id, token]
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, item_id, token, visibility=None):
+        """Extend a lease; False when it has expired and another worker has taken the item"""
+        return self._update_leased(item_id, token, "lease_expires = ?",
+                                   [time.time() + (visibility or self.visibility)])
+
+    def ack(self, item_id, token, entry_id=None, result=None):
+        """Mark a leased item done, keeping its ledger entry id and result"""
+        return self._update_leased(
+            item_id, token,
+            "status = 'done', lease_token = NULL, lease_expires = NULL, entry_id = ?, result = ?, "
+            "last_error = NULL, finished_at = ?",
+            [entry_id, json.dumps(result, default=str) if result is not None else None, _now_iso()]
+        )
+
+    def fail(self, item_id, token, error, retry_delay=RETRY_DELAY):
+        """
+        Give a leased item back after a failed attempt: it is retried after an
+        exponential backoff, or dead-lettered once it has used all its attempts
+        Returns the new status, or None when the lease was no longer held
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM work_items WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (item_id, token)
+            ).fetchone()
+        if row is None:
+            return None
+        if row['attempts'] >= row['max_attempts']:
+            return 'dead' if self.dead_letter(item_id, token, error) else None
+        delay = retry_delay * 2 ** (row['attempts'] - 1)
+        updated = self._update_leased(
+            item_id, token,
+            "status = 'queued', lease_token = NULL, lease_expires = NULL, available_at = ?, last_error = ?",
+            [time.time() + delay, error]
+        )
+        return 'queued' if updated else None
+
+    def dead_letter(self, item_id, token, error):
+        """Stop retrying a leased item (e.g. an unreadable PDF)"""
+        return self._update_leased(
+            item_id, token,
+            "status = 'dead', lease_token = NULL, lease_expires = NULL, last_error = ?, finished_at = ?",
+            [error, _now_iso()]
+        )
+
+    def dead_letters(self, limit=50):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, path, attempts, last_error, finished_at FROM work_items WHERE status = 'dead' "
+                "ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def retry_dead(self):
+        """Queue every dead-lettered item again with fresh attempts; returns how many"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE OR IGNORE work_items SET status = 'queued', attempts = 0, available_at = ?, finished_at = NULL "
+                "WHERE status = 'dead'",
+                (time.time(),)
+            )
+            return cursor.rowcount
+
+    def get(self, item_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM work_items WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            return None
+        item = dict(row)
+        item['column_config'] = json.loads(item['column_config'])
+        item['result'] = json.loads(item['result']) if item['result'] else None
+        return item
+
+    def stats(self):
+        """Items per status, ready items, expired leases and leases per worker"""
+        now = time.time()
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status").fetchall())
+            ready = conn.execute(
+                "SELECT COUNT(*) FROM work_items WHERE status = 'queued' AND available_at <= ?", (now,)
+            ).fetchone()[0]
+            expired = conn.execute(
+                "SELECT COUNT(*) FROM work_items WHERE status = 'leased' AND lease_expires <= ?", (now,)
+            ).fetchone()[0]
+            owners = dict(conn.execute(
+                "SELECT lease_owner, COUNT(*) FROM work_items WHERE status = 'leased' AND lease_expires > ? "
+                "GROUP BY lease_owner",
+                (now,)
+            ).fetchall())
+        return dict({status: counts.get(status, 0) for status in STATUSES},
+                    ready=ready, expired_leases=expired, workers=owners)
+
+
+class QueueWorker:
+    """
+    Pulls items from a WorkQueue and runs them through the ingest pipeline
+    Results go to this node's ledger, search index and field cache, and the
+    extracted fields are also kept on the acked queue item
+    """
+
+    def __init__(self, work_queue, api_key, db_path=os.path.join('data', 'invoicepilot.db'),
+                 concurrency=2, worker_id=None, poll_interval=2.0):
+        self.queue = work_queue
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_interval = poll_interval
+
+        self.ledger = Ledger(db_path)
+        self.invoice_index = InvoiceIndex(db_path)
+        self.field_cache = FieldCache(db_path)
+        self.near_duplicates = NearDuplicateIndex(db_path)
+        self.usage_meter = UsageMeter(db_path, hourly_budget_usd=hourly_budget_from_env())
+
+        self._held = {}  # item id -> lease token
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.processed = 0
+        self.failed = 0
+        self.leases_lost = 0
+
+    def run_one(self):
+        """Lease and process a single item; False when nothing was ready"""
+        item = self.queue.lease(self.worker_id)
+        if item is None:
+            return False
+        with self._lock:
+            self._held[item['id']] = item['lease_token']
+        try:
+            self._process(item)
+        finally:
+            with self._lock:
+                self._held.pop(item['id'], None)
+        return True
+
+    def _process(self, item):
+        name = item['source_name']
+        try:
+            result = process_document(item['path'], self.api_key, item['column_config'], self.ledger,
+                                      self.invoice_index, source_name=name, doc_hash=item['document_hash'],
+                                      field_cache=self.field_cache, usage_meter=self.usage_meter,
+                                      near_duplicates=self.near_duplicates, reuse_duplicates=reuse_from_env())
+        except Exception as e:
+            result = {"ok": False, "stage": "worker", "error": f"Worker error: {e}"}
+
+        token = item['lease_token']
+        if result['ok']:
+            held = self.queue.ack(item['id'], token, entry_id=result['entry_id'],
+                                  result={"extracted_data": result['extracted_data'],
+                                          "near_duplicate": result.get('near_duplicate'),
+                                          "usage": result.get('usage')})
+            outcome = f"✅ {name} (attempt {item['attempts']})"
+        elif result['stage'] == 'prepare' and os.access(item['path'], os.R_OK):
+            # The PDF opens but cannot be processed - retrying will not help. A file
+            # this node cannot reach (missing, share mounted elsewhere) is retried below
+            held = self.queue.dead_letter(item['id'], token, result['error'])
+            outcome = f"💀 {name}: {result['error']}"
+        else:
+            status = self.queue.fail(item['id'], token, result['error'])
+            held = status is not None
+            outcome = f"{'💀' if status == 'dead' else '🔁'} {name}: {result['error']}"
+
+        with self._lock:
+            if result['ok']:
+                self.processed += 1
+            else:
+                self.failed += 1
+            if not held:
+                self.leases_lost += 1
+        if not held:
+            # Another worker took over after the lease expired; it redoes the item
+            outcome += " - lease was lost, item handed to another worker"
+        print(outcome)
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_one():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                print(f"❌ Queue worker error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _heartbeat_loop(self):
+        """Renew every held lease a few times per visibility timeout"""
+        while not self._stop.wait(max(self.queue.visibility / 3, 0.1)):
+            with self._lock:
+                held = list(self._held.items())
+            for item_id, token in held:
+                try:
+                    if not self.queue.heartbeat(item_id, token):
+                        print(f"⚠️ Lease on queue item {item_id} expired before its heartbeat")
+                except sqlite3.Error as e:
+                    print(f"⚠️ Heartbeat failed for queue item {item_id}: {e}")
+
+    def start(self):
+        targets = [self._heartbeat_loop] + [self._worker_loop] * self.concurrency
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def run_forever(self):
+        """Process items until interrupted; unfinished leases expire and are picked up elsewhere"""
+        self.start()
+        print(f"👷 Worker {self.worker_id} pulling from {self.queue.db_path} "
+              f"(concurrency {self.concurrency}, visibility {self.queue.visibility}s)")
+        print("⏹️  Press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping worker...")
+        finally:
+            self.stop()